@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import CatalogoHeuristicas
+from CarregadorEntradas import ler_matriz, ler_ordens, salvar_matriz, salvar_ordens
+from GeradorCenarios import gerar_armazem, gerar_ordens
+from SimuladorEventos import SimulacaoInterrompida
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TAMANHOS = (1_000, 10_000, 100_000, 1_000_000)
+FROTAS = (5, 20, 50, 200)
+CHAVE = ['heuristica', 'num_ordens', 'num_empilhadeiras']
+
+
+def memoria_pico_mb():
+    # pico de memória residente do processo (None onde o módulo resource não existe)
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return pico / 2**20 if sys.platform == 'darwin' else pico / 2**10
+
+
+def versao_codigo():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _medir(heuristica, num_empilhadeiras, caminho_ordens, caminho_matriz, limite_s):
+    # roda em um processo novo, para que o pico de memória seja só desta configuração
+    ordens, matriz_dist = ler_ordens(caminho_ordens), ler_matriz(caminho_matriz)
+    memoria_entradas = memoria_pico_mb()
+
+    inicio = time.perf_counter()
+    politicas = []
+
+    def passou_do_limite(politica):
+        if not politicas:
+            politicas.append(politica)
+        return bool(limite_s) and time.perf_counter() - inicio > limite_s
+
+    try:
+        CatalogoHeuristicas.executar(heuristica, num_empilhadeiras, ordens, matriz_dist, silencioso=True,
+                                     criterio_parada=passou_do_limite)
+        interrompida = False
+    except SimulacaoInterrompida:
+        interrompida = True
+    duracao = time.perf_counter() - inicio
+
+    # ordens atribuídas até o fim (ou até a interrupção)
+    atribuidas = len(politicas[0].registro) if politicas else 0
+    return {'duracao_s': duracao, 'ordens_atribuidas': atribuidas, 'ordens_por_s': atribuidas / duracao if duracao else None,
+            'interrompida': interrompida, 'memoria_entradas_mb': memoria_entradas, 'memoria_pico_mb': memoria_pico_mb()}
+
+
+def executar_benchmark(tamanhos=TAMANHOS, frotas=FROTAS, heuristicas=tuple(CatalogoHeuristicas.HEURISTICAS),
+                       limite_s=300.0, num_locais=60, num_esteiras=6, ordens_por_hora=300.0, semente=0):
+    # uma execução por vez, cada uma em um processo novo; uma heurística interrompida por
+    # limite_s não é executada nos tamanhos maiores
+    linhas = []
+    lentas = set()
+    matriz_dist = gerar_armazem(num_locais, num_esteiras, semente=semente)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_matriz = os.path.join(pasta, 'matriz.npy')
+        salvar_matriz(matriz_dist, caminho_matriz)
+
+        for num_ordens in sorted(tamanhos):
+            caminho_ordens = os.path.join(pasta, f'ordens_{num_ordens}.npz')
+            salvar_ordens(gerar_ordens(num_ordens, matriz_dist, ordens_por_hora, semente=semente), caminho_ordens)
+
+            for heuristica in heuristicas:
+                for num_empilhadeiras in sorted(frotas):
+                    linha = {'heuristica': heuristica, 'num_ordens': num_ordens, 'num_empilhadeiras': num_empilhadeiras}
+                    if heuristica in lentas:
+                        linhas.append({**linha, 'pulada': True})
+                        continue
+
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        medida = pool.submit(_medir, heuristica, num_empilhadeiras, caminho_ordens, caminho_matriz,
+                                             limite_s).result()
+                    linhas.append({**linha, 'pulada': False, **medida})
+                    situacao = "interrompida" if medida['interrompida'] else f"{medida['ordens_por_s']:.0f} ordens/s"
+                    print(f"{heuristica} com {num_ordens} ordens e {num_empilhadeiras} empilhadeiras: {situacao}, "
+                          f"{medida['duracao_s']:.2f}s")
+
+            lentas.update(linha['heuristica'] for linha in linhas
+                          if linha['num_ordens'] == num_ordens and linha.get('interrompida'))
+
+    return pd.DataFrame(linhas)
+
+
+def metadados(limite_s, num_locais, num_esteiras, ordens_por_hora, semente):
+    return {
+        'versao_codigo': versao_codigo(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'processadores': os.cpu_count(),
+        'cenario': {'num_locais': num_locais, 'num_esteiras': num_esteiras, 'ordens_por_hora': ordens_por_hora,
+                    'semente': semente, 'limite_s': limite_s},
+    }
+
+
+def salvar_benchmark(tabela, info, caminho):
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    linhas = json.loads(tabela.to_json(orient='records'))
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump({'metadados': info, 'resultados': linhas}, arquivo, ensure_ascii=False, indent=1)
+
+
+def ler_benchmark(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        conteudo = json.load(arquivo)
+    return conteudo['metadados'], pd.DataFrame(conteudo['resultados'])
+
+
+def comparar_benchmarks(caminho_anterior, caminho_atual):
+    # razão atual/anterior da vazão e do pico de memória nas configurações medidas nos dois
+    _, anterior = ler_benchmark(caminho_anterior)
+    _, atual = ler_benchmark(caminho_atual)
+    colunas = CHAVE + ['ordens_por_s', 'memoria_pico_mb']
+    tabela = anterior[colunas].merge(atual[colunas], on=CHAVE, suffixes=('_anterior', '_atual')).dropna()
+    tabela['razao_vazao'] = tabela['ordens_por_s_atual'] / tabela['ordens_por_s_anterior']
+    tabela['razao_memoria'] = tabela['memoria_pico_mb_atual'] / tabela['memoria_pico_mb_anterior']
+    return tabela
+
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Mede vazão e memória das heurísticas em cenários sintéticos")
+    argumentos.add_argument('--ordens', nargs='+', type=int, default=list(TAMANHOS), help="tamanhos do fluxo de ordens")
+    argumentos.add_argument('--empilhadeiras', nargs='+', type=int, default=list(FROTAS), help="tamanhos de frota")
+    argumentos.add_argument('--heuristica', nargs='+', default=list(CatalogoHeuristicas.HEURISTICAS),
+                            choices=list(CatalogoHeuristicas.HEURISTICAS))
+    argumentos.add_argument('--limite-s', type=float, default=300.0,
+                            help="interrompe uma execução que passar deste tempo (0 desliga)")
+    argumentos.add_argument('--locais', type=int, default=60)
+    argumentos.add_argument('--esteiras', type=int, default=6)
+    argumentos.add_argument('--ordens-por-hora', type=float, default=300.0)
+    argumentos.add_argument('--semente', type=int, default=0)
+    argumentos.add_argument('--saida', default=None, help="arquivo JSON (padrão: benchmarks/benchmark_<commit>.json)")
+    argumentos.add_argument('--comparar', nargs=2, metavar=('ANTERIOR', 'ATUAL'),
+                            help="só compara dois arquivos de benchmark já gravados")
+    args = argumentos.parse_args()
+
+    if args.comparar:
+        print(comparar_benchmarks(*args.comparar).to_string(index=False))
+        sys.exit()
+
+    info = metadados(args.limite_s, args.locais, args.esteiras, args.ordens_por_hora, args.semente)
+    tabela = executar_benchmark(args.ordens, args.empilhadeiras, args.heuristica, args.limite_s, args.locais,
+                                args.esteiras, args.ordens_por_hora, args.semente)
+    caminho = args.saida or os.path.join('benchmarks', f"benchmark_{info['versao_codigo'] or 'local'}.json")
+    salvar_benchmark(tabela, info, caminho)
+    print(f"\nResultados em {caminho}")
@@ -0,0 +1,311 @@
+import time
+from bisect import bisect_left, insort
+
+import numpy as np
+
+from IndiceEsteiras import e_esteira
+from RegistroAtribuicoes import RegistroAtribuicoes
+
+# esteiras em uso ao mesmo tempo, o mesmo limite do despacho guloso
+LIMITE_ESTEIRAS = 2
+
+
+def _acima_do_limite(intervalos, inicio, fim):
+    # esteira-segundos acima do limite entre inicio e fim; intervalos: (esteira, saída, entrega)
+    eventos = []
+    for esteira, saida, entrega in intervalos:
+        saida, entrega = max(saida, inicio), min(entrega, fim)
+        if saida < entrega:
+            eventos.append((saida, 1, esteira))
+            eventos.append((entrega, -1, esteira))
+    # no mesmo instante, as viagens que terminam saem antes das que começam
+    eventos.sort(key=lambda evento: (evento[0], evento[1]))
+
+    viagens = {}
+    ativas = 0
+    excesso = 0.0
+    anterior = inicio
+    for instante, passo, esteira in eventos:
+        if ativas > LIMITE_ESTEIRAS:
+            excesso += (instante - anterior) * (ativas - LIMITE_ESTEIRAS)
+        anterior = instante
+        viagens[esteira] = viagens.get(esteira, 0) + passo
+        if passo == 1 and viagens[esteira] == 1:
+            ativas += 1
+        elif passo == -1 and viagens[esteira] == 0:
+            ativas -= 1
+    return excesso
+
+
+class AgendaFrota:
+    # a sequência de ordens de cada empilhadeira com os horários que Otimizador.atribuir_ordem
+    # dá a ela: saída em max(livre_em, instante) + tempo sem carga (no próprio instante na
+    # primeira viagem), coleta e entrega em seguida. Mudar uma sequência só mexe nos horários
+    # até a primeira viagem cuja entrega volta a ser a de antes (dali em diante a posição e
+    # livre_em são os mesmos), e é só esse trecho que avaliar() percorre
+    def __init__(self, politica, max_propagacao=500):
+        matriz_dist = politica.matriz_dist
+        ordens = politica.ordens
+        self.max_propagacao = max_propagacao
+        self._distancia = matriz_dist.valores.item
+
+        origem = matriz_dist.codificar(ordens['origem'])
+        destino = matriz_dist.codificar(ordens['destino'])
+        distancia_com_carga = matriz_dist.valores[origem, destino]
+        self.instante = ordens['instante'].to_numpy(dtype=np.float64).tolist()
+        self.origem = origem.tolist()
+        self.destino = destino.tolist()
+        self.distancia_com_carga = distancia_com_carga.tolist()
+        self.tempo_com_carga = (distancia_com_carga / 10).tolist()
+        nomes, codigos = np.unique(ordens['origem'].to_numpy().astype(str), return_inverse=True)
+        de_esteira = np.array([e_esteira(nome) for nome in nomes], dtype=bool)
+        self.esteira = np.where(de_esteira[codigos], codigos, -1).tolist()
+
+        iniciais = dict(politica.posicoes_iniciais or {})
+        self.posicao_inicial = [matriz_dist.codigo(iniciais[emp_id]) if emp_id in iniciais else -1
+                                for emp_id in range(politica.num_empilhadeiras)]
+
+        registro = politica.registro
+        total = len(ordens)
+        self.sequencias = [[] for _ in range(politica.num_empilhadeiras)]
+        self.empilhadeira = [-1] * total
+        for linha, emp_id in zip(registro.coluna('linha').tolist(), registro.coluna('empilhadeira').tolist()):
+            self.sequencias[emp_id].append(linha)
+            self.empilhadeira[linha] = emp_id
+
+        self.saida = [float('nan')] * total
+        self.entrega = [float('nan')] * total
+        self.distancia_sem_carga = [float('nan')] * total
+        for emp_id in range(len(self.sequencias)):
+            posicao, livre = self.posicao_inicial[emp_id], None
+            for linha in self.sequencias[emp_id]:
+                saida, entrega, dsc = self._viagem(linha, posicao, livre)
+                self.saida[linha], self.entrega[linha], self.distancia_sem_carga[linha] = saida, entrega, dsc
+                posicao, livre = self.destino[linha], entrega
+
+        # a agenda precisa dar exatamente os horários registrados pelo despacho
+        linhas = registro.coluna('linha')
+        if not (np.array_equal(np.take(self.saida, linhas), registro.coluna('hora_saida'))
+                and np.array_equal(np.take(self.entrega, linhas), registro.coluna('hora_entrega'))):
+            raise ValueError("O registro não segue os horários do despacho guloso; a busca local não se aplica")
+
+        self.total_distancia_sem_carga = float(np.take(self.distancia_sem_carga, linhas).sum()) if len(linhas) else 0.0
+        self.total_espera = float((registro.coluna('hora_saida') - registro.coluna('hora_criacao')).sum())
+
+        # viagens de cada esteira por saída, para achar as que cruzam uma janela de tempo
+        self._por_esteira = {}
+        self._duracao_maxima = 0.0
+        for linha in linhas.tolist():
+            self._indexar(linha)
+
+    def _viagem(self, linha, posicao, livre):
+        # (saída, entrega, distância sem carga) da ordem para quem está em posicao, livre em livre
+        origem = self.origem[linha]
+        dsc = self._distancia(origem if posicao < 0 else posicao, origem)
+        tempo_sem_carga = dsc / 10
+        instante = self.instante[linha]
+        saida = instante if livre is None else max(livre, instante) + tempo_sem_carga
+        return saida, saida + tempo_sem_carga + self.tempo_com_carga[linha], dsc
+
+    def _indexar(self, linha):
+        esteira = self.esteira[linha]
+        if esteira >= 0:
+            insort(self._por_esteira.setdefault(esteira, []), (self.saida[linha], linha))
+            self._duracao_maxima = max(self._duracao_maxima, self.entrega[linha] - self.saida[linha])
+
+    def _desindexar(self, linha):
+        esteira = self.esteira[linha]
+        if esteira >= 0:
+            viagens = self._por_esteira[esteira]
+            del viagens[bisect_left(viagens, (self.saida[linha], linha))]
+
+    def indice(self, emp_id, linha):
+        # posição da ordem na sequência; as saídas de uma empilhadeira nunca diminuem
+        sequencia = self.sequencias[emp_id]
+        i = bisect_left(sequencia, self.saida[linha], key=self.saida.__getitem__)
+        while sequencia[i] != linha:
+            i += 1
+        return i
+
+    def posicao_por_saida(self, emp_id, saida):
+        return bisect_left(self.sequencias[emp_id], saida, key=self.saida.__getitem__)
+
+    def avaliar(self, alteracoes):
+        # alteracoes: (empilhadeira, a, meio, sufixo, c): a nova sequência é a atual até a,
+        # depois as ordens de meio e depois sufixo[c:], onde sufixo é a sequência atual de
+        # alguma empilhadeira. Devolve (variação da distância sem carga, variação da espera,
+        # {linha: (saída, entrega, distância sem carga)}) ou None se a mudança se propaga por
+        # mais de max_propagacao viagens
+        novos = {}
+        delta_distancia = delta_espera = 0.0
+        for emp_id, a, meio, sufixo, c in alteracoes:
+            sequencia = self.sequencias[emp_id]
+            if a > 0:
+                anterior = sequencia[a - 1]
+                posicao, livre = self.destino[anterior], self.entrega[anterior]
+            else:
+                posicao, livre = self.posicao_inicial[emp_id], None
+
+            k = 0
+            while True:
+                if k < len(meio):
+                    linha = meio[k]
+                elif c + k - len(meio) < len(sufixo):
+                    linha = sufixo[c + k - len(meio)]
+                else:
+                    break
+                if k >= self.max_propagacao:
+                    return None
+
+                saida, entrega, dsc = self._viagem(linha, posicao, livre)
+                novos[linha] = (saida, entrega, dsc)
+                delta_distancia += dsc - self.distancia_sem_carga[linha]
+                delta_espera += saida - self.saida[linha]
+                if k >= len(meio) and entrega == self.entrega[linha]:
+                    break
+                posicao, livre = self.destino[linha], entrega
+                k += 1
+        return delta_distancia, delta_espera, novos
+
+    def respeita_esteiras(self, novos):
+        # a mudança não pode aumentar o tempo acima do limite de esteiras na janela das
+        # viagens de esteira que mudaram de horário (o despacho guloso confere o limite no
+        # instante da decisão, então a agenda dele pode passar um pouco do limite; a busca
+        # nunca piora isso)
+        mudadas = [linha for linha in novos if self.esteira[linha] >= 0]
+        if not mudadas:
+            return True
+        inicio = min(min(self.saida[linha], novos[linha][0]) for linha in mudadas)
+        fim = max(max(self.entrega[linha], novos[linha][1]) for linha in mudadas)
+        duracao_maxima = max([self._duracao_maxima] + [novos[linha][1] - novos[linha][0] for linha in mudadas])
+
+        antes, depois = [], []
+        for esteira, viagens in self._por_esteira.items():
+            i = bisect_left(viagens, (inicio - duracao_maxima, -1))
+            while i < len(viagens) and viagens[i][0] < fim:
+                linha = viagens[i][1]
+                if self.entrega[linha] > inicio:
+                    antes.append((esteira, self.saida[linha], self.entrega[linha]))
+                    if linha not in novos:
+                        depois.append((esteira, self.saida[linha], self.entrega[linha]))
+                i += 1
+        depois.extend((self.esteira[linha], novos[linha][0], novos[linha][1]) for linha in mudadas)
+        return _acima_do_limite(depois, inicio, fim) <= _acima_do_limite(antes, inicio, fim) + 1e-9
+
+    def aplicar(self, alteracoes, novos):
+        sequencias = [(emp_id, a, self.sequencias[emp_id][:a] + list(meio) + sufixo[c:])
+                      for emp_id, a, meio, sufixo, c in alteracoes]
+        for emp_id, a, sequencia in sequencias:
+            self.sequencias[emp_id] = sequencia
+            for linha in sequencia[a:]:
+                self.empilhadeira[linha] = emp_id
+        for linha, (saida, entrega, dsc) in novos.items():
+            self._desindexar(linha)
+            self.total_distancia_sem_carga += dsc - self.distancia_sem_carga[linha]
+            self.total_espera += saida - self.saida[linha]
+            self.saida[linha], self.entrega[linha], self.distancia_sem_carga[linha] = saida, entrega, dsc
+            self._indexar(linha)
+
+    def gravar(self, politica):
+        # refaz o registro (cada empilhadeira na ordem da sua sequência) e os acumuladores da frota
+        # viagens sem deslocamento podem sair no mesmo instante da anterior, daí a posição na sequência
+        viagens = sorted((self.saida[linha], emp_id, i, linha)
+                         for emp_id, sequencia in enumerate(self.sequencias) for i, linha in enumerate(sequencia))
+        registro = RegistroAtribuicoes(len(viagens))
+        for saida, emp_id, _, linha in viagens:
+            dsc = self.distancia_sem_carga[linha]
+            tempo_sem_carga = dsc / 10
+            registro.registrar(linha, emp_id, self.instante[linha], saida, saida + tempo_sem_carga, self.entrega[linha],
+                               dsc, self.distancia_com_carga[linha], tempo_sem_carga, self.tempo_com_carga[linha])
+        politica.registro = registro
+
+        for emp_id, sequencia in enumerate(self.sequencias):
+            emp = politica.empilhadeiras[emp_id]
+            livre = None
+            for chave in ('distancia_total', 'distancia_sem_carga', 'tempo_ocioso_parado', 'tempo_ocioso_movimento'):
+                emp[chave] = 0.0
+            for linha in sequencia:
+                dsc = self.distancia_sem_carga[linha]
+                if livre is not None and livre < self.saida[linha]:
+                    emp['tempo_ocioso_parado'] += self.saida[linha] - livre
+                emp['distancia_total'] = emp['distancia_total'] + dsc + self.distancia_com_carga[linha]
+                emp['distancia_sem_carga'] += dsc
+                emp['tempo_ocioso_movimento'] += dsc / 10
+                livre = self.entrega[linha]
+            if sequencia:
+                emp['posicao'], emp['livre_em'] = self.destino[sequencia[-1]], livre
+
+
+def _movimentos(agenda, emp_id, i, vizinhos):
+    # realocar a ordem, trocá-la com uma ordem de outra empilhadeira ou trocar as caudas das
+    # duas sequências depois dela (2-opt entre sequências), sempre perto do horário dela
+    sequencia = agenda.sequencias[emp_id]
+    linha = sequencia[i]
+    for outra in range(len(agenda.sequencias)):
+        if outra == emp_id:
+            continue
+        destino = agenda.sequencias[outra]
+        j = agenda.posicao_por_saida(outra, agenda.saida[linha])
+        for k in range(max(0, j - vizinhos), min(len(destino), j + vizinhos) + 1):
+            yield 'realocacao', [(emp_id, i, (), sequencia, i + 1), (outra, k, (linha,), destino, k)]
+            if k < len(destino):
+                yield 'troca', [(emp_id, i, (destino[k],), sequencia, i + 1), (outra, k, (linha,), destino, k + 1)]
+            if i + 1 < len(sequencia) or k < len(destino):
+                yield '2-opt', [(emp_id, i + 1, (), destino, k), (outra, k, (), sequencia, i + 1)]
+
+
+def melhorar(politica, tempo_limite_s, peso_espera=0.1, vizinhos=1, max_propagacao=500):
+    # busca local depois do despacho guloso: percorre as ordens em ordem cronológica e aplica
+    # o primeiro movimento que não piora nem a distância sem carga nem a espera e reduz
+    # distância sem carga + peso_espera * espera (o peso de FrotaEmpilhadeiras.custos_ordem);
+    # só pelo custo ponderado a busca trocava muita espera por pouca distância. Repete até uma
+    # passada sem melhora ou até tempo_limite_s segundos e devolve o relatório da busca
+    inicio = time.perf_counter()
+    agenda = AgendaFrota(politica, max_propagacao)
+    distancia_inicial, espera_inicial = agenda.total_distancia_sem_carga, agenda.total_espera
+    aceitos = {'realocacao': 0, 'troca': 0, '2-opt': 0}
+    avaliados = 0
+    passadas = 0
+
+    esgotado = False
+    while not esgotado:
+        passadas += 1
+        melhorou = False
+        for linha in sorted(linha for sequencia in agenda.sequencias for linha in sequencia):
+            if time.perf_counter() - inicio >= tempo_limite_s:
+                esgotado = True
+                break
+            emp_id = agenda.empilhadeira[linha]
+            i = agenda.indice(emp_id, linha)
+            for tipo, alteracoes in _movimentos(agenda, emp_id, i, vizinhos):
+                avaliados += 1
+                avaliacao = agenda.avaliar(alteracoes)
+                if avaliacao is None:
+                    continue
+                delta_distancia, delta_espera, novos = avaliacao
+                if (delta_distancia <= 1e-9 and delta_espera <= 1e-9 and delta_distancia + peso_espera * delta_espera < -1e-9
+                        and agenda.respeita_esteiras(novos)):
+                    agenda.aplicar(alteracoes, novos)
+                    aceitos[tipo] += 1
+                    melhorou = True
+                    break
+        else:
+            esgotado = not melhorou
+
+    if sum(aceitos.values()):
+        agenda.gravar(politica)
+    duracao = time.perf_counter() - inicio
+    economia_distancia = distancia_inicial - agenda.total_distancia_sem_carga
+    economia_espera = espera_inicial - agenda.total_espera
+    return {
+        'busca_local_duracao_s': duracao,
+        'busca_local_passadas': passadas,
+        'busca_local_avaliados': avaliados,
+        'busca_local_realocacoes': aceitos['realocacao'],
+        'busca_local_trocas': aceitos['troca'],
+        'busca_local_2opt': aceitos['2-opt'],
+        'busca_local_economia_distancia_sem_carga': economia_distancia,
+        'busca_local_economia_espera_s': economia_espera,
+        'busca_local_economia_distancia_por_s': economia_distancia / duracao if duracao else 0.0,
+        'busca_local_economia_espera_por_s': economia_espera / duracao if duracao else 0.0,
+    }
@@ -0,0 +1,105 @@
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+import pandas as pd
+
+import CatalogoHeuristicas
+import VarreduraFrota
+from CarregadorEntradas import carregar_entradas
+from SimuladorEventos import SimulacaoInterrompida
+
+# menor distancia_sem_carga entre as configurações concluídas, compartilhada entre os processos
+_melhor = None
+
+
+def grade_parametros(espaco):
+    # espaco: {parametro: [valores]} -> todas as combinações
+    nomes = list(espaco)
+    return [dict(zip(nomes, valores)) for valores in itertools.product(*(espaco[nome] for nome in nomes))]
+
+
+def amostra_parametros(espaco, quantidade, semente=None):
+    # combinações sorteadas da grade, sem repetição
+    grade = grade_parametros(espaco)
+    return random.Random(semente).sample(grade, min(quantidade, len(grade)))
+
+
+def _iniciar_processo(melhor, *argumentos):
+    global _melhor
+    _melhor = melhor
+    VarreduraFrota.iniciar_processo(*argumentos)
+
+
+def _avaliar(heuristica, num_empilhadeiras, parametros, parada_antecipada):
+    ordens, matriz_dist = VarreduraFrota.entradas_do_processo()
+    parcial = 0.0
+    # a busca local ainda reduz a distância depois da simulação, então o parcial não é um limite
+    parada_antecipada = parada_antecipada and not parametros.get('busca_local_s')
+
+    def passou_do_melhor(politica):
+        nonlocal parcial
+        parcial = CatalogoHeuristicas.distancia_sem_carga_parcial(politica)
+        return parcial > _melhor.value
+
+    inicio = time.perf_counter()
+    linha = {'heuristica': heuristica, 'num_empilhadeiras': num_empilhadeiras, **parametros}
+    try:
+        _, metricas = CatalogoHeuristicas.executar(heuristica, num_empilhadeiras, ordens, matriz_dist, silencioso=True,
+                                                   criterio_parada=passou_do_melhor if parada_antecipada else None,
+                                                   **parametros)
+    except SimulacaoInterrompida:
+        linha.update(interrompida=True, duracao_s=time.perf_counter() - inicio, distancia_sem_carga=parcial)
+        return linha
+
+    with _melhor.get_lock():
+        if metricas['distancia_sem_carga'] < _melhor.value:
+            _melhor.value = metricas['distancia_sem_carga']
+    linha.update(interrompida=False, duracao_s=time.perf_counter() - inicio, **metricas)
+    return linha
+
+
+def buscar_parametros(ordens, matriz_dist, configuracoes, heuristica='backhauling', num_empilhadeiras=7,
+                      parada_antecipada=True, max_processos=None):
+    # gerador: devolve uma linha por configuração assim que ela termina; com parada_antecipada,
+    # uma configuração é interrompida quando sua distância sem carga parcial já passa da
+    # menor distancia_sem_carga final encontrada até ali
+    melhor = multiprocessing.Value('d', float('inf'))
+    with VarreduraFrota.MatrizCompartilhada(matriz_dist) as compartilhada, \
+            ProcessPoolExecutor(max_workers=max_processos or os.cpu_count(), initializer=_iniciar_processo,
+                                initargs=(melhor, *compartilhada.argumentos(), ordens)) as pool:
+        futuros = [pool.submit(_avaliar, heuristica, num_empilhadeiras, parametros, parada_antecipada)
+                   for parametros in configuracoes]
+        for futuro in as_completed(futuros):
+            yield futuro.result()
+
+
+if __name__ == "__main__":
+    NUM_EMPILHADEIRAS = 7
+    ESPACO = {
+        'fator_backhaul': [1.0, 1.1, 1.2, 1.3, 1.5, 2.0],
+        'janela_consolidacao_min': [5, 10, 15, 20, 30],
+    }
+
+    start_time = time.time()
+    ordens, matriz_dist = carregar_entradas()
+
+    print("\nIniciando busca de parâmetros...")
+    linhas = []
+    for linha in buscar_parametros(ordens, matriz_dist, grade_parametros(ESPACO), 'backhauling', NUM_EMPILHADEIRAS):
+        linhas.append(linha)
+        situacao = "interrompida" if linha['interrompida'] else f"{linha['distancia_sem_carga']:.2f}m sem carga"
+        print(f"fator_backhaul={linha['fator_backhaul']} janela={linha['janela_consolidacao_min']}min: {situacao}")
+
+    tabela = pd.DataFrame(linhas)
+    concluidas = tabela[~tabela['interrompida']]
+    melhor = concluidas.loc[concluidas['distancia_sem_carga'].idxmin()]
+    print(f"\nMelhor configuração: fator_backhaul={melhor['fator_backhaul']} janela={melhor['janela_consolidacao_min']}min "
+          f"({melhor['distancia_sem_carga']:.2f}m sem carga)")
+    print(f"Tempo total de execução: {timedelta(seconds=time.time() - start_time)}")
+
+    tabela.to_excel("resultados_busca_parametros.xlsx", index=False)
@@ -0,0 +1,152 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from Cronometro import Cronometro
+from MatrizDistancias import MatrizDistancias
+
+ARQUIVO_ORDENS = "ordens_unificadas.xlsx"
+ARQUIVO_MATRIZ = "matriz_distancias.xlsx"
+
+# cópia já convertida das planilhas; muda a versão quando o formato do cache mudar
+PASTA_CACHE = ".cache_entradas"
+VERSAO_CACHE = 1
+
+
+def preparar_ordens(ordens):
+    # converte as datas uma vez para várias execuções; a ordenação fica com cada heurística,
+    # que precisa receber as linhas na ordem do arquivo para desempatar horários iguais do
+    # mesmo jeito (sort_values não é estável)
+    ordens = ordens.copy()
+    ordens['data_hora'] = pd.to_datetime(ordens['data_hora'], errors='coerce')
+    return ordens.dropna(subset=['data_hora']).reset_index(drop=True)
+
+
+def chave_cache(arquivo):
+    # caminho, tamanho e data de modificação identificam a versão da planilha sem precisar lê-la
+    info = os.stat(arquivo)
+    texto = f"{VERSAO_CACHE}|{os.path.abspath(arquivo)}|{info.st_size}|{info.st_mtime_ns}"
+    return hashlib.sha1(texto.encode()).hexdigest()[:16]
+
+
+def _caminho_cache(pasta_cache, arquivo, extensao):
+    nome = os.path.splitext(os.path.basename(arquivo))[0]
+    return os.path.join(pasta_cache, f"{nome}.{chave_cache(arquivo)}{extensao}")
+
+
+def _gravar(caminho, gravar):
+    # grava em um temporário e renomeia, para nunca deixar um cache pela metade
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'wb') as arquivo:
+        gravar(arquivo)
+    os.replace(temporario, caminho)
+
+
+def salvar_ordens(ordens, caminho):
+    # colunas numéricas e de data vão como estão; as demais (locais, materiais...) viram
+    # códigos inteiros mais a lista de categorias
+    arrays = {'nomes': np.array(list(ordens.columns), dtype=object),
+              'tipos': np.array([str(tipo) for tipo in ordens.dtypes], dtype=object)}
+    for i, nome in enumerate(ordens.columns):
+        coluna = ordens[nome]
+        if pd.api.types.is_numeric_dtype(coluna) or pd.api.types.is_datetime64_any_dtype(coluna):
+            arrays[f'valores_{i}'] = coluna.to_numpy()
+        else:
+            codigos, categorias = pd.factorize(coluna)
+            arrays[f'codigos_{i}'] = codigos
+            arrays[f'categorias_{i}'] = np.asarray(categorias, dtype=object)
+    _gravar(caminho, lambda arquivo: np.savez(arquivo, **arrays))
+
+
+def ler_ordens(caminho):
+    with np.load(caminho, allow_pickle=True) as arrays:
+        colunas = {}
+        for i, (nome, tipo) in enumerate(zip(arrays['nomes'], arrays['tipos'])):
+            if f'valores_{i}' in arrays:
+                colunas[nome] = arrays[f'valores_{i}']
+            else:
+                categorias = pd.Categorical.from_codes(arrays[f'codigos_{i}'], arrays[f'categorias_{i}'])
+                colunas[nome] = pd.Series(categorias).astype(tipo)
+        return pd.DataFrame(colunas)
+
+
+def _caminho_locais(caminho):
+    return os.path.splitext(caminho)[0] + '.locais.npy'
+
+
+def salvar_matriz(matriz_dist, caminho):
+    # valores em .npy (abertos com mmap) e os nomes dos locais em um arquivo ao lado
+    _gravar(_caminho_locais(caminho), lambda arquivo: np.save(arquivo, np.array(matriz_dist.locais, dtype=object)))
+    _gravar(caminho, lambda arquivo: np.save(arquivo, matriz_dist.valores))
+
+
+def ler_matriz(caminho):
+    locais = np.load(_caminho_locais(caminho), allow_pickle=True)
+    return MatrizDistancias(locais, np.load(caminho, mmap_mode='r'))
+
+
+def ler_tabela(arquivo):
+    # planilha, CSV ou Parquet, pela extensão
+    extensao = os.path.splitext(arquivo)[1].lower()
+    if extensao == '.csv':
+        return pd.read_csv(arquivo)
+    if extensao == '.parquet':
+        return pd.read_parquet(arquivo)
+    return pd.read_excel(arquivo)
+
+
+# cronometro: tempos de leitura dos arquivos (fase 'carga') e de conversão (fase 'preparo')
+def carregar_ordens(arquivo_ordens=ARQUIVO_ORDENS, pasta_cache=PASTA_CACHE, cronometro=None):
+    cronometro = cronometro or Cronometro()
+    caminho = None if pasta_cache is None else _caminho_cache(pasta_cache, arquivo_ordens, '.npz')
+    if caminho is not None and os.path.exists(caminho):
+        with cronometro.fase('carga'):
+            return ler_ordens(caminho)
+
+    with cronometro.fase('carga'):
+        ordens = ler_tabela(arquivo_ordens)
+    with cronometro.fase('preparo'):
+        ordens = preparar_ordens(ordens)
+        if caminho is not None:
+            salvar_ordens(ordens, caminho)
+    return ordens
+
+
+def carregar_matriz(arquivo_matriz=ARQUIVO_MATRIZ, pasta_cache=PASTA_CACHE, cronometro=None):
+    cronometro = cronometro or Cronometro()
+    caminho = None if pasta_cache is None else _caminho_cache(pasta_cache, arquivo_matriz, '.npy')
+    if caminho is not None and os.path.exists(caminho):
+        with cronometro.fase('carga'):
+            return ler_matriz(caminho)
+
+    with cronometro.fase('carga'):
+        planilha = ler_tabela(arquivo_matriz)
+    with cronometro.fase('preparo'):
+        matriz_dist = MatrizDistancias.de_planilha(planilha)
+        if caminho is not None:
+            salvar_matriz(matriz_dist, caminho)
+    return matriz_dist
+
+
+def ler_ordens_em_blocos(arquivo_ordens, linhas_por_bloco=50_000):
+    # gerador de DataFrames para otimizar_em_blocos / processar_ordens_fifo_em_blocos; o
+    # arquivo (CSV ou Parquet) precisa estar em ordem cronológica de data_hora
+    if arquivo_ordens.lower().endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as erro:
+            raise ImportError("Ler ordens de Parquet em blocos requer o pacote pyarrow") from erro
+        for lote in pq.ParquetFile(arquivo_ordens).iter_batches(batch_size=linhas_por_bloco):
+            yield lote.to_pandas()
+    else:
+        yield from pd.read_csv(arquivo_ordens, chunksize=linhas_por_bloco)
+
+
+def carregar_entradas(arquivo_ordens=ARQUIVO_ORDENS, arquivo_matriz=ARQUIVO_MATRIZ, pasta_cache=PASTA_CACHE,
+                      cronometro=None):
+    # pasta_cache=None lê sempre as planilhas
+    return (carregar_ordens(arquivo_ordens, pasta_cache, cronometro),
+            carregar_matriz(arquivo_matriz, pasta_cache, cronometro))
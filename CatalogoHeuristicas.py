@@ -0,0 +1,75 @@
+import contextlib
+import os
+
+import pandas as pd
+
+import Heuristica
+import HeuristicaBackhauling
+import HeuristicaComConsolidação
+import HeuristicaIngênua
+from PontosControle import PontoControle
+from Progresso import SEM_PROGRESSO
+
+# nome -> (classe, método que recebe um DataFrame de ordens e a matriz, método equivalente
+# que recebe um iterável de blocos de ordens); ambos devolvem (resultados, métricas), ou
+# (None, métricas) quando recebem um GravadorResultados
+HEURISTICAS = {
+    'gulosa': (Heuristica.Otimizador, 'otimizar', 'otimizar_em_blocos'),
+    'ingenua': (HeuristicaIngênua.HeuristicaIngenuaFIFO, 'processar_ordens_fifo', 'processar_ordens_fifo_em_blocos'),
+    'consolidacao': (HeuristicaComConsolidação.Otimizador, 'otimizar', 'otimizar_em_blocos'),
+    'backhauling': (HeuristicaBackhauling.Otimizador, 'otimizar', 'otimizar_em_blocos'),
+}
+
+
+def criar(nome, num_empilhadeiras, **parametros):
+    if nome not in HEURISTICAS:
+        raise KeyError(f"Heurística desconhecida: {nome} (disponíveis: {', '.join(HEURISTICAS)})")
+    classe = HEURISTICAS[nome][0]
+    return classe(num_empilhadeiras, **parametros)
+
+
+def executar(nome, num_empilhadeiras, ordens, matriz_dist, silencioso=False, criterio_parada=None, gravador=None,
+             instrumentacao=None, progresso=None, pontos_controle=None, retomada=None, posicoes_iniciais=None,
+             **parametros):
+    # ordens: DataFrame ou iterável de blocos (ver CarregadorEntradas.ler_ordens_em_blocos);
+    # silencioso desliga o progresso (a menos que um seja passado) e as demais mensagens.
+    # pontos_controle, retomada e posicoes_iniciais: ver PoliticaDespacho
+    heuristica = criar(nome, num_empilhadeiras, **parametros)
+    heuristica.criterio_parada = criterio_parada
+    heuristica.pontos_controle = pontos_controle
+    heuristica.retomada = retomada
+    heuristica.posicoes_iniciais = posicoes_iniciais
+    if instrumentacao is not None:
+        heuristica.instrumentacao = instrumentacao
+    if progresso is None and silencioso:
+        progresso = SEM_PROGRESSO
+    heuristica.progresso = progresso
+    metodo = getattr(heuristica, HEURISTICAS[nome][1 if isinstance(ordens, pd.DataFrame) else 2])
+    if not silencioso:
+        return metodo(ordens, matriz_dist, gravador)
+
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        return metodo(ordens, matriz_dist, gravador)
+
+
+def nome_da_classe(classe):
+    for nome, (classe_heuristica, _, _) in HEURISTICAS.items():
+        if (classe_heuristica.__module__, classe_heuristica.__qualname__) == tuple(classe):
+            return nome
+    raise KeyError(f"Nenhuma heurística do catálogo é {'.'.join(classe)}")
+
+
+def retomar(ponto_controle, ordens, matriz_dist, **opcoes):
+    # continua a execução gravada em ponto_controle (caminho ou PontoControle) com as mesmas
+    # ordens e matriz; o resultado é o mesmo da execução sem interrupção. opcoes: as de
+    # executar (gravador, pontos_controle...); os parâmetros da heurística vêm do ponto
+    if not isinstance(ponto_controle, PontoControle):
+        ponto_controle = PontoControle.ler(ponto_controle)
+    nome = nome_da_classe(ponto_controle.cabecalho['classe'])
+    return executar(nome, ponto_controle.num_empilhadeiras, ordens, matriz_dist, retomada=ponto_controle, **opcoes)
+
+
+def distancia_sem_carga_parcial(heuristica):
+    # total do registro até aqui: só cresce e, ao fim, é a própria métrica distancia_sem_carga
+    # (nas heurísticas com consolidação ela conta a viagem uma vez para cada ordem do pacote)
+    return heuristica.registro.totais['distancia_sem_carga']
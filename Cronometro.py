@@ -0,0 +1,23 @@
+import time
+from contextlib import contextmanager
+
+
+class Cronometro:
+    # soma o tempo de parede gasto em cada fase (carga, preparo, simulacao, gravacao...);
+    # uma mesma fase pode ser medida várias vezes e os tempos se acumulam
+    def __init__(self):
+        self.tempos = {}
+
+    @contextmanager
+    def fase(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.adicionar(nome, time.perf_counter() - inicio)
+
+    def adicionar(self, nome, segundos):
+        self.tempos[nome] = self.tempos.get(nome, 0.0) + segundos
+
+    def tempo(self, nome):
+        return self.tempos.get(nome, 0.0)
@@ -0,0 +1,167 @@
+import math
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import CatalogoHeuristicas
+from MatrizDistancias import MatrizDistancias
+from Progresso import SEM_PROGRESSO
+from SimuladorEventos import RelogioSimulacao
+
+
+class DespachanteOnline:
+    # despacho ao vivo com a regra de uma heurística: as ordens entram uma a uma por
+    # submit_order, advance_clock processa chegadas e entregas até o instante dado e
+    # poll_assignments devolve as atribuições feitas desde a chamada anterior. Frota,
+    # esteiras e fila de espera ficam na política entre as chamadas, e os eventos passam
+    # pelo mesmo SimuladorEventos do modo em lote e na mesma ordem, então reproduzir um log
+    # dá as mesmas atribuições. Políticas que consultam ordens futuras (consolidação e
+    # backhauling) não são aceitas: decidem olhando a janela de ordens que ainda vão chegar.
+    # A partida a quente (posicoes_iniciais da política) vale aqui também. latencias guarda o
+    # tempo de decisão por ordem de cada advance_clock (ver status())
+    def __init__(self, politica, matriz_dist, inicio=None, amostras_latencia=100_000):
+        if politica.CONSULTA_ORDENS_FUTURAS:
+            raise ValueError(f"{type(politica).__name__} consulta ordens que ainda não chegaram e não decide ao vivo")
+        if politica.retomada is not None:
+            raise ValueError("O despacho ao vivo não continua de pontos de controle")
+
+        politica.resetar()
+        if politica.progresso is None:
+            politica.progresso = SEM_PROGRESSO
+        politica.iniciar_progresso()
+        politica.matriz_dist = MatrizDistancias.garantir(matriz_dist)
+        politica.preparar_estado_inicial()
+        # sem inicio, o relógio começa na primeira ordem, como no modo em lote
+        politica.relogio = None if inicio is None else RelogioSimulacao(pd.Timestamp(inicio))
+
+        self.politica = politica
+        self.simulador = politica.simulador
+        self.instante = float('-inf')
+        self.ultima_chegada = float('-inf')
+        self.recebidas = 0
+        self.encerrado = False
+        self.latencias = deque(maxlen=amostras_latencia)
+        self._codigos = {}
+        self._devolvidas = 0
+
+    @classmethod
+    def criar(cls, nome, num_empilhadeiras, matriz_dist, inicio=None, posicoes_iniciais=None, **parametros):
+        politica = CatalogoHeuristicas.criar(nome, num_empilhadeiras, **parametros)
+        politica.posicoes_iniciais = posicoes_iniciais
+        return cls(politica, matriz_dist, inicio)
+
+    def _segundos(self, data_hora):
+        return float(self.politica.relogio.segundos(pd.Timestamp(data_hora)))
+
+    def submit_order(self, ordem):
+        # ordem: mapeamento com ordem, origem, destino e data_hora (e base, quantidade... se a
+        # heurística usar); devolve a linha da ordem, que identifica suas atribuições
+        if self.encerrado:
+            raise RuntimeError("O despacho já foi encerrado")
+        ordem = dict(ordem)
+        data_hora = pd.Timestamp(ordem['data_hora'])
+        if pd.isna(data_hora):
+            raise ValueError(f"Ordem {ordem.get('ordem')} sem data_hora")
+        if self.politica.relogio is None:
+            self.politica.relogio = RelogioSimulacao(data_hora)
+
+        instante = self._segundos(data_hora)
+        if instante < self.ultima_chegada or instante < self.instante:
+            raise ValueError(f"Ordem {ordem.get('ordem')} fora de ordem: as ordens precisam chegar em ordem cronológica "
+                             f"e não antes do relógio do despacho")
+
+        matriz_dist = self.politica.matriz_dist
+        desconhecidos = sorted({str(ordem[c]) for c in ('origem', 'destino') if ordem[c] not in matriz_dist.codigos})
+        if desconhecidos:
+            raise KeyError(f"Locais ausentes na matriz de distâncias: {desconhecidos}")
+
+        linha = self.recebidas
+        ordem.update(data_hora=data_hora, cod_origem=matriz_dist.codigo(ordem['origem']),
+                     cod_destino=matriz_dist.codigo(ordem['destino']), linha=linha, instante=instante)
+        self.recebidas += 1
+        self.ultima_chegada = instante
+        self.politica.total_de_ordens = self.recebidas
+        self._codigos[linha] = ordem['ordem']
+        self.simulador.agendar_chegada(instante, ordem)
+        return linha
+
+    def advance_clock(self, data_hora):
+        # processa as chegadas e entregas até data_hora, inclusive; devolve quantas ordens
+        # foram atribuídas
+        if self.encerrado:
+            raise RuntimeError("O despacho já foi encerrado")
+        if self.politica.relogio is None:
+            return 0
+        instante = self._segundos(data_hora)
+        if instante < self.instante:
+            raise ValueError("O relógio do despacho não volta no tempo")
+
+        antes = len(self.politica.registro)
+        chegadas = self.simulador.chegadas_pendentes()
+        inicio = time.perf_counter()
+        self.simulador.processar_ate(instante)
+        duracao = time.perf_counter() - inicio
+        # com várias chegadas no mesmo avanço, a amostra é o tempo médio por ordem
+        chegadas -= self.simulador.chegadas_pendentes()
+        if chegadas:
+            self.latencias.append(duracao / chegadas)
+        self.instante = instante
+        return len(self.politica.registro) - antes
+
+    def close(self):
+        # fim do turno: processa todos os eventos e a fila de espera restante, como no fim do
+        # modo em lote; devolve as métricas
+        if not self.encerrado:
+            self.simulador.processar_ate(math.inf)
+            self.politica.ao_encerrar()
+            self.simulador.processar_ate(math.inf)
+            self.encerrado = True
+        return self.politica.calcular_metricas()
+
+    def poll_assignments(self):
+        # atribuições feitas desde a última chamada, na ordem em que foram feitas
+        registro = self.politica.registro
+        inicio, fim = self._devolvidas, len(registro)
+        if inicio == fim:
+            return []
+        self._devolvidas = fim
+
+        relogio = self.politica.relogio
+        colunas = {nome: registro.coluna(nome)[inicio:fim] for nome in
+                   ('linha', 'empilhadeira', 'distancia_sem_carga', 'distancia_com_carga')}
+        horas = {nome: pd.DatetimeIndex(relogio.datas(registro.coluna(nome)[inicio:fim]))
+                 for nome in ('hora_saida', 'hora_coleta', 'hora_entrega')}
+
+        atribuicoes = []
+        for i, linha in enumerate(colunas['linha'].tolist()):
+            atribuicoes.append({
+                'ordem': self._codigos.pop(linha),
+                'linha': linha,
+                'empilhadeira': int(colunas['empilhadeira'][i]),
+                'hora_saida': horas['hora_saida'][i],
+                'hora_coleta': horas['hora_coleta'][i],
+                'hora_entrega': horas['hora_entrega'][i],
+                'distancia_sem_carga': float(colunas['distancia_sem_carga'][i]),
+                'distancia_com_carga': float(colunas['distancia_com_carga'][i]),
+            })
+        return atribuicoes
+
+    def status(self):
+        # ordens recebidas, atribuídas, aguardando (já chegaram e estão na fila de espera) e
+        # ainda por chegar (data_hora depois do relógio), e percentis do tempo de decisão
+        por_chegar = self.simulador.chegadas_pendentes()
+        atribuidas = len(self.politica.registro)
+        relogio = self.politica.relogio
+        latencias = np.array(self.latencias) * 1000
+        return {
+            'relogio': None if relogio is None or self.instante == float('-inf') else pd.Timestamp(relogio.datas(self.instante)),
+            'recebidas': self.recebidas,
+            'atribuidas': atribuidas,
+            'em_espera': self.recebidas - atribuidas - por_chegar,
+            'por_chegar': por_chegar,
+            'encerrado': self.encerrado,
+            'latencia_decisao': dict(zip(('p50_ms', 'p90_ms', 'p99_ms', 'max_ms'),
+                                         np.percentile(latencias, [50, 90, 99, 100]).tolist() if len(latencias) else [None] * 4)),
+        }
@@ -0,0 +1,188 @@
+import argparse
+import ast
+import inspect
+import os
+import time
+from datetime import timedelta
+
+import pandas as pd
+
+import CatalogoHeuristicas
+from CarregadorEntradas import (ARQUIVO_MATRIZ, ARQUIVO_ORDENS, PASTA_CACHE, carregar_matriz, carregar_ordens,
+                                ler_ordens_em_blocos)
+from Cronometro import Cronometro
+from GravadorResultados import FORMATOS, GravadorResultados, exportar_excel
+from Instrumentacao import Instrumentacao, PerfiladorCProfile
+from PontosControle import PontoControle, PontosControle
+from Progresso import ProgressoTerminal
+
+FASES = ('carga', 'preparo', 'simulacao', 'gravacao')
+
+
+def ler_parametros(textos):
+    # ["nome=valor", ...] -> {nome: valor}; o valor é lido como literal Python quando possível
+    parametros = {}
+    for texto in textos:
+        nome, separador, valor = texto.partition('=')
+        if not separador:
+            raise ValueError(f"Parâmetro sem valor: {texto} (use nome=valor)")
+        try:
+            parametros[nome.strip()] = ast.literal_eval(valor.strip())
+        except (ValueError, SyntaxError):
+            parametros[nome.strip()] = valor.strip()
+    return parametros
+
+
+def parametros_aceitos(nome, parametros):
+    # só os parâmetros que o construtor da heurística recebe
+    aceitos = inspect.signature(CatalogoHeuristicas.HEURISTICAS[nome][0].__init__).parameters
+    return {chave: valor for chave, valor in parametros.items() if chave in aceitos}
+
+
+def caminho_saida(pasta, heuristica, num_empilhadeiras, formato):
+    return os.path.join(pasta, f"resultados_{heuristica}_{num_empilhadeiras}emp.{formato}")
+
+
+def caminho_ponto_controle(pasta, heuristica, num_empilhadeiras):
+    return os.path.join(pasta, f"ponto_{heuristica}_{num_empilhadeiras}emp.bin")
+
+
+def executar_configuracao(heuristica, num_empilhadeiras, ordens, matriz_dist, caminho, parametros,
+                          silencioso=False, linhas_por_lote=10_000, instrumentacao=None, progresso=None,
+                          pontos_controle=None, retomada=None, posicoes_iniciais=None):
+    # ordens: DataFrame já preparado ou função que devolve um novo iterável de blocos
+    cronometro = Cronometro()
+    with GravadorResultados(caminho, linhas_por_lote, cronometro) as gravador:
+        entrada = ordens.copy() if isinstance(ordens, pd.DataFrame) else ordens()
+        with cronometro.fase('simulacao'):
+            _, metricas = CatalogoHeuristicas.executar(heuristica, num_empilhadeiras, entrada, matriz_dist,
+                                                       silencioso=silencioso, gravador=gravador,
+                                                       instrumentacao=instrumentacao, progresso=progresso,
+                                                       pontos_controle=pontos_controle, retomada=retomada,
+                                                       posicoes_iniciais=posicoes_iniciais, **parametros)
+    # a gravação dos lotes acontece durante a simulação; o tempo de simulação fica sem ela
+    cronometro.adicionar('simulacao', -min(cronometro.tempo('gravacao'), cronometro.tempo('simulacao')))
+    return metricas, cronometro
+
+
+def imprimir_tempos(titulo, cronometro):
+    partes = ", ".join(f"{fase} {cronometro.tempo(fase):.2f}s" for fase in FASES if fase in cronometro.tempos)
+    print(f"{titulo}: {partes}")
+
+
+def criar_argumentos():
+    argumentos = argparse.ArgumentParser(description="Executa as heurísticas de despacho de empilhadeiras")
+    argumentos.add_argument('--heuristica', nargs='+', default=['todas'],
+                            choices=[*CatalogoHeuristicas.HEURISTICAS, 'todas'],
+                            help="heurísticas a executar (padrão: todas)")
+    argumentos.add_argument('--empilhadeiras', nargs='+', type=int, default=[7],
+                            help="tamanhos de frota a executar (padrão: 7)")
+    argumentos.add_argument('--ordens', default=ARQUIVO_ORDENS, help="planilha, CSV ou Parquet de ordens")
+    argumentos.add_argument('--matriz', default=ARQUIVO_MATRIZ, help="planilha, CSV ou Parquet da matriz de distâncias")
+    argumentos.add_argument('--saida', default='resultados', help="pasta dos arquivos de resultados")
+    argumentos.add_argument('--formato', default='csv', choices=[extensao[1:] for extensao in FORMATOS],
+                            help="formato dos resultados (parquet/arrow/feather requerem pyarrow)")
+    argumentos.add_argument('--param', nargs='*', default=[], metavar='NOME=VALOR',
+                            help="parâmetros das heurísticas, ex.: janela_consolidacao_min=10 fator_backhaul=1.6")
+    argumentos.add_argument('--cache', default=PASTA_CACHE, help="pasta do cache das entradas convertidas")
+    argumentos.add_argument('--sem-cache', action='store_true', help="lê sempre os arquivos de entrada")
+    argumentos.add_argument('--blocos', type=int, default=None, metavar='LINHAS',
+                            help="lê as ordens (CSV/Parquet em ordem cronológica) em blocos de LINHAS, sem cache")
+    argumentos.add_argument('--linhas-por-lote', type=int, default=10_000,
+                            help="linhas de resultado por gravação (padrão: 10000)")
+    argumentos.add_argument('--excel', action='store_true', help="converte cada resultado também para .xlsx")
+    argumentos.add_argument('--silencioso', action='store_true', help="não mostra o progresso das ordens")
+    argumentos.add_argument('--intervalo-progresso', type=float, default=0.5, metavar='SEGUNDOS',
+                            help="intervalo mínimo entre atualizações do progresso")
+    argumentos.add_argument('--instrumentar', action='store_true',
+                            help="mostra tempo e chamadas por fase e tamanhos de fila/candidatas de cada execução")
+    argumentos.add_argument('--cprofile', metavar='PREFIXO', default=None,
+                            help="roda com cProfile e grava PREFIXO_<heuristica>_<n>emp.prof (implica --instrumentar)")
+    argumentos.add_argument('--pontos-controle', metavar='PASTA', default=None,
+                            help="grava periodicamente o estado de cada execução em PASTA (resultados em CSV)")
+    argumentos.add_argument('--ordens-por-ponto', type=int, default=50_000,
+                            help="chegadas entre dois pontos de controle (padrão: 50000)")
+    argumentos.add_argument('--retomar', action='store_true',
+                            help="continua cada execução do seu ponto de controle em --pontos-controle, se houver")
+    argumentos.add_argument('--partida-quente', metavar='PASTA', default=None,
+                            help="pasta de pontos de controle do turno anterior: a frota parte de onde terminou")
+    return argumentos
+
+
+def main(argv=None):
+    argumentos = criar_argumentos()
+    args = argumentos.parse_args(argv)
+    heuristicas = list(CatalogoHeuristicas.HEURISTICAS) if 'todas' in args.heuristica else args.heuristica
+    try:
+        parametros = ler_parametros(args.param)
+    except ValueError as erro:
+        argumentos.error(str(erro))
+    if args.retomar and not args.pontos_controle:
+        argumentos.error("--retomar requer --pontos-controle")
+    ignorados = [nome for nome in parametros
+                 if not any(nome in parametros_aceitos(h, parametros) for h in heuristicas)]
+    if ignorados:
+        argumentos.error(f"nenhuma das heurísticas escolhidas aceita: {', '.join(ignorados)}")
+
+    inicio = time.perf_counter()
+    pasta_cache = None if args.sem_cache else args.cache
+    entradas = Cronometro()
+    matriz_dist = carregar_matriz(args.matriz, pasta_cache, entradas)
+    if args.blocos:
+        ordens = lambda: ler_ordens_em_blocos(args.ordens, args.blocos)
+    else:
+        ordens = carregar_ordens(args.ordens, pasta_cache, entradas)
+    imprimir_tempos("Entradas", entradas)
+
+    os.makedirs(args.saida, exist_ok=True)
+    linhas = []
+    for heuristica in heuristicas:
+        for num_empilhadeiras in args.empilhadeiras:
+            caminho = caminho_saida(args.saida, heuristica, num_empilhadeiras, args.formato)
+            print(f"\n=== {heuristica} com {num_empilhadeiras} empilhadeiras ===")
+            instrumentacao = None
+            if args.instrumentar or args.cprofile:
+                perfiladores = [PerfiladorCProfile(f"{args.cprofile}_{heuristica}_{num_empilhadeiras}emp.prof")
+                                if args.cprofile else None]
+                instrumentacao = Instrumentacao([p for p in perfiladores if p is not None], imprimir=False)
+            pontos_controle, retomada, posicoes_iniciais = None, None, None
+            if args.pontos_controle:
+                ponto = caminho_ponto_controle(args.pontos_controle, heuristica, num_empilhadeiras)
+                pontos_controle = PontosControle(ponto, args.ordens_por_ponto)
+                if args.retomar and os.path.exists(ponto):
+                    retomada = PontoControle.ler(ponto)
+                    if retomada.concluida:
+                        print(f"Execução já concluída em {ponto}")
+                        continue
+                    print(f"Retomando de {ponto} ({retomada.cabecalho['ordens_entregues']} ordens já lidas)")
+            if args.partida_quente:
+                posicoes_iniciais = PontoControle.ler(
+                    caminho_ponto_controle(args.partida_quente, heuristica, num_empilhadeiras)).posicoes
+            metricas, cronometro = executar_configuracao(heuristica, num_empilhadeiras, ordens, matriz_dist, caminho,
+                                                         parametros_aceitos(heuristica, parametros),
+                                                         args.silencioso, args.linhas_por_lote, instrumentacao,
+                                                         None if args.silencioso else
+                                                         ProgressoTerminal(args.intervalo_progresso),
+                                                         pontos_controle, retomada, posicoes_iniciais)
+            if instrumentacao is not None:
+                print(f"\n{instrumentacao.relatorio()}")
+            if args.excel:
+                with cronometro.fase('gravacao'):
+                    exportar_excel(caminho)
+
+            imprimir_tempos("Tempos", cronometro)
+            print(f"Resultados em {caminho}")
+            # carga e preparo das entradas acontecem uma vez e se repetem em todas as linhas
+            tempos = {**entradas.tempos, **cronometro.tempos}
+            linhas.append({'heuristica': heuristica, 'num_empilhadeiras': num_empilhadeiras, 'arquivo': caminho,
+                           **{f'tempo_{fase}_s': tempos.get(fase, 0.0) for fase in FASES}, **metricas})
+
+    resumo = os.path.join(args.saida, 'resumo.csv')
+    pd.DataFrame(linhas).to_csv(resumo, index=False)
+
+    print(f"\nResumo em {resumo}")
+    print(f"Tempo total de execução: {timedelta(seconds=time.perf_counter() - inicio)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from SimuladorEventos import RelogioSimulacao
+
+
+class FluxoOrdens:
+    # lê as ordens bloco a bloco (DataFrames já em ordem cronológica) e prepara cada bloco
+    # como as heurísticas faziam com o DataFrame inteiro: códigos dos locais, instante em
+    # segundos e linha global. A memória das ordens só fica limitada quando os resultados vão
+    # para um GravadorResultados (guardar_saida=False); no padrão (guardar_saida=True) as
+    # colunas usadas nos resultados de todas as ordens ficam guardadas para montar a tabela
+    # devolvida. Nos dois casos o registro de atribuições cresce com o log (colunas numéricas).
+    # entregues conta as ordens já passadas adiante; com estado (ver estado()) o fluxo
+    # continua de um ponto de controle, pulando as ordens que já tinham sido entregues
+    COLUNAS_SAIDA = ('ordem', 'material', 'origem', 'destino', 'data_hora', 'instante')
+
+    def __init__(self, blocos, matriz_dist, guardar_saida=True, estado=None):
+        self.matriz_dist = matriz_dist
+        self.guardar_saida = guardar_saida
+        self._blocos = iter(blocos)
+        self.relogio = None
+        self.carregadas = 0
+        self.entregues = 0
+        self.ultimo_instante = float('-inf')
+        self.ultimo_entregue = float('-inf')
+        self.esgotado = False
+        self._saida = []
+        self._pular = 0
+
+        if estado is not None:
+            if estado['guardar_saida'] != guardar_saida:
+                raise ValueError("O ponto de controle foi gravado com outro destino dos resultados")
+            self.relogio = estado['relogio']
+            self.carregadas = self.entregues = estado['entregues']
+            # pular: quantas das ordens já entregues estão no começo dos blocos recebidos
+            self._pular = estado.get('pular', estado['entregues'])
+            self.ultimo_instante = self.ultimo_entregue = estado['ultimo_entregue']
+            if estado['saida'] is not None:
+                self._saida = [estado['saida']]
+
+        # o primeiro bloco é lido já aqui para fixar a origem do relógio; na retomada a origem
+        # já é conhecida e o bloco só é lido quando pedido, como na execução original (a
+        # consolidação usa ultimo_instante para decidir quantos blocos carregar)
+        self._proximo = self._ler_bloco() if estado is None else None
+        if self.relogio is None:
+            self.relogio = RelogioSimulacao(pd.NaT)
+
+    def _ler_bloco(self):
+        for bloco in self._blocos:
+            bloco['data_hora'] = pd.to_datetime(bloco['data_hora'], errors='coerce')
+            bloco = bloco.dropna(subset=['data_hora']).reset_index(drop=True)
+            if self._pular:
+                puladas = min(self._pular, len(bloco))
+                bloco = bloco.iloc[puladas:].reset_index(drop=True)
+                self._pular -= puladas
+            if len(bloco):
+                return self._preparar(bloco)
+        self.esgotado = True
+        return None
+
+    def _preparar(self, bloco):
+        if self.relogio is None:
+            self.relogio = RelogioSimulacao(bloco['data_hora'].iloc[0])
+        instantes = self.relogio.segundos(bloco['data_hora'])
+        if instantes[0] < self.ultimo_instante or (np.diff(instantes) < 0).any():
+            raise ValueError("As ordens precisam chegar em ordem cronológica de data_hora")
+
+        bloco['cod_origem'] = self.matriz_dist.codificar(bloco['origem'])
+        bloco['cod_destino'] = self.matriz_dist.codificar(bloco['destino'])
+        bloco['linha'] = np.arange(self.carregadas, self.carregadas + len(bloco))
+        bloco['instante'] = instantes
+
+        self.carregadas += len(bloco)
+        self.ultimo_instante = instantes[-1]
+        if self.guardar_saida:
+            self._saida.append(bloco[[c for c in self.COLUNAS_SAIDA if c in bloco]])
+        return bloco
+
+    def _proximo_bloco(self):
+        bloco, self._proximo = self._proximo, None
+        if bloco is None and not self.esgotado:
+            bloco = self._ler_bloco()
+        return bloco
+
+    def proximo_bloco(self):
+        # devolve o próximo bloco preparado, ou None quando as ordens acabaram
+        bloco = self._proximo_bloco()
+        if bloco is not None:
+            self.entregues += len(bloco)
+            self.ultimo_entregue = bloco['instante'].iloc[-1]
+        return bloco
+
+    def ordens(self):
+        # uma ordem por vez, como dict: montar uma Series por linha (iterrows) custa mais que
+        # a própria decisão de despacho
+        while (bloco := self._proximo_bloco()) is not None:
+            for ordem in bloco.to_dict('records'):
+                self.entregues += 1
+                self.ultimo_entregue = ordem['instante']
+                yield ordem
+
+    def estado(self):
+        # o que o ponto de controle precisa para continuar depois das ordens entregues; as
+        # linhas de saída carregadas e ainda não entregues são lidas de novo na retomada
+        saida = None
+        if self.guardar_saida:
+            tabela = self.tabela_saida()
+            self._saida = [tabela]
+            saida = tabela.iloc[:self.entregues]
+        return {'relogio': self.relogio, 'entregues': self.entregues, 'ultimo_entregue': self.ultimo_entregue,
+                'guardar_saida': self.guardar_saida, 'saida': saida}
+
+    @classmethod
+    def tabela_de_registros(cls, ordens):
+        # mesmas colunas de tabela_saida a partir de ordens avulsas (Series ou dicts),
+        # indexadas pela linha global
+        return pd.DataFrame({c: [ordem[c] for ordem in ordens] for c in cls.COLUNAS_SAIDA},
+                            index=pd.Index([ordem['linha'] for ordem in ordens], dtype=np.int64))
+
+    def tabela_saida(self):
+        if not self._saida:
+            return pd.DataFrame(columns=list(self.COLUNAS_SAIDA))
+        return pd.concat(self._saida, ignore_index=True)
@@ -0,0 +1,92 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from IndiceEsteiras import e_esteira
+from MatrizDistancias import MatrizDistancias
+
+
+def gerar_armazem(num_locais=60, num_esteiras=6, lado_m=300.0, semente=None):
+    # locais sorteados em um galpão quadrado; a distância é a de Manhattan (corredores em
+    # grade), que é uma métrica. Os primeiros num_esteiras locais são esteiras
+    if not 0 < num_esteiras < num_locais:
+        raise ValueError("O armazém precisa de pelo menos uma esteira e um local que não seja esteira")
+
+    rng = np.random.default_rng(semente)
+    locais = ([f"Esteira {i + 1}" for i in range(num_esteiras)] +
+              [f"Posicao {i + 1}" for i in range(num_locais - num_esteiras)])
+    pontos = rng.uniform(0, lado_m, size=(num_locais, 2))
+    valores = np.abs(pontos[:, None, :] - pontos[None, :, :]).sum(axis=2)
+    return MatrizDistancias(locais, valores)
+
+
+def gerar_ordens(num_ordens, matriz_dist, ordens_por_hora=300.0, fracao_esteira=0.7, num_materiais=50,
+                 concentracao_materiais=1.0, bases=(4, 6, 8), pesos_bases=None, fracao_andares_completos=0.3,
+                 inicio="2025-01-06 06:00", semente=None):
+    # chegadas de Poisson (intervalos exponenciais, arredondados ao segundo); origem em uma
+    # esteira com probabilidade fracao_esteira e destino sempre fora das esteiras; materiais
+    # com frequência de Zipf (concentracao_materiais=0 deixa todos iguais); quantidade de até
+    # 3 andares da base, completando o último andar com probabilidade fracao_andares_completos
+    rng = np.random.default_rng(semente)
+    locais = np.asarray(matriz_dist.locais, dtype=object)
+    esteira = np.array([e_esteira(local) for local in locais])
+    esteiras, demais = np.flatnonzero(esteira), np.flatnonzero(~esteira)
+    if not len(esteiras) or not len(demais):
+        raise ValueError("O armazém precisa de esteiras e de locais que não sejam esteira")
+
+    intervalos = rng.exponential(3600.0 / ordens_por_hora, num_ordens)
+    data_hora = (pd.Timestamp(inicio) + pd.to_timedelta(np.cumsum(intervalos), unit='s')).floor('s')
+
+    origem = np.where(rng.random(num_ordens) < fracao_esteira,
+                      rng.choice(esteiras, num_ordens), rng.choice(demais, num_ordens))
+    destino = rng.choice(demais, num_ordens)
+
+    pesos_materiais = 1.0 / np.arange(1, num_materiais + 1) ** concentracao_materiais
+    materiais = rng.choice(num_materiais, num_ordens, p=pesos_materiais / pesos_materiais.sum())
+
+    pesos_bases = None if pesos_bases is None else np.asarray(pesos_bases, dtype=float) / np.sum(pesos_bases)
+    base = rng.choice(np.asarray(bases), num_ordens, p=pesos_bases)
+    andares = rng.integers(1, 4, num_ordens)
+    sobra = rng.integers(1, np.maximum(base, 2), num_ordens)
+    completa = (rng.random(num_ordens) < fracao_andares_completos) | (base == 1)
+    quantidade = np.where(completa, base * andares, base * (andares - 1) + sobra)
+
+    return pd.DataFrame({
+        'ordem': np.arange(1, num_ordens + 1),
+        'material': np.char.add('MAT', np.char.zfill(materiais.astype(str), 4)).astype(object),
+        'origem': locais[origem],
+        'destino': locais[destino],
+        'data_hora': data_hora,
+        'base': base,
+        'quantidade': quantidade,
+    })
+
+
+def matriz_para_planilha(matriz_dist):
+    # mesmo formato da planilha original: primeira coluna com o nome do local
+    planilha = pd.DataFrame(np.asarray(matriz_dist.valores), columns=list(matriz_dist.locais))
+    planilha.insert(0, 'Local', list(matriz_dist.locais))
+    return planilha
+
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Gera um armazém e um fluxo de ordens sintéticos")
+    argumentos.add_argument('--ordens', type=int, default=10_000, help="número de ordens")
+    argumentos.add_argument('--locais', type=int, default=60, help="número de locais, incluindo as esteiras")
+    argumentos.add_argument('--esteiras', type=int, default=6, help="número de esteiras")
+    argumentos.add_argument('--ordens-por-hora', type=float, default=300.0, help="taxa média de chegada")
+    argumentos.add_argument('--materiais', type=int, default=50, help="número de materiais distintos")
+    argumentos.add_argument('--semente', type=int, default=0)
+    argumentos.add_argument('--saida', default='cenario_sintetico', help="pasta dos arquivos gerados")
+    args = argumentos.parse_args()
+
+    matriz_dist = gerar_armazem(args.locais, args.esteiras, semente=args.semente)
+    ordens = gerar_ordens(args.ordens, matriz_dist, args.ordens_por_hora, num_materiais=args.materiais,
+                          semente=args.semente)
+
+    os.makedirs(args.saida, exist_ok=True)
+    ordens.to_csv(os.path.join(args.saida, 'ordens.csv'), index=False)
+    matriz_para_planilha(matriz_dist).to_csv(os.path.join(args.saida, 'matriz_distancias.csv'), index=False)
+    print(f"{len(ordens)} ordens e {len(matriz_dist)} locais gravados em {args.saida}")
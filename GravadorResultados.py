@@ -0,0 +1,114 @@
+import importlib.util
+import os
+
+import pandas as pd
+
+from Cronometro import Cronometro
+
+# extensão -> formato; Parquet e Arrow IPC (.arrow/.feather) requerem o pacote pyarrow
+FORMATOS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+
+class GravadorResultados:
+    # recebe as linhas de resultado enquanto a simulação roda e grava em lotes de
+    # linhas_por_lote, acrescentando ao mesmo arquivo; só o lote atual fica em memória.
+    # O tempo gasto gravando fica na fase 'gravacao' do cronometro
+    def __init__(self, caminho, linhas_por_lote=10_000, cronometro=None):
+        extensao = os.path.splitext(caminho)[1].lower()
+        if extensao not in FORMATOS:
+            raise ValueError(f"Formato de resultados não suportado: {extensao} (use {', '.join(FORMATOS)})")
+        self.formato = FORMATOS[extensao]
+        if self.formato != 'csv' and importlib.util.find_spec('pyarrow') is None:
+            raise ImportError(f"Gravar resultados em {extensao} requer o pacote pyarrow")
+
+        self.caminho = caminho
+        self.linhas_por_lote = linhas_por_lote
+        self.cronometro = cronometro or Cronometro()
+        self.gravadas = 0
+        self._lotes = []
+        self._pendentes = 0
+        self._escritor = None
+        self._esquema = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fechar()
+
+    def acrescentar(self, tabela):
+        if len(tabela):
+            self._lotes.append(tabela)
+            self._pendentes += len(tabela)
+        if self._pendentes >= self.linhas_por_lote:
+            self.descarregar()
+
+    def continuar(self, gravadas, tamanho_bytes):
+        # retomada de um ponto de controle: o arquivo volta ao tamanho que tinha nele e as
+        # linhas seguintes são acrescentadas depois dessas; só CSV pode ser reaberto assim
+        if self.formato != 'csv':
+            raise ValueError("Só resultados em CSV podem continuar de um ponto de controle")
+        if gravadas:
+            with open(self.caminho, 'r+b') as arquivo:
+                arquivo.truncate(tamanho_bytes)
+        self.gravadas = gravadas
+        self._lotes = []
+        self._pendentes = 0
+
+    def descarregar(self):
+        if not self._lotes:
+            return
+        with self.cronometro.fase('gravacao'):
+            self._descarregar()
+
+    def _descarregar(self):
+        tabela = pd.concat(self._lotes, ignore_index=True)
+        self._lotes = []
+        self._pendentes = 0
+
+        if self.formato == 'csv':
+            tabela.to_csv(self.caminho, mode='a' if self.gravadas else 'w', header=not self.gravadas, index=False)
+        else:
+            self._gravar_arrow(tabela)
+        self.gravadas += len(tabela)
+
+    def _gravar_arrow(self, tabela):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        lote = pa.Table.from_pandas(tabela, preserve_index=False)
+        if self._escritor is None:
+            self._esquema = lote.schema
+            if self.formato == 'parquet':
+                self._escritor = pq.ParquetWriter(self.caminho, lote.schema)
+            else:
+                self._escritor = pa.ipc.new_file(self.caminho, lote.schema)
+        # os lotes seguintes seguem o esquema do primeiro (ex.: listas vazias em consolidado_com)
+        self._escritor.write_table(lote.cast(self._esquema))
+
+    def fechar(self):
+        self.descarregar()
+        if self._escritor is not None:
+            with self.cronometro.fase('gravacao'):
+                self._escritor.close()
+            self._escritor = None
+
+
+def ler_resultados(caminho):
+    formato = FORMATOS.get(os.path.splitext(caminho)[1].lower())
+    if formato == 'parquet':
+        return pd.read_parquet(caminho)
+    if formato == 'arrow':
+        return pd.read_feather(caminho)
+    tabela = pd.read_csv(caminho)
+    for coluna in tabela.columns:
+        if coluna.startswith('hora_') and not pd.api.types.is_numeric_dtype(tabela[coluna]):
+            tabela[coluna] = pd.to_datetime(tabela[coluna])
+    return tabela
+
+
+def exportar_excel(caminho_resultados, caminho_excel=None):
+    # pós-processamento opcional: converte um arquivo já gravado para .xlsx (requer openpyxl)
+    caminho_excel = caminho_excel or os.path.splitext(caminho_resultados)[0] + '.xlsx'
+    ler_resultados(caminho_resultados).to_excel(caminho_excel, index=False)
+    return caminho_excel
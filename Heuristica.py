@@ -3,9 +3,26 @@ import numpy as np
 from datetime import datetime, timedelta
 import time
 
-class Otimizador:
-    def __init__(self, num_empilhadeiras):
+import BuscaLocal
+from CarregadorEntradas import carregar_entradas
+from FluxoOrdens import FluxoOrdens
+from GravadorResultados import GravadorResultados, exportar_excel
+from IndiceEsteiras import IndiceEsteiras, e_esteira
+from MatrizDistancias import MatrizDistancias
+from RegistroAtribuicoes import RegistroAtribuicoes
+from SimuladorEventos import FrotaEmpilhadeiras, PoliticaDespacho, SimuladorEventos
+
+class Otimizador(PoliticaDespacho):
+    FILAS = ('fila_espera_prioritaria', 'fila_estoque')
+    FASES_INSTRUMENTADAS = PoliticaDespacho.FASES_INSTRUMENTADAS + (
+        'processar_ordem', 'tentar_processar_fila', 'esteiras_ativas', 'atribuir_ordem', 'informar_progresso',
+        'gerar_resultados')
+
+    def __init__(self, num_empilhadeiras, busca_local_s=None):
         self.num_empilhadeiras = num_empilhadeiras
+        # segundos de busca local (BuscaLocal.melhorar) sobre a agenda do despacho guloso; a
+        # busca precisa dos resultados em memória, não num GravadorResultados
+        self.busca_local_s = busca_local_s
         self.resetar()
 
     def resetar(self):
@@ -15,55 +32,118 @@ class Otimizador:
                 'livre_em': None,
                 'distancia_total': 0.0,
                 'distancia_sem_carga': 0.0,
-                'tempo_ocioso_parado': timedelta(0),
-                'tempo_ocioso_movimento': timedelta(0),
-                'ordens_atendidas': []
+                'tempo_ocioso_parado': 0.0,
+                'tempo_ocioso_movimento': 0.0,
             } for i in range(self.num_empilhadeiras)
         }
         self.ordens_nao_atendidas = []
         self.fila_espera_prioritaria = []
         self.fila_estoque = []
         self.tempo_atual = None
+        self.esteiras = IndiceEsteiras()
+        self.frota = FrotaEmpilhadeiras(self.num_empilhadeiras)
+        self.simulador = SimuladorEventos(self)
+        self.matriz_dist = None
+        self.total_de_ordens = 0
+        self.ordens_recebidas = 0
+        self.ordens = None
+        self.fluxo = None
+        self.relogio = None
+        self.registro = RegistroAtribuicoes()
+        self.gravador = None
+        self.atribuidas = []
+        self.registro_gravado = 0
+        self.busca_local = None
 
     def esteiras_ativas(self):
-        esteiras_ocupadas = set()
-        for emp in self.empilhadeiras.values():
-            if emp['livre_em'] and emp['livre_em'] > self.tempo_atual:
-                for ordem in emp['ordens_atendidas']:
-                    if ordem['hora_entrega'] > self.tempo_atual and 'Esteira' in ordem['origem']:
-                        esteiras_ocupadas.add(ordem['origem'])
-        return esteiras_ocupadas
-
-    def otimizar(self, ordens, matriz_dist):
-        self.resetar()
+        return self.esteiras.ocupadas(self.tempo_atual)
 
+    def otimizar(self, ordens, matriz_dist, gravador=None):
         ordens['data_hora'] = pd.to_datetime(ordens['data_hora'], errors='coerce')
         ordens = ordens.dropna(subset=['data_hora']).sort_values('data_hora').reset_index(drop=True)
+        return self.otimizar_em_blocos([ordens], matriz_dist, gravador)
+
+    def otimizar_em_blocos(self, blocos, matriz_dist, gravador=None):
+        # blocos: DataFrames de ordens já em ordem cronológica, lidos um de cada vez; com um
+        # GravadorResultados as linhas vão para o arquivo na ordem das atribuições e o
+        # retorno é (None, métricas)
+        if self.busca_local_s and gravador is not None:
+            raise ValueError("A busca local precisa dos resultados em memória, sem GravadorResultados")
+        self.resetar()
+        self.gravador = gravador
+        self.instrumentacao.iniciar(self)
+        self.iniciar_progresso()
+        try:
+            self.matriz_dist = MatrizDistancias.garantir(matriz_dist)
+            estado_fluxo = self.preparar_estado_inicial()
+            self.fluxo = FluxoOrdens(blocos, self.matriz_dist, guardar_saida=gravador is None, estado=estado_fluxo)
+            self.relogio = self.fluxo.relogio
+
+            self.simulador.executar(self.proximas_chegadas(), retomando=estado_fluxo is not None)
+
+            if self.gravador is not None:
+                self.gravar_atribuidas()
+                self.gravador.descarregar()
+                return None, self.calcular_metricas()
+
+            self.ordens = self.fluxo.tabela_saida()
+            if self.busca_local_s:
+                self.busca_local = BuscaLocal.melhorar(self, self.busca_local_s)
+            return self.gerar_resultados(self.matriz_dist)
+        finally:
+            self.instrumentacao.encerrar()
+
+    def proximas_chegadas(self):
+        for ordem in self.fluxo.ordens():
+            self.total_de_ordens = self.fluxo.carregadas
+            if self.gravador is not None and len(self.atribuidas) >= self.gravador.linhas_por_lote:
+                self.gravar_atribuidas()
+            yield ordem['instante'], ordem
+
+    def gravar_atribuidas(self):
+        # passa ao gravador as atribuições feitas desde a última gravação
+        fim = len(self.registro)
+        ordens = FluxoOrdens.tabela_de_registros(self.atribuidas)
+        self.gravador.acrescentar(self.montar_resultados(ordens, np.arange(self.registro_gravado, fim)))
+        self.atribuidas = []
+        self.registro_gravado = fim
+
+    def ao_chegar(self, ordem):
+        self.instrumentacao.amostra('fila_espera', len(self.fila_espera_prioritaria))
+        idx = self.ordens_recebidas
+        self.ordens_recebidas += 1
+        self.tempo_atual = ordem['instante']
+
+        if idx < self.num_empilhadeiras:
+            self.atribuir_ordem(idx, ordem, self.matriz_dist, forcar_saida_igual=True)
+        else:
+            self.processar_ordem(ordem, self.matriz_dist)
 
-        total_de_ordens = len(ordens)
-
-        matriz_dist = matriz_dist.set_index(matriz_dist.columns[0])
-        matriz_dist = matriz_dist.map(lambda x: float(str(x).replace(',', '.')))
+        self.tentar_processar_fila(self.matriz_dist)
 
-        for idx, (_, ordem) in enumerate(ordens.iterrows()):
-            self.tempo_atual = ordem['data_hora']
+        self.informar_progresso(idx + 1)
 
-            if idx < self.num_empilhadeiras:
-                self.atribuir_ordem(idx, ordem, matriz_dist, forcar_saida_igual=True)
-            else:
-                self.processar_ordem(ordem, matriz_dist)
+    def ao_entregar(self, emp_id, hora_entrega):
+        self.esteiras.avancar(hora_entrega)
 
-            self.tentar_processar_fila(matriz_dist)
-    
-            print(f"Processando: {idx + 1}/{total_de_ordens} ordens ({(idx + 1)/total_de_ordens:.1%})", end="\r")
-            
-        print() 
+    def ao_encerrar(self):
+        self.progresso.encerrar()
 
+        liberacao = None
         while self.fila_espera_prioritaria:
-            self.tempo_atual = self.fila_espera_prioritaria[0]['data_hora']
-            self.tentar_processar_fila(matriz_dist)
-
-        return self.gerar_resultados(matriz_dist)
+            self.tempo_atual = self.fila_espera_prioritaria[0]['instante']
+            if liberacao is not None:
+                self.tempo_atual = max(self.tempo_atual, liberacao)
+            restantes = len(self.fila_espera_prioritaria)
+            self.tentar_processar_fila(self.matriz_dist)
+
+            # se nenhuma ordem saiu da fila, o tempo avança até a próxima esteira liberar
+            # (sem isso o laço não terminava quando o limite de esteiras segurava a fila)
+            liberacao = None
+            if len(self.fila_espera_prioritaria) == restantes:
+                liberacao = self.esteiras.proxima_liberacao(self.tempo_atual)
+                if liberacao is None:
+                    break
 
     def processar_ordem(self, ordem, matriz_dist):
         esteiras_ocupadas = self.esteiras_ativas()
@@ -73,25 +153,8 @@ class Otimizador:
             self.adicionar_fila_espera(ordem)
             return
 
-        melhor_emp = None
-        melhor_custo = float('inf')
-
-        for emp_id, emp in self.empilhadeiras.items():
-            try:
-                pos_atual = emp['posicao'] or ordem['origem']
-                dist_sem_carga = matriz_dist.loc[pos_atual, ordem['origem']]
-                dist_com_carga = matriz_dist.loc[ordem['origem'], ordem['destino']]
-                dist_total = dist_sem_carga + dist_com_carga
-                
-                tempo_espera = max(0, (emp['livre_em'] - ordem['data_hora']).total_seconds()) if emp['livre_em'] else 0
-                custo = dist_total + (tempo_espera * 0.1)
-
-                if custo < melhor_custo:
-                    melhor_custo = custo
-                    melhor_emp = emp_id
-            except Exception as e:
-                print(f"Erro na ordem {ordem.get('ordem', '?')}: {str(e)}")
-                continue
+        custos = self.frota.custos_ordem(matriz_dist.valores, ordem['cod_origem'], ordem['cod_destino'], ordem['instante'])
+        melhor_emp, melhor_custo = self.frota.menor_custo(custos)
 
         if melhor_emp is not None:
             self.atribuir_ordem(melhor_emp, ordem, matriz_dist)
@@ -100,116 +163,130 @@ class Otimizador:
 
     def tentar_processar_fila(self, matriz_dist):
         fila_atualizada = []
-        for ordem in sorted(self.fila_espera_prioritaria, key=lambda x: x['data_hora']):
+        for ordem in sorted(self.fila_espera_prioritaria, key=lambda x: x['instante']):
             esteiras_ocupadas = self.esteiras_ativas()
             if ordem['origem'] not in esteiras_ocupadas and len(esteiras_ocupadas) >= 2:
                 fila_atualizada.append(ordem)
             else:
-                self.processar_ordem(pd.Series(ordem), matriz_dist)
+                self.processar_ordem(ordem, matriz_dist)
 
         self.fila_espera_prioritaria = fila_atualizada
 
     def adicionar_fila_espera(self, ordem):
-        self.fila_espera_prioritaria.append(ordem.to_dict())
+        # cópia do dict da ordem (do FluxoOrdens ou do DespachanteOnline)
+        self.fila_espera_prioritaria.append(dict(ordem))
 
     def atribuir_ordem(self, emp_id, ordem, matriz_dist, forcar_saida_igual=False):
         emp = self.empilhadeiras[emp_id]
+        dist = matriz_dist.valores
 
-        pos_atual = emp['posicao'] if emp['posicao'] else ordem['origem']
-        dist_sem_carga = matriz_dist.loc[pos_atual, ordem['origem']]
+        pos_atual = ordem['cod_origem'] if emp['posicao'] is None else emp['posicao']
+        dist_sem_carga = dist[pos_atual, ordem['cod_origem']]
         tempo_sem_carga = dist_sem_carga / 10
 
-        dist_com_carga = matriz_dist.loc[ordem['origem'], ordem['destino']]
+        dist_com_carga = dist[ordem['cod_origem'], ordem['cod_destino']]
         tempo_com_carga = dist_com_carga / 10
 
-        hora_saida = ordem['data_hora'] if forcar_saida_igual or emp['livre_em'] is None else max(emp['livre_em'], ordem['data_hora']) + timedelta(seconds=tempo_sem_carga)
+        hora_saida = ordem['instante'] if forcar_saida_igual or emp['livre_em'] is None else max(emp['livre_em'], ordem['instante']) + tempo_sem_carga
         
         # tempo ocioso parado antes de começar a mover
-        if emp['livre_em'] and emp['livre_em'] < hora_saida:
+        if emp['livre_em'] is not None and emp['livre_em'] < hora_saida:
             tempo_ocioso_parado = hora_saida - emp['livre_em']
             emp['tempo_ocioso_parado'] += tempo_ocioso_parado
         
         # tempo ocioso em movimento, deslocamento sem carga
-        tempo_ocioso_movimento = timedelta(seconds=tempo_sem_carga)
-
-        hora_coleta = hora_saida + timedelta(seconds=tempo_sem_carga)
-        hora_entrega = hora_coleta + timedelta(seconds=tempo_com_carga)
-
-        self.empilhadeiras[emp_id] = {
-            'posicao': ordem['destino'],
-            'livre_em': hora_entrega,
-            'distancia_total': emp['distancia_total'] + dist_sem_carga + dist_com_carga,
-            'distancia_sem_carga': emp['distancia_sem_carga'] + dist_sem_carga,
-            'tempo_ocioso_parado': emp['tempo_ocioso_parado'],
-            'tempo_ocioso_movimento': emp['tempo_ocioso_movimento'] + tempo_ocioso_movimento,
-            'ordens_atendidas': emp['ordens_atendidas'] + [{
-                **ordem.to_dict(),
-                'hora_saida': hora_saida,
-                'hora_coleta': hora_coleta,
-                'hora_entrega': hora_entrega,
-                'distancia_sem_carga': dist_sem_carga,
-                'distancia_com_carga': dist_com_carga,
-                'distancia_total': dist_sem_carga + dist_com_carga,
-                'tempo_sem_carga': tempo_sem_carga,
-                'tempo_com_carga': tempo_com_carga
-            }]
-        }
-
-    def gerar_resultados(self, _):
-        resultados = []
-        tempos_ociosos_parado = []
-        tempos_ociosos_movimento = []
-        
-        for emp_id, emp in self.empilhadeiras.items():
-            tempos_ociosos_parado.append(emp['tempo_ocioso_parado'].total_seconds())
-            tempos_ociosos_movimento.append(emp['tempo_ocioso_movimento'].total_seconds())
-            
-            for ordem in emp['ordens_atendidas']:
-                resultados.append({
-                    'ordem': ordem['ordem'],
-                    'material': ordem['material'],
-                    'origem': ordem['origem'],
-                    'destino': ordem['destino'],
-                    'empilhadeira': emp_id,
-                    'hora_criacao': ordem['data_hora'],
-                    'hora_saida_empilhadeira': ordem.get('hora_saida'),
-                    'hora_entrega': ordem.get('hora_entrega'),
-                    'distancia_total': ordem.get('distancia_total', 0),
-                    'distancia_sem_carga': ordem.get('distancia_sem_carga', 0),
-                    'distancia_com_carga': ordem.get('distancia_com_carga', 0),
-                    'tempo_espera': (ordem.get('hora_saida') - ordem['data_hora']).total_seconds(),
-                    'tempo_movimento': (ordem.get('hora_entrega') - ordem.get('hora_saida')).total_seconds(),
-                    'tempo_sem_carga': ordem.get('tempo_sem_carga', 0),
-                    'tempo_com_carga': ordem.get('tempo_com_carga', 0)
-                })
+        tempo_ocioso_movimento = tempo_sem_carga
+
+        hora_coleta = hora_saida + tempo_sem_carga
+        hora_entrega = hora_coleta + tempo_com_carga
+
+        if e_esteira(ordem['origem']):
+            self.esteiras.registrar(ordem['origem'], hora_entrega)
+        self.frota.atualizar(emp_id, hora_entrega, ordem['cod_destino'])
+        self.simulador.agendar_entrega(hora_entrega, emp_id)
+
+        emp['posicao'] = ordem['cod_destino']
+        emp['livre_em'] = hora_entrega
+        emp['distancia_total'] = emp['distancia_total'] + dist_sem_carga + dist_com_carga
+        emp['distancia_sem_carga'] += dist_sem_carga
+        emp['tempo_ocioso_movimento'] += tempo_ocioso_movimento
+
+        self.registro.registrar(ordem['linha'], emp_id, ordem['instante'], hora_saida, hora_coleta, hora_entrega,
+                                dist_sem_carga, dist_com_carga, tempo_sem_carga, tempo_com_carga)
+        if self.gravador is not None:
+            self.atribuidas.append(ordem)
+
+    def montar_resultados(self, ordens, linhas):
+        # ordens: colunas de saída (FluxoOrdens.COLUNAS_SAIDA) das ordens nas linhas do registro
+        hora_criacao = self.registro.coluna('hora_criacao')[linhas]
+        hora_saida = self.registro.coluna('hora_saida')[linhas]
+        hora_entrega = self.registro.coluna('hora_entrega')[linhas]
+        dist_sem_carga = self.registro.coluna('distancia_sem_carga')[linhas]
+        dist_com_carga = self.registro.coluna('distancia_com_carga')[linhas]
+
+        return pd.DataFrame({
+            'ordem': ordens['ordem'].to_numpy(),
+            'material': ordens['material'].to_numpy(),
+            'origem': ordens['origem'].to_numpy(),
+            'destino': ordens['destino'].to_numpy(),
+            'empilhadeira': self.registro.coluna('empilhadeira')[linhas],
+            'hora_criacao': ordens['data_hora'].to_numpy(),
+            'hora_saida_empilhadeira': self.relogio.datas(hora_saida),
+            'hora_entrega': self.relogio.datas(hora_entrega),
+            'distancia_total': dist_sem_carga + dist_com_carga,
+            'distancia_sem_carga': dist_sem_carga,
+            'distancia_com_carga': dist_com_carga,
+            'tempo_espera': hora_saida - hora_criacao,
+            'tempo_movimento': hora_entrega - hora_saida,
+            'tempo_sem_carga': self.registro.coluna('tempo_sem_carga')[linhas],
+            'tempo_com_carga': self.registro.coluna('tempo_com_carga')[linhas]
+        })
+
+    def gerar_resultados(self, _=None):
+        # linhas agrupadas por empilhadeira, na ordem em que cada uma atendeu
+        sequencia = self.registro.ordem_por_empilhadeira()
+        ordens = self.ordens.take(self.registro.coluna('linha')[sequencia])
+        return self.montar_resultados(ordens, sequencia), self.calcular_metricas()
+
+    def calcular_metricas(self):
+        # distâncias e deslocamento sem carga das somas do registro; só o ocioso parado passa
+        # pela frota
+        totais = self.registro.totais
+        parado = sum(emp['tempo_ocioso_parado'] for emp in self.empilhadeiras.values())
+        movimento = totais['tempo_sem_carga']
+        num_empilhadeiras = len(self.empilhadeiras)
 
         metricas = {
-            'total_ordens': len(resultados),
+            'total_ordens': len(self.registro),
             'fila_esteira_restante': len(self.fila_espera_prioritaria),
             'fila_estoque_restante': len(self.fila_estoque),
             'nao_atendidas': len(self.fila_espera_prioritaria) + len(self.fila_estoque),
-            'distancia_total': sum(e['distancia_total'] for e in self.empilhadeiras.values()),
-            'distancia_sem_carga': sum(e['distancia_sem_carga'] for e in self.empilhadeiras.values()),
-            'distancia_com_carga': sum(e['distancia_total'] for e in self.empilhadeiras.values()) - sum(e['distancia_sem_carga'] for e in self.empilhadeiras.values()),
-            'tempo_ocioso_parado_total': sum(tempos_ociosos_parado),
-            'tempo_ocioso_movimento_total': sum(tempos_ociosos_movimento),
-            'tempo_ocioso_total': sum(tempos_ociosos_parado) + sum(tempos_ociosos_movimento),
-            'tempo_ocioso_parado_medio': np.mean(tempos_ociosos_parado) if tempos_ociosos_parado else 0.0,
-            'tempo_ocioso_movimento_medio': np.mean(tempos_ociosos_movimento) if tempos_ociosos_movimento else 0.0
+            'distancia_total': totais['distancia_sem_carga'] + totais['distancia_com_carga'],
+            'distancia_sem_carga': totais['distancia_sem_carga'],
+            'distancia_com_carga': totais['distancia_com_carga'],
+            'tempo_ocioso_parado_total': parado,
+            'tempo_ocioso_movimento_total': movimento,
+            'tempo_ocioso_total': parado + movimento,
+            'tempo_ocioso_parado_medio': parado / num_empilhadeiras if num_empilhadeiras else 0.0,
+            'tempo_ocioso_movimento_medio': movimento / num_empilhadeiras if num_empilhadeiras else 0.0
         }
+        if self.busca_local is not None:
+            metricas.update(self.busca_local)
 
-        return pd.DataFrame(resultados), metricas
+        return metricas
 
 if __name__ == "__main__":
-    ordens = pd.read_excel("ordens_unificadas.xlsx")
-    matriz_dist = pd.read_excel("matriz_distancias.xlsx")
+    ordens, matriz_dist = carregar_entradas()
 
     NUM_EMPILHADEIRAS = 12
+    ARQUIVO_RESULTADOS = "resultados_otimizacao_detalhado.csv"
+    EXPORTAR_EXCEL = False
 
     print("\nIniciando otimização...")
     start_time = time.time()
     otimizador = Otimizador(NUM_EMPILHADEIRAS)
-    rotas, metricas = otimizador.otimizar(ordens, matriz_dist)
+    with GravadorResultados(ARQUIVO_RESULTADOS) as gravador:
+        _, metricas = otimizador.otimizar(ordens, matriz_dist, gravador)
     
     end_time = time.time()
     duracao_segundos = end_time - start_time
@@ -226,4 +303,5 @@ if __name__ == "__main__":
     print(f"  - Em movimento sem carga (em segundos): {metricas['tempo_ocioso_movimento_total']:.2f}")
     print(f"Tempo total de execução: {timedelta(seconds=duracao_segundos)}")
 
-    rotas.to_excel("resultados_otimizacao_detalhado.xlsx", index=False)
+    if EXPORTAR_EXCEL:
+        exportar_excel(ARQUIVO_RESULTADOS)
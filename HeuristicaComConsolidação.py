@@ -1,13 +1,38 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from itertools import permutations
 import time
 
-class Otimizador:
-    def __init__(self, num_empilhadeiras, janela_consolidacao_min=15):
+from CarregadorEntradas import carregar_entradas
+from FluxoOrdens import FluxoOrdens
+from GravadorResultados import GravadorResultados, exportar_excel
+from IndiceEsteiras import IndiceEsteiras, e_esteira
+from MatrizDistancias import MatrizDistancias
+from OrdensPendentes import OrdensPendentes
+from PacotesOrdens import BuscaPacotes
+from RegistroAtribuicoes import RegistroAtribuicoes
+from SimuladorEventos import TOLERANCIA_CUSTO, FrotaEmpilhadeiras, PoliticaDespacho, SimuladorEventos
+
+class Otimizador(PoliticaDespacho):
+    CONSULTA_ORDENS_FUTURAS = True
+    ESTADO_EXCLUIDO = PoliticaDespacho.ESTADO_EXCLUIDO + ('busca_pacotes',)
+    FILAS = ('fila_espera_prioritaria',)
+    FASES_INSTRUMENTADAS = PoliticaDespacho.FASES_INSTRUMENTADAS + (
+        'abastecer_pendentes', 'processar_ordem', 'buscar_melhor_consolidacao', 'tentar_processar_fila',
+        'esteiras_ativas', 'atribuir_ordem', 'informar_progresso', 'gerar_resultados')
+
+    def __init__(self, num_empilhadeiras, janela_consolidacao_min=15, max_ordens_pacote=2, otimizar_sequencia=False,
+                 max_candidatas_pacote=8):
         self.num_empilhadeiras = num_empilhadeiras
-        self.janela_consolidacao = timedelta(minutes=janela_consolidacao_min)
+        self.janela_consolidacao = janela_consolidacao_min * 60  # em segundos
+        # pacotes de até max_ordens_pacote ordens (dentro do limite de 3 * base), buscados entre as
+        # max_candidatas_pacote parceiras mais baratas; otimizar_sequencia escolhe a melhor ordem
+        # de coletas e entregas em vez de origem1 -> origem2 -> destino1 -> destino2
+        if max_ordens_pacote < 2:
+            raise ValueError("max_ordens_pacote deve ser pelo menos 2")
+        self.max_ordens_pacote = max_ordens_pacote
+        self.otimizar_sequencia = otimizar_sequencia
+        self.max_candidatas_pacote = max_candidatas_pacote
         self.resetar()
 
     def resetar(self):
@@ -17,143 +42,226 @@ class Otimizador:
                 'livre_em': None,
                 'distancia_total': 0.0,
                 'distancia_sem_carga': 0.0,
-                'tempo_ocioso_parado': timedelta(0),
-                'tempo_ocioso_movimento': timedelta(0),
-                'ordens_atendidas': [],
+                'tempo_ocioso_parado': 0.0,
+                'tempo_ocioso_movimento': 0.0,
             } for i in range(self.num_empilhadeiras)
         }
         self.fila_espera_prioritaria = []
         self.tempo_atual = None
-        self.ordens_pendentes = []
+        self.ordens_pendentes = OrdensPendentes()
+        self.esteiras = IndiceEsteiras()
+        self.frota = FrotaEmpilhadeiras(self.num_empilhadeiras)
+        self.simulador = SimuladorEventos(self)
+        self.matriz_dist = None
+        self.total_de_ordens = 0
+        self.ordens_processadas_contador = 0
+        self.ordens = None
+        self.fluxo = None
+        self.relogio = None
+        self.registro = RegistroAtribuicoes()
+        self.busca_pacotes = None
+        self.gravador = None
+        self.atribuidas = []
+        self.registro_gravado = 0
 
     def esteiras_ativas(self):
-        esteiras_ocupadas = set()
-        for emp in self.empilhadeiras.values():
-            if emp['livre_em'] and emp['livre_em'] > self.tempo_atual:
-                for ordem in emp['ordens_atendidas']:
-                    if isinstance(ordem, dict) and ordem.get('hora_entrega_final', self.tempo_atual) > self.tempo_atual and 'Esteira' in ordem['origem']:
-                        esteiras_ocupadas.add(ordem['origem'])
-        return esteiras_ocupadas
-
-    def otimizar(self, ordens, matriz_dist):
-        self.resetar()
+        return self.esteiras.ocupadas(self.tempo_atual)
 
+    def otimizar(self, ordens, matriz_dist, gravador=None):
         ordens['data_hora'] = pd.to_datetime(ordens['data_hora'], errors='coerce')
         ordens = ordens.dropna(subset=['data_hora']).sort_values('data_hora').reset_index(drop=True)
-        self.ordens_pendentes = [ordem for _, ordem in ordens.iterrows()]
+        return self.otimizar_em_blocos([ordens], matriz_dist, gravador)
 
-        matriz_dist = matriz_dist.set_index(matriz_dist.columns[0])
-        matriz_dist = matriz_dist.map(lambda x: float(str(x).replace(',', '.')))
+    def otimizar_em_blocos(self, blocos, matriz_dist, gravador=None):
+        # blocos: DataFrames de ordens já em ordem cronológica; só as ordens até o fim da
+        # janela de consolidação da próxima chegada ficam carregadas. Com um GravadorResultados
+        # as linhas vão para o arquivo na ordem das atribuições e o retorno é (None, métricas)
+        self.resetar()
+        self.gravador = gravador
+        self.instrumentacao.iniciar(self)
+        self.iniciar_progresso()
+        try:
+            self.matriz_dist = MatrizDistancias.garantir(matriz_dist)
+            estado_fluxo = self.preparar_estado_inicial()
+            if self.max_ordens_pacote > 2 or self.otimizar_sequencia:
+                self.busca_pacotes = BuscaPacotes(self.matriz_dist, self.max_ordens_pacote, self.otimizar_sequencia,
+                                                  self.max_candidatas_pacote)
+            self.fluxo = FluxoOrdens(blocos, self.matriz_dist, guardar_saida=gravador is None, estado=estado_fluxo)
+            self.relogio = self.fluxo.relogio
+
+            self.simulador.executar(self.proximas_chegadas(), retomando=estado_fluxo is not None)
+
+            if self.gravador is not None:
+                self.gravar_atribuidas()
+                self.gravador.descarregar()
+                return None, self.calcular_metricas()
+
+            self.ordens = self.fluxo.tabela_saida()
+            return self.gerar_resultados()
+        finally:
+            self.instrumentacao.encerrar()
+
+    def proximas_chegadas(self):
+        # consome as pendentes sob demanda: ordens consolidadas saem da lista antes de chegar
+        while True:
+            self.abastecer_pendentes()
+            if not self.ordens_pendentes:
+                return
+            if self.gravador is not None and len(self.atribuidas) >= self.gravador.linhas_por_lote:
+                self.gravar_atribuidas()
+            ordem_atual = self.ordens_pendentes.retirar_primeira()
+            yield ordem_atual['instante'], ordem_atual
+
+    def gravar_atribuidas(self):
+        # passa ao gravador as atribuições feitas desde a última gravação; só é chamado entre
+        # eventos, então as ordens de um mesmo pacote vão juntas
+        fim = len(self.registro)
+        ordens = FluxoOrdens.tabela_de_registros(self.atribuidas)
+        self.gravador.acrescentar(self.montar_resultados(ordens, np.arange(self.registro_gravado, fim)))
+        self.atribuidas = []
+        self.registro_gravado = fim
+
+    def abastecer_pendentes(self):
+        # lê blocos até cobrir a janela de consolidação da próxima ordem pendente
+        while not self.fluxo.esgotado and (not self.ordens_pendentes or self.fluxo.ultimo_instante <=
+                                           self.ordens_pendentes.proximo_instante() + self.janela_consolidacao):
+            bloco = self.fluxo.proximo_bloco()
+            if bloco is None:
+                break
+            colunas = self.preparar_empilhamento(bloco)
+            self.ordens_pendentes.acrescentar(bloco.to_dict('records'), self.grupos_empilhamento(bloco), colunas)
+            self.total_de_ordens = self.fluxo.carregadas
+
+    def ao_chegar(self, ordem_atual):
+        self.instrumentacao.amostra('fila_espera', len(self.fila_espera_prioritaria))
+        self.tempo_atual = ordem_atual['instante']
         
-        total_de_ordens = len(self.ordens_pendentes)
-        ordens_processadas_contador = 0
+        self.ordens_processadas_contador += 1
+        self.informar_progresso(self.ordens_processadas_contador)
         
-        print() 
-
-        while self.ordens_pendentes:
-            ordem_atual = self.ordens_pendentes.pop(0)
-            self.tempo_atual = ordem_atual['data_hora']
-            
-            ordens_processadas_contador += 1
-            print(f"Processando: {ordens_processadas_contador}/{total_de_ordens} ordens ({ordens_processadas_contador/total_de_ordens:.1%})", end="\r")
+        self.processar_ordem(ordem_atual, self.matriz_dist)
+        self.tentar_processar_fila(self.matriz_dist)
 
-            self.processar_ordem(ordem_atual, matriz_dist)
-            self.tentar_processar_fila(matriz_dist)
+    def ao_entregar(self, emp_id, hora_entrega):
+        self.esteiras.avancar(hora_entrega)
 
-        print("\n\nProcessando ordens restantes da fila de espera...")
+    def ao_encerrar(self):
+        self.progresso.encerrar()
         
         while self.fila_espera_prioritaria:
-            self.fila_espera_prioritaria.sort(key=lambda x: x['data_hora'])
-            ordem_dict_para_processar = self.fila_espera_prioritaria.pop(0)
-            ordem = pd.Series(ordem_dict_para_processar)
+            self.fila_espera_prioritaria.sort(key=lambda x: x['instante'])
+            ordem = self.fila_espera_prioritaria.pop(0)
             
-            print(f"Forçando atribuição da ordem em espera: {ordem['ordem']}", end='\r')
-
-            id_emp_disponivel_mais_cedo = min(self.empilhadeiras, key=lambda i: self.empilhadeiras[i]['livre_em'] or self.tempo_atual)
+            id_emp_disponivel_mais_cedo = min(self.empilhadeiras, key=lambda i: self.tempo_atual if self.empilhadeiras[i]['livre_em'] is None else self.empilhadeiras[i]['livre_em'])
             emp_disponivel_mais_cedo = self.empilhadeiras[id_emp_disponivel_mais_cedo]
 
-            self.tempo_atual = max(self.tempo_atual, emp_disponivel_mais_cedo['livre_em'] or self.tempo_atual, ordem['data_hora'])
+            livre_em = emp_disponivel_mais_cedo['livre_em']
+            self.tempo_atual = max(self.tempo_atual, self.tempo_atual if livre_em is None else livre_em, ordem['instante'])
             
-            self.atribuir_ordem(id_emp_disponivel_mais_cedo, [ordem], matriz_dist)
-
-        print("\nOtimização concluída.")
-        return self.gerar_resultados()
+            self.atribuir_ordem(id_emp_disponivel_mais_cedo, [ordem], self.matriz_dist)
 
     def processar_ordem(self, ordem, matriz_dist):
         esteiras_ocupadas = self.esteiras_ativas()
-        if 'Esteira' in str(ordem['origem']) and (ordem['origem'] in esteiras_ocupadas or len(esteiras_ocupadas) >= 2):
+        if e_esteira(ordem['origem']) and (ordem['origem'] in esteiras_ocupadas or len(esteiras_ocupadas) >= 2):
             self.adicionar_fila_espera(ordem)
             return
 
-        melhor_consolidacao = self.buscar_melhor_consolidacao(ordem, matriz_dist)
         melhor_emp_simples, custo_simples = self.encontrar_melhor_empilhadeira_ordem(ordem, matriz_dist)
+        melhor_consolidacao = self.buscar_melhor_consolidacao(ordem, matriz_dist, custo_simples)
 
-        if melhor_consolidacao and melhor_consolidacao['custo_total'] < custo_simples:
-            self.ordens_pendentes = [o for o in self.ordens_pendentes if o['ordem'] != melhor_consolidacao['ordem_adicional']['ordem']]
-            self.atribuir_ordem(melhor_consolidacao['emp_id'], melhor_consolidacao['pacote_ordens'], matriz_dist)
+        if melhor_consolidacao and melhor_consolidacao['custo_total'] < custo_simples - TOLERANCIA_CUSTO:
+            for ordem_adicional in melhor_consolidacao['ordens_adicionais']:
+                self.ordens_pendentes.remover(ordem_adicional['ordem'])
+            self.atribuir_ordem(melhor_consolidacao['emp_id'], melhor_consolidacao['pacote_ordens'], matriz_dist,
+                                melhor_consolidacao['rota'])
         elif melhor_emp_simples is not None:
             self.atribuir_ordem(melhor_emp_simples, [ordem], matriz_dist)
         else:
             self.adicionar_fila_espera(ordem)
             
-    def buscar_melhor_consolidacao(self, ordem_principal, matriz_dist):
-        melhor_opcao = None
-        melhor_custo_consolidado = float('inf')
-        
-        limite_tempo = ordem_principal['data_hora'] + self.janela_consolidacao
-        candidatas = [o for o in self.ordens_pendentes if o['ordem'] != ordem_principal['ordem'] and o['data_hora'] <= limite_tempo]
+    def preparar_empilhamento(self, ordens):
+        # colunas usadas na busca de parceiras, lidas por posição em OrdensPendentes.coluna
+        return {
+            'ordem': ordens['ordem'].to_numpy(),
+            'cod_origem': ordens['cod_origem'].to_numpy(),
+            'cod_destino': ordens['cod_destino'].to_numpy(),
+            'quantidade': ordens['quantidade'].to_numpy() if 'quantidade' in ordens else np.zeros(len(ordens)),
+        }
+
+    def grupos_empilhamento(self, ordens):
+        # só ordens com a mesma base podem ser empilhadas juntas
+        if 'base' not in ordens or 'quantidade' not in ordens:
+            return None
+        return [() if pd.isna(base) else (('base', base),) for base in ordens['base']]
+
+    def grupos_compativeis(self, ordem):
+        if 'base' not in ordem or 'quantidade' not in ordem or pd.isna(ordem['base']):
+            return ()
+        return (('base', ordem['base']),)
+
+    def buscar_melhor_consolidacao(self, ordem_principal, matriz_dist, custo_simples=float('inf')):
+        limite_tempo = ordem_principal['instante'] + self.janela_consolidacao
+        grupos = self.grupos_compativeis(ordem_principal)
+        if not grupos: return None
         
-        if 'base' not in ordem_principal or 'quantidade' not in ordem_principal: return None
+        candidatas = self.ordens_pendentes.linhas_ate(limite_tempo, grupos)
         capacidade_max = 3 * ordem_principal['base']
-
-        for ordem_adicional in candidatas:
-            if ordem_adicional.get('base') != ordem_principal['base']: continue
-            if (ordem_principal['quantidade'] + ordem_adicional.get('quantidade', 0)) > capacidade_max: continue
-
-            pacote_ordens = [ordem_principal, ordem_adicional]
-            
-            for emp_id, emp in self.empilhadeiras.items():
-                pos_atual = emp['posicao'] or pacote_ordens[0]['origem']
-                
-                dist_consolidada = (matriz_dist.loc[pos_atual, pacote_ordens[0]['origem']] +
-                                    matriz_dist.loc[pacote_ordens[0]['origem'], pacote_ordens[1]['origem']] +
-                                    matriz_dist.loc[pacote_ordens[1]['origem'], pacote_ordens[0]['destino']] +
-                                    matriz_dist.loc[pacote_ordens[0]['destino'], pacote_ordens[1]['destino']])
-
-                hora_disponivel = emp['livre_em'] or self.tempo_atual
-                tempo_espera = max(0, (hora_disponivel - self.tempo_atual).total_seconds())
-                custo_atual = dist_consolidada + (tempo_espera * 0.1)
-
-                if custo_atual < melhor_custo_consolidado:
-                    melhor_custo_consolidado = custo_atual
-                    melhor_opcao = {'emp_id': emp_id, 'pacote_ordens': pacote_ordens, 'ordem_adicional': ordem_adicional, 'custo_total': custo_atual}
-        return melhor_opcao
+        candidatas = candidatas[(self.ordens_pendentes.coluna('ordem', candidatas) != ordem_principal['ordem'])
+                                & ((ordem_principal['quantidade'] + self.ordens_pendentes.coluna('quantidade', candidatas)) <= capacidade_max)]
+        self.instrumentacao.amostra('candidatas', len(candidatas))
+        if not len(candidatas):
+            return None
+        if self.busca_pacotes is not None:
+            return self.buscar_melhor_pacote(ordem_principal, candidatas, capacidade_max, custo_simples)
+
+        dist = matriz_dist.valores
+        origem1, destino1 = ordem_principal['cod_origem'], ordem_principal['cod_destino']
+        origens2 = self.ordens_pendentes.coluna('cod_origem', candidatas)
+        destinos2 = self.ordens_pendentes.coluna('cod_destino', candidatas)
+
+        # custos em uma matriz candidatas x empilhadeiras para a rota origem1 -> origem2 -> destino1 -> destino2
+        dist_sem_carga = self.frota.distancias_sem_carga(dist, origem1)
+        tempo_espera = self.frota.tempos_espera(self.tempo_atual, self.tempo_atual)
+        dist_consolidada = (((dist_sem_carga[None, :] +
+                              dist[origem1, origens2][:, None]) +
+                             dist[origens2, destino1][:, None]) +
+                            dist[destino1, destinos2][:, None])
+        custos = dist_consolidada + (tempo_espera * 0.1)[None, :]
+
+        indice, custo = self.frota.menor_custo(custos)
+        if indice is None:
+            return None
+
+        idx_candidata, emp_id = indice
+        ordem_adicional = self.ordens_pendentes.ordem(candidatas[idx_candidata])
+        return {'emp_id': emp_id, 'pacote_ordens': [ordem_principal, ordem_adicional], 'ordens_adicionais': [ordem_adicional],
+                'custo_total': custo, 'rota': None}
+
+    def buscar_melhor_pacote(self, ordem_principal, candidatas, capacidade, custo_simples, compativel=None):
+        # pacotes de mais de 2 ordens e/ou com a melhor sequência de coletas e entregas
+        pacote = self.busca_pacotes.buscar(
+            ordem_principal['cod_origem'], ordem_principal['cod_destino'], ordem_principal['quantidade'], capacidade,
+            self.ordens_pendentes.coluna('cod_origem', candidatas), self.ordens_pendentes.coluna('cod_destino', candidatas),
+            self.ordens_pendentes.coluna('quantidade', candidatas), self.frota, self.tempo_atual, custo_simples, compativel)
+        if pacote is None:
+            return None
+
+        ordens_adicionais = [self.ordens_pendentes.ordem(candidatas[i]) for i in pacote['adicionais']]
+        return {'emp_id': pacote['emp_id'], 'pacote_ordens': [ordem_principal] + ordens_adicionais,
+                'ordens_adicionais': ordens_adicionais, 'custo_total': pacote['custo'], 'rota': pacote['rota']}
 
     def encontrar_melhor_empilhadeira_ordem(self, ordem, matriz_dist):
-        melhor_emp, melhor_custo = None, float('inf')
-        for emp_id, emp in self.empilhadeiras.items():
-            pos_atual = emp['posicao'] or ordem['origem']
-            dist_sem_carga = matriz_dist.loc[pos_atual, ordem['origem']]
-            dist_com_carga = matriz_dist.loc[ordem['origem'], ordem['destino']]
-            dist_total = dist_sem_carga + dist_com_carga
-            
-            hora_disponivel = emp['livre_em'] or self.tempo_atual
-            tempo_espera = max(0, (hora_disponivel - ordem['data_hora']).total_seconds())
-            custo = dist_total + (tempo_espera * 0.1)
-
-            if custo < melhor_custo:
-                melhor_custo, melhor_emp = custo, emp_id
-        return melhor_emp, melhor_custo
+        custos = self.frota.custos_ordem(matriz_dist.valores, ordem['cod_origem'], ordem['cod_destino'], ordem['instante'],
+                                         disponivel_sem_uso=self.tempo_atual)
+        return self.frota.menor_custo(custos)
 
     def tentar_processar_fila(self, matriz_dist):
-        fila_processada = []
         # evita modificar a lista enquanto itera sobre ela
-        ordens_na_fila = list(self.fila_espera_prioritaria)
-        self.fila_espera_prioritaria = [] 
-        for ordem_dict in ordens_na_fila:
-            ordem = pd.Series(ordem_dict)
+        ordens_na_fila = self.fila_espera_prioritaria
+        self.fila_espera_prioritaria = []
+        for ordem in ordens_na_fila:
             esteiras_ocupadas = self.esteiras_ativas()
-            if 'Esteira' in str(ordem['origem']) and (ordem['origem'] in esteiras_ocupadas or len(esteiras_ocupadas) >= 2):
+            if e_esteira(ordem['origem']) and (ordem['origem'] in esteiras_ocupadas or len(esteiras_ocupadas) >= 2):
                 # se não pode processar adiciona de volta a fila principal
                 self.adicionar_fila_espera(ordem)
             else:
@@ -161,39 +269,46 @@ class Otimizador:
                 self.processar_ordem(ordem, matriz_dist)
 
     def adicionar_fila_espera(self, ordem):
-        self.fila_espera_prioritaria.append(ordem.to_dict())
-
-    def atribuir_ordem(self, emp_id, pacote_ordens, matriz_dist):
+        # a fila guarda dicts, convertidos uma vez só; recriar uma Series por ordem a cada
+        # chegada dominava o tempo com a frota sobrecarregada
+        self.fila_espera_prioritaria.append(ordem if isinstance(ordem, dict) else ordem.to_dict())
+
+    def atribuir_ordem(self, emp_id, pacote_ordens, matriz_dist, rota=None):
+        # rota: (coletas, entregas) com os códigos dos locais na ordem de visita; sem ela, as
+        # origens e depois os destinos na ordem do pacote
+        if rota is None:
+            rota = ([ordem['cod_origem'] for ordem in pacote_ordens], [ordem['cod_destino'] for ordem in pacote_ordens])
+        coletas, entregas = rota
         emp = self.empilhadeiras[emp_id]
-        pos_inicial_emp = emp['posicao'] or pacote_ordens[0]['origem']
+        dist = matriz_dist.valores
+        pos_inicial_emp = coletas[0] if emp['posicao'] is None else emp['posicao']
         
-        hora_criacao_mais_tarde = max(ordem['data_hora'] for ordem in pacote_ordens)
-        hora_disponivel_empilhadeira = emp['livre_em'] or self.tempo_atual
+        hora_criacao_mais_tarde = max(ordem['instante'] for ordem in pacote_ordens)
+        hora_disponivel_empilhadeira = self.tempo_atual if emp['livre_em'] is None else emp['livre_em']
         
         hora_saida_base = max(hora_disponivel_empilhadeira, hora_criacao_mais_tarde)
 
-        dist_sem_carga_viagem = matriz_dist.loc[pos_inicial_emp, pacote_ordens[0]['origem']]
-        tempo_sem_carga_viagem = timedelta(seconds=dist_sem_carga_viagem / 10)
+        dist_sem_carga_viagem = dist[pos_inicial_emp, coletas[0]]
+        tempo_sem_carga_viagem = dist_sem_carga_viagem / 10
 
         dist_com_carga_viagem = 0
-        pos_atual = pacote_ordens[0]['origem']
+        pos_atual = coletas[0]
         
-        for i in range(len(pacote_ordens) - 1):
-            proxima_origem = pacote_ordens[i+1]['origem']
-            dist_com_carga_viagem += matriz_dist.loc[pos_atual, proxima_origem]
+        for proxima_origem in coletas[1:]:
+            dist_com_carga_viagem += dist[pos_atual, proxima_origem]
             pos_atual = proxima_origem
         
-        for ordem in pacote_ordens:
-            dist_com_carga_viagem += matriz_dist.loc[pos_atual, ordem['destino']]
-            pos_atual = ordem['destino']
+        for destino in entregas:
+            dist_com_carga_viagem += dist[pos_atual, destino]
+            pos_atual = destino
 
         dist_total_viagem = dist_sem_carga_viagem + dist_com_carga_viagem
-        tempo_com_carga_viagem = timedelta(seconds=dist_com_carga_viagem / 10)
+        tempo_com_carga_viagem = dist_com_carga_viagem / 10
         
         tempo_movimento_total_viagem = tempo_sem_carga_viagem + tempo_com_carga_viagem
         hora_entrega_final = hora_saida_base + tempo_movimento_total_viagem
         
-        if emp['livre_em'] and emp['livre_em'] < hora_saida_base:
+        if emp['livre_em'] is not None and emp['livre_em'] < hora_saida_base:
             emp['tempo_ocioso_parado'] += (hora_saida_base - emp['livre_em'])
         
         emp['tempo_ocioso_movimento'] += tempo_sem_carga_viagem
@@ -203,62 +318,80 @@ class Otimizador:
         emp['livre_em'] = hora_entrega_final
 
         for ordem in pacote_ordens:
-             emp['ordens_atendidas'].append({
-                **ordem.to_dict(),
-                'hora_saida_empilhadeira': hora_saida_base,
-                'hora_entrega_final': hora_entrega_final,
-                'consolidado_com': [o['ordem'] for o in pacote_ordens if o['ordem'] != ordem['ordem']],
-                'distancia_total_viagem': dist_total_viagem,
-                'distancia_sem_carga_viagem': dist_sem_carga_viagem,
-                'distancia_com_carga_viagem': dist_com_carga_viagem,
-                'tempo_sem_carga_viagem_s': tempo_sem_carga_viagem.total_seconds(),
-                'tempo_com_carga_viagem_s': tempo_com_carga_viagem.total_seconds(),
-                'tempo_movimento_total_viagem_s': tempo_movimento_total_viagem.total_seconds(),
-            })
+            if e_esteira(ordem['origem']):
+                self.esteiras.registrar(ordem['origem'], hora_entrega_final)
+        self.frota.atualizar(emp_id, hora_entrega_final, pos_atual)
+        self.simulador.agendar_entrega(hora_entrega_final, emp_id)
+
+        hora_coleta = hora_saida_base + tempo_sem_carga_viagem
+        pacote = pacote_ordens[0]['linha'] if len(pacote_ordens) > 1 else -1
+        for ordem in pacote_ordens:
+            self.registro.registrar(ordem['linha'], emp_id, ordem['instante'], hora_saida_base, hora_coleta,
+                                    hora_entrega_final, dist_sem_carga_viagem, dist_com_carga_viagem,
+                                    tempo_sem_carga_viagem, tempo_com_carga_viagem, pacote=pacote)
+            if self.gravador is not None:
+                self.atribuidas.append(ordem)
 
     def gerar_resultados(self):
-        resultados = []
-        for emp_id, emp in self.empilhadeiras.items():
-            for ordem in emp['ordens_atendidas']:
-                if isinstance(ordem, dict):
-                    resultados.append({
-                        'ordem': ordem.get('ordem'),
-                        'material': ordem.get('material'),
-                        'origem': ordem.get('origem'),
-                        'destino': ordem.get('destino'),
-                        'empilhadeira': emp_id,
-                        'hora_criacao': ordem.get('data_hora'),
-                        'hora_saida_empilhadeira': ordem.get('hora_saida_empilhadeira'),
-                        'hora_entrega': ordem.get('hora_entrega_final'),
-                        'distancia_total': ordem.get('distancia_total_viagem'),
-                        'distancia_sem_carga': ordem.get('distancia_sem_carga_viagem'),
-                        'distancia_com_carga': ordem.get('distancia_com_carga_viagem'),
-                        'tempo_movimento_total': ordem.get('tempo_movimento_total_viagem_s'),
-                        'tempo_sem_carga': ordem.get('tempo_sem_carga_viagem_s'),
-                        'tempo_com_carga': ordem.get('tempo_com_carga_viagem_s'),
-                        'consolidado_com': ordem.get('consolidado_com', [])
-                    })
-
-        df_resultados = pd.DataFrame(resultados).sort_values(by='hora_criacao').reset_index(drop=True)
-        
-        dist_total = df_resultados['distancia_total'].sum()
-        dist_sem_carga = df_resultados['distancia_sem_carga'].sum()
-        dist_com_carga = df_resultados['distancia_com_carga'].sum()
-        
-        tempo_sem_carga_total = df_resultados['tempo_sem_carga'].sum()
-        tempo_com_carga_total = df_resultados['tempo_com_carga'].sum()
-        tempo_movimento_total = df_resultados['tempo_movimento_total'].sum()
+        # linhas agrupadas por empilhadeira, na ordem em que cada uma atendeu
+        sequencia = self.registro.ordem_por_empilhadeira()
+        ordens = self.ordens.take(self.registro.coluna('linha')[sequencia])
+        # ordena só a hora de criação, com a mesma ordenação (instável) que sort_values fazia na
+        # tabela pronta, e monta a tabela já na ordem final
+        por_criacao = ordens['data_hora'].reset_index(drop=True).sort_values().index.to_numpy()
+        return self.montar_resultados(ordens.iloc[por_criacao], sequencia[por_criacao]), self.calcular_metricas()
+
+    def montar_resultados(self, ordens, linhas):
+        # ordens: colunas de saída (FluxoOrdens.COLUNAS_SAIDA) das ordens nas linhas do registro,
+        # indexadas pela linha global; as ordens de um pacote estão sempre todas entre elas
+        hora_saida = self.registro.coluna('hora_saida')[linhas]
+        hora_entrega = self.registro.coluna('hora_entrega')[linhas]
+        dist_sem_carga = self.registro.coluna('distancia_sem_carga')[linhas]
+        dist_com_carga = self.registro.coluna('distancia_com_carga')[linhas]
+        pacotes = self.registro.coluna('pacote')[linhas].tolist()
+        codigos = ordens['ordem'].tolist()
+        # códigos das ordens de cada pacote, na ordem do registro
+        membros = {}
+        for i in np.argsort(linhas, kind='stable'):
+            if pacotes[i] >= 0:
+                membros.setdefault(pacotes[i], []).append(codigos[i])
+
+        return pd.DataFrame({
+            'ordem': ordens['ordem'].to_numpy(),
+            'material': ordens['material'].to_numpy(),
+            'origem': ordens['origem'].to_numpy(),
+            'destino': ordens['destino'].to_numpy(),
+            'empilhadeira': self.registro.coluna('empilhadeira')[linhas],
+            'hora_criacao': ordens['data_hora'].to_numpy(),
+            'hora_saida_empilhadeira': self.relogio.datas(hora_saida),
+            'hora_entrega': self.relogio.datas(hora_entrega),
+            'distancia_total': dist_sem_carga + dist_com_carga,
+            'distancia_sem_carga': dist_sem_carga,
+            'distancia_com_carga': dist_com_carga,
+            'tempo_movimento_total': hora_entrega - hora_saida,
+            'tempo_sem_carga': self.registro.coluna('tempo_sem_carga')[linhas],
+            'tempo_com_carga': self.registro.coluna('tempo_com_carga')[linhas],
+            'consolidado_com': [[c for c in membros[p] if c != codigo] if p >= 0 else [] for p, codigo in zip(pacotes, codigos)]
+        })
+
+    def calcular_metricas(self):
+        # das somas que o registro mantém a cada atribuição: custa o mesmo no meio e no fim
+        totais = self.registro.totais
+        dist_sem_carga = totais['distancia_sem_carga']
+        dist_com_carga = totais['distancia_com_carga']
+        dist_total = dist_sem_carga + dist_com_carga
         
-        tempo_inicio = df_resultados['hora_criacao'].min()
-        tempo_fim = df_resultados['hora_entrega'].max()
-        tempo_total_simulacao = (tempo_fim - tempo_inicio).total_seconds()
+        tempo_sem_carga_total = totais['tempo_sem_carga']
+        tempo_com_carga_total = totais['tempo_com_carga']
+        tempo_movimento_total = totais['tempo_movimento']
+        tempo_total_simulacao = self.registro.duracao()
         
         tempo_ocioso_total = (self.num_empilhadeiras * tempo_total_simulacao) - tempo_movimento_total
         tempo_ocioso_movimento = tempo_sem_carga_total
         tempo_ocioso_parado = tempo_ocioso_total - tempo_ocioso_movimento
 
         metricas = {
-            'total_ordens_processadas': len(df_resultados),
+            'total_ordens_processadas': len(self.registro),
             'ordens_nao_atendidas_final': len(self.fila_espera_prioritaria),
             'distancia_total': dist_total,
             'distancia_sem_carga': dist_sem_carga,
@@ -268,20 +401,23 @@ class Otimizador:
             'tempo_ocioso_movimento': tempo_ocioso_movimento,
             'tempo_com_carga_total': tempo_com_carga_total,
         }
-        return df_resultados, metricas
+        return metricas
 
 
 if __name__ == "__main__":
-    ordens = pd.read_excel("ordens_unificadas.xlsx")
-    matriz_dist = pd.read_excel("matriz_distancias.xlsx")
+    ordens, matriz_dist = carregar_entradas()
 
     NUM_EMPILHADEIRAS = 12
     JANELA_CONSOLIDACAO_MIN = 15
+    ARQUIVO_RESULTADOS = "resultados_otimizacao_consolidacao15min.csv"
+    EXPORTAR_EXCEL = False
 
     print("\nIniciando otimização...")
     start_time = time.time()
     otimizador = Otimizador(NUM_EMPILHADEIRAS, JANELA_CONSOLIDACAO_MIN)
-    rotas, metricas = otimizador.otimizar(ordens, matriz_dist)
+    with GravadorResultados(ARQUIVO_RESULTADOS) as gravador:
+        _, metricas = otimizador.otimizar(ordens, matriz_dist, gravador)
+    print("\nOtimização concluída.")
     
     end_time = time.time()
     duracao_segundos = end_time - start_time
@@ -299,4 +435,5 @@ if __name__ == "__main__":
     print(f"  - Em movimento sem carga: {timedelta(seconds=metricas['tempo_ocioso_movimento'])} ({metricas['tempo_ocioso_movimento']:.2f}s)")
     print(f"Tempo total de execução: {timedelta(seconds=duracao_segundos)}")
 
-    rotas.to_excel("resultados_otimizacao_consolidacao15min.xlsx", index=False)
+    if EXPORTAR_EXCEL:
+        exportar_excel(ARQUIVO_RESULTADOS)
@@ -3,7 +3,19 @@ import numpy as np
 from datetime import datetime, timedelta
 import time
 
-class HeuristicaIngenuaFIFO:
+from CarregadorEntradas import carregar_entradas
+from FluxoOrdens import FluxoOrdens
+from GravadorResultados import GravadorResultados, exportar_excel
+from IndiceEsteiras import IndiceEsteiras, e_esteira
+from MatrizDistancias import MatrizDistancias
+from RegistroAtribuicoes import RegistroAtribuicoes
+from SimuladorEventos import FrotaEmpilhadeiras, PoliticaDespacho, SimuladorEventos
+
+class HeuristicaIngenuaFIFO(PoliticaDespacho):
+    FILAS = ('fila_espera_esteira',)
+    FASES_INSTRUMENTADAS = PoliticaDespacho.FASES_INSTRUMENTADAS + (
+        'tentar_processar_fila_esteira', 'esteiras_ativas', 'atribuir_ordem', 'informar_progresso', 'gerar_resultados')
+
     def __init__(self, num_empilhadeiras):
         self.num_empilhadeiras = num_empilhadeiras
         self.resetar()
@@ -15,132 +27,156 @@ class HeuristicaIngenuaFIFO:
                 'livre_em': None,
                 'distancia_total': 0.0,
                 'distancia_sem_carga': 0.0,
-                'tempo_ocioso_parado': timedelta(0),
-                'tempo_ocioso_movimento': timedelta(0),
-                'ordens_atendidas': []
+                'tempo_ocioso_parado': 0.0,
+                'tempo_ocioso_movimento': 0.0,
             } for i in range(self.num_empilhadeiras)
         }
         self.tempo_atual = None
-        self.ordens_pendentes = []
         self.fila_espera_esteira = []
+        self.esteiras = IndiceEsteiras()
+        self.frota = FrotaEmpilhadeiras(self.num_empilhadeiras)
+        self.simulador = SimuladorEventos(self)
+        self.matriz_dist = None
+        self.total_de_ordens = 0
+        self.ordens_processadas_contador = 0
+        self.ordens = None
+        self.fluxo = None
+        self.relogio = None
+        self.registro = RegistroAtribuicoes()
+        self.gravador = None
+        self.atribuidas = []
+        self.registro_gravado = 0
 
     def esteiras_ativas(self):
-        esteiras_ocupadas = set()
         if self.tempo_atual is None:
-            return esteiras_ocupadas 
-        for emp in self.empilhadeiras.values():
-            if emp['livre_em'] and emp['livre_em'] > self.tempo_atual:
-                for ordem in emp['ordens_atendidas']:
-                    if ordem['hora_entrega'] > self.tempo_atual and 'Esteira' in ordem['origem']:
-                        esteiras_ocupadas.add(ordem['origem'])
-        return esteiras_ocupadas
+            return set()
+        return self.esteiras.ocupadas(self.tempo_atual)
 
     def atribuir_ordem(self, emp_id, ordem, matriz_dist):
         emp = self.empilhadeiras[emp_id]
+        dist = matriz_dist.valores
         
-        pos_anterior = emp['posicao'] if emp['posicao'] else ordem['origem']
-        dist_sem_carga = matriz_dist.loc[pos_anterior, ordem['origem']]
-        tempo_sem_carga = timedelta(seconds=(dist_sem_carga / 10))
+        pos_anterior = ordem['cod_origem'] if emp['posicao'] is None else emp['posicao']
+        dist_sem_carga = dist[pos_anterior, ordem['cod_origem']]
+        tempo_sem_carga = dist_sem_carga / 10
 
-        dist_com_carga = matriz_dist.loc[ordem['origem'], ordem['destino']]
-        tempo_com_carga = timedelta(seconds=(dist_com_carga / 10))
+        dist_com_carga = dist[ordem['cod_origem'], ordem['cod_destino']]
+        tempo_com_carga = dist_com_carga / 10
 
-        hora_inicio_movimento = max(emp['livre_em'] or self.tempo_atual, self.tempo_atual)
+        hora_inicio_movimento = max(self.tempo_atual if emp['livre_em'] is None else emp['livre_em'], self.tempo_atual)
         
-        if emp['livre_em'] and emp['livre_em'] < hora_inicio_movimento:
+        if emp['livre_em'] is not None and emp['livre_em'] < hora_inicio_movimento:
             emp['tempo_ocioso_parado'] += (hora_inicio_movimento - emp['livre_em'])
 
         hora_coleta = hora_inicio_movimento + tempo_sem_carga
         hora_entrega = hora_coleta + tempo_com_carga
 
-        emp['posicao'] = ordem['destino']
+        emp['posicao'] = ordem['cod_destino']
         emp['livre_em'] = hora_entrega
         emp['distancia_total'] += dist_sem_carga + dist_com_carga
         emp['distancia_sem_carga'] += dist_sem_carga
         emp['tempo_ocioso_movimento'] += tempo_sem_carga
-        
-        ordem_executada = {
-            **ordem.to_dict(),
-            'empilhadeira': emp_id,
-            'hora_saida': hora_inicio_movimento,
-            'hora_coleta': hora_coleta,
-            'hora_entrega': hora_entrega,
-            'distancia_sem_carga': dist_sem_carga,
-            'distancia_com_carga': dist_com_carga,
-            'distancia_total': dist_sem_carga + dist_com_carga,
-            'tempo_sem_carga': tempo_sem_carga.total_seconds(),
-            'tempo_com_carga': tempo_com_carga.total_seconds()
-        }
-        emp['ordens_atendidas'].append(ordem_executada)
 
-    def encontrar_proxima_empilhadeira_livre(self):
-        proxima_a_liberar_id = -1
-        menor_tempo_livre = datetime.max
-
-        for emp_id, emp in self.empilhadeiras.items():
-            if emp['livre_em'] is None:
-                return emp_id
-            
-            if emp['livre_em'] < menor_tempo_livre:
-                menor_tempo_livre = emp['livre_em']
-                proxima_a_liberar_id = emp_id
+        if e_esteira(ordem['origem']):
+            self.esteiras.registrar(ordem['origem'], hora_entrega)
+        self.frota.atualizar(emp_id, hora_entrega, ordem['cod_destino'])
+        self.simulador.agendar_entrega(hora_entrega, emp_id)
         
-        return proxima_a_liberar_id
+        self.registro.registrar(ordem['linha'], emp_id, ordem['instante'], hora_inicio_movimento, hora_coleta, hora_entrega,
+                                dist_sem_carga, dist_com_carga, tempo_sem_carga, tempo_com_carga)
+        if self.gravador is not None:
+            self.atribuidas.append(ordem)
 
-    def processar_ordens_fifo(self, ordens, matriz_dist):
-        self.resetar()
+    def encontrar_proxima_empilhadeira_livre(self):
+        return self.frota.proxima_livre()
 
+    def processar_ordens_fifo(self, ordens, matriz_dist, gravador=None):
         ordens['data_hora'] = pd.to_datetime(ordens['data_hora'], errors='coerce')
         ordens = ordens.dropna(subset=['data_hora']).sort_values('data_hora').reset_index(drop=True)
+        return self.processar_ordens_fifo_em_blocos([ordens], matriz_dist, gravador)
+
+    def processar_ordens_fifo_em_blocos(self, blocos, matriz_dist, gravador=None):
+        # blocos: DataFrames de ordens já em ordem cronológica, lidos um de cada vez; com um
+        # GravadorResultados as linhas vão para o arquivo na ordem das atribuições e o
+        # retorno é (None, métricas)
+        self.resetar()
+        self.gravador = gravador
+        self.instrumentacao.iniciar(self)
+        self.iniciar_progresso()
+        try:
+            self.matriz_dist = MatrizDistancias.garantir(matriz_dist)
+            estado_fluxo = self.preparar_estado_inicial()
+            self.fluxo = FluxoOrdens(blocos, self.matriz_dist, guardar_saida=gravador is None, estado=estado_fluxo)
+            self.relogio = self.fluxo.relogio
+
+            self.simulador.executar(self.proximas_chegadas(), retomando=estado_fluxo is not None)
 
-        total_de_ordens = len(ordens)
-        ordens_processadas_contador = 0
+            if self.gravador is not None:
+                self.gravar_atribuidas()
+                self.gravador.descarregar()
+                return None, self.calcular_metricas()
 
-        matriz_dist = matriz_dist.set_index(matriz_dist.columns[0])
-        matriz_dist = matriz_dist.map(lambda x: float(str(x).replace(',', '.')))
+            self.ordens = self.fluxo.tabela_saida()
+            return self.gerar_resultados()
+        finally:
+            self.instrumentacao.encerrar()
 
-        self.ordens_pendentes = ordens.to_dict('records')
+    def proximas_chegadas(self):
+        for ordem in self.fluxo.ordens():
+            self.total_de_ordens = self.fluxo.carregadas
+            if self.gravador is not None and len(self.atribuidas) >= self.gravador.linhas_por_lote:
+                self.gravar_atribuidas()
+            yield ordem['instante'], ordem
+
+    def gravar_atribuidas(self):
+        # passa ao gravador as atribuições feitas desde a última gravação
+        fim = len(self.registro)
+        ordens = FluxoOrdens.tabela_de_registros(self.atribuidas)
+        self.gravador.acrescentar(self.montar_resultados(ordens, np.arange(self.registro_gravado, fim)))
+        self.atribuidas = []
+        self.registro_gravado = fim
+
+    def ao_chegar(self, ordem_dict):
+        self.instrumentacao.amostra('fila_espera', len(self.fila_espera_esteira))
+        ordem = ordem_dict
+        self.tempo_atual = ordem['instante']
+
+        esteiras_ocupadas = self.esteiras_ativas()
+        origem_e_esteira = e_esteira(ordem['origem'])
         
-        i = 0
-        while i < len(self.ordens_pendentes):
-            ordem = pd.Series(self.ordens_pendentes[i])
-            self.tempo_atual = ordem['data_hora']
+        if origem_e_esteira and ordem['origem'] not in esteiras_ocupadas and len(esteiras_ocupadas) >= 2:
+            self.fila_espera_esteira.append(ordem_dict)
+            return
 
-            esteiras_ocupadas = self.esteiras_ativas()
-            origem_e_esteira = 'Esteira' in str(ordem['origem'])
-            
-            if origem_e_esteira and ordem['origem'] not in esteiras_ocupadas and len(esteiras_ocupadas) >= 2:
-                self.fila_espera_esteira.append(self.ordens_pendentes.pop(i))
-                continue
-
-            emp_id = self.encontrar_proxima_empilhadeira_livre()
-            self.atribuir_ordem(emp_id, ordem, matriz_dist)
-            
-            self.ordens_pendentes.pop(i)
-            
-            ordens_processadas_contador += 1
-            print(f"Processando: {ordens_processadas_contador}/{total_de_ordens} ordens ({ordens_processadas_contador/total_de_ordens:.1%})", end="\r")
-            
-            ordens_da_fila_processadas = True
-            while ordens_da_fila_processadas:
-                ordens_da_fila_processadas = self.tentar_processar_fila_esteira(matriz_dist)
-                if ordens_da_fila_processadas:
-                    ordens_processadas_contador += 1
-                    print(f"Processando: {ordens_processadas_contador}/{total_de_ordens} ordens ({ordens_processadas_contador/total_de_ordens:.1%})", end="\r")
-                    
-        print()
+        emp_id = self.encontrar_proxima_empilhadeira_livre()
+        self.atribuir_ordem(emp_id, ordem, self.matriz_dist)
         
-        return self.gerar_resultados()
+        self.ordens_processadas_contador += 1
+        self.informar_progresso(self.ordens_processadas_contador)
+        
+        ordens_da_fila_processadas = True
+        while ordens_da_fila_processadas:
+            ordens_da_fila_processadas = self.tentar_processar_fila_esteira(self.matriz_dist)
+            if ordens_da_fila_processadas:
+                self.ordens_processadas_contador += 1
+                self.informar_progresso(self.ordens_processadas_contador)
+
+    def ao_entregar(self, emp_id, hora_entrega):
+        self.esteiras.avancar(hora_entrega)
+
+    def ao_encerrar(self):
+        self.progresso.encerrar()
 
     def tentar_processar_fila_esteira(self, matriz_dist):
-        for idx, ordem_dict in enumerate(self.fila_espera_esteira):
-            ordem = pd.Series(ordem_dict)
+        # as ordens da fila ficam como dicts; criar uma Series por ordem a cada chegada custava
+        # mais que a própria decisão
+        for idx, ordem in enumerate(self.fila_espera_esteira):
             esteiras_ocupadas = self.esteiras_ativas()
 
             if ordem['origem'] not in esteiras_ocupadas and len(esteiras_ocupadas) < 2:
                 emp_id = self.encontrar_proxima_empilhadeira_livre()
                 
-                self.tempo_atual = ordem['data_hora']
+                self.tempo_atual = ordem['instante']
                 self.atribuir_ordem(emp_id, ordem, matriz_dist)
                 
                 self.fila_espera_esteira.pop(idx)
@@ -150,50 +186,69 @@ class HeuristicaIngenuaFIFO:
 
 
     def gerar_resultados(self):
-        resultados = []
-        for emp_id, emp in self.empilhadeiras.items():
-            for ordem in emp['ordens_atendidas']:
-                 resultados.append({
-                    'ordem': ordem['ordem'],
-                    'material': ordem['material'],
-                    'origem': ordem['origem'],
-                    'destino': ordem['destino'],
-                    'empilhadeira': emp_id,
-                    'hora_criacao': ordem['data_hora'],
-                    'hora_saida_empilhadeira': ordem.get('hora_saida'),
-                    'hora_entrega': ordem.get('hora_entrega'),
-                    'distancia_total': ordem.get('distancia_total', 0),
-                    'distancia_sem_carga': ordem.get('distancia_sem_carga', 0),
-                    'distancia_com_carga': ordem.get('distancia_com_carga', 0),
-                    'tempo_espera': (ordem.get('hora_saida') - ordem['data_hora']).total_seconds(),
-                    'tempo_movimento': (ordem.get('hora_entrega') - ordem.get('hora_saida')).total_seconds(),
-                    'tempo_sem_carga': ordem.get('tempo_sem_carga', 0),
-                    'tempo_com_carga': ordem.get('tempo_com_carga', 0)
-                })
+        # agrupa por empilhadeira e depois ordena de forma estável pela hora de criação
+        sequencia = self.registro.ordem_por_empilhadeira()
+        hora_criacao = self.registro.coluna('hora_criacao')[sequencia]
+        sequencia = sequencia[np.argsort(hora_criacao, kind='stable')]
+
+        ordens = self.ordens.take(self.registro.coluna('linha')[sequencia])
+        return self.montar_resultados(ordens, sequencia), self.calcular_metricas()
+
+    def montar_resultados(self, ordens, linhas):
+        # ordens: colunas de saída (FluxoOrdens.COLUNAS_SAIDA) das ordens nas linhas do registro
+        hora_criacao = self.registro.coluna('hora_criacao')[linhas]
+        hora_saida = self.registro.coluna('hora_saida')[linhas]
+        hora_entrega = self.registro.coluna('hora_entrega')[linhas]
+        dist_sem_carga = self.registro.coluna('distancia_sem_carga')[linhas]
+        dist_com_carga = self.registro.coluna('distancia_com_carga')[linhas]
+
+        return pd.DataFrame({
+            'ordem': ordens['ordem'].to_numpy(),
+            'material': ordens['material'].to_numpy(),
+            'origem': ordens['origem'].to_numpy(),
+            'destino': ordens['destino'].to_numpy(),
+            'empilhadeira': self.registro.coluna('empilhadeira')[linhas],
+            'hora_criacao': ordens['data_hora'].to_numpy(),
+            'hora_saida_empilhadeira': self.relogio.datas(hora_saida),
+            'hora_entrega': self.relogio.datas(hora_entrega),
+            'distancia_total': dist_sem_carga + dist_com_carga,
+            'distancia_sem_carga': dist_sem_carga,
+            'distancia_com_carga': dist_com_carga,
+            'tempo_espera': hora_saida - hora_criacao,
+            'tempo_movimento': hora_entrega - hora_saida,
+            'tempo_sem_carga': self.registro.coluna('tempo_sem_carga')[linhas],
+            'tempo_com_carga': self.registro.coluna('tempo_com_carga')[linhas]
+        })
 
+    def calcular_metricas(self):
+        # distâncias e deslocamento sem carga das somas do registro; só o ocioso parado passa
+        # pela frota
+        totais = self.registro.totais
         metricas = {
-            'total_ordens_processadas': len(resultados),
+            'total_ordens_processadas': len(self.registro),
             'ordens_nao_atendidas': len(self.fila_espera_esteira),
-            'distancia_total': sum(e['distancia_total'] for e in self.empilhadeiras.values()),
-            'distancia_sem_carga': sum(e['distancia_sem_carga'] for e in self.empilhadeiras.values()),
-            'distancia_com_carga': sum(e['distancia_total'] for e in self.empilhadeiras.values()) - sum(e['distancia_sem_carga'] for e in self.empilhadeiras.values()),
-            'tempo_ocioso_parado_total': sum(e['tempo_ocioso_parado'].total_seconds() for e in self.empilhadeiras.values()),
-            'tempo_ocioso_movimento_total': sum(e['tempo_ocioso_movimento'].total_seconds() for e in self.empilhadeiras.values()),
+            'distancia_total': totais['distancia_sem_carga'] + totais['distancia_com_carga'],
+            'distancia_sem_carga': totais['distancia_sem_carga'],
+            'distancia_com_carga': totais['distancia_com_carga'],
+            'tempo_ocioso_parado_total': sum(e['tempo_ocioso_parado'] for e in self.empilhadeiras.values()),
+            'tempo_ocioso_movimento_total': totais['tempo_sem_carga'],
         }
         metricas['tempo_ocioso_total'] = metricas['tempo_ocioso_parado_total'] + metricas['tempo_ocioso_movimento_total']
 
-        return pd.DataFrame(sorted(resultados, key=lambda x: x['hora_criacao'])), metricas
+        return metricas
 
 if __name__ == "__main__":
-    ordens = pd.read_excel("ordens_unificadas.xlsx")
-    matriz_dist = pd.read_excel("matriz_distancias.xlsx")
+    ordens, matriz_dist = carregar_entradas()
 
     NUM_EMPILHADEIRAS = 12
+    ARQUIVO_RESULTADOS = "resultados_heuristica_fifo_detalhado.csv"
+    EXPORTAR_EXCEL = False
 
     print("\nIniciando heurística ingênua (FIFO)...")
     start_time = time.time()
     heuristica_fifo = HeuristicaIngenuaFIFO(NUM_EMPILHADEIRAS)
-    rotas_fifo, metricas_fifo = heuristica_fifo.processar_ordens_fifo(ordens, matriz_dist)
+    with GravadorResultados(ARQUIVO_RESULTADOS) as gravador:
+        _, metricas_fifo = heuristica_fifo.processar_ordens_fifo(ordens, matriz_dist, gravador)
     
     end_time = time.time()
     duracao_segundos = end_time - start_time
@@ -210,4 +265,5 @@ if __name__ == "__main__":
     print(f"  - Em movimento sem carga (em segundos): {metricas_fifo['tempo_ocioso_movimento_total']:.2f}")
     print(f"Tempo total de execução: {timedelta(seconds=duracao_segundos)}")
 
-    rotas_fifo.to_excel("resultados_heuristica_fifo_detalhado.xlsx", index=False)
\ No newline at end of file
+    if EXPORTAR_EXCEL:
+        exportar_excel(ARQUIVO_RESULTADOS)
\ No newline at end of file
@@ -0,0 +1,48 @@
+import heapq
+
+
+def e_esteira(local):
+    return 'Esteira' in str(local)
+
+
+class IndiceEsteiras:
+    # guarda a última hora de entrega das viagens que saíram de cada esteira; um heap
+    # de (hora_entrega, esteira) expira as esteiras conforme o tempo da simulação avança
+    def __init__(self):
+        self.fim_por_esteira = {}
+        self._ativas = {}
+        self._heap = []
+        self._agora = None
+
+    def registrar(self, esteira, hora_entrega):
+        fim = self.fim_por_esteira.get(esteira)
+        if fim is not None and hora_entrega <= fim:
+            return
+
+        self.fim_por_esteira[esteira] = hora_entrega
+        if self._agora is None or hora_entrega > self._agora:
+            self._ativas[esteira] = hora_entrega
+            heapq.heappush(self._heap, (hora_entrega, esteira))
+
+    def avancar(self, tempo):
+        if self._agora is not None and tempo <= self._agora:
+            return
+
+        self._agora = tempo
+        while self._heap and self._heap[0][0] <= tempo:
+            fim, esteira = heapq.heappop(self._heap)
+            if self._ativas.get(esteira) == fim:
+                del self._ativas[esteira]
+
+    def ocupadas(self, tempo):
+        if self._agora is not None and tempo < self._agora:
+            # consulta no passado (reprocessamento da fila): usa a última entrega de cada esteira
+            return {esteira for esteira, fim in self.fim_por_esteira.items() if fim > tempo}
+
+        self.avancar(tempo)
+        return self._ativas.keys()
+
+    def proxima_liberacao(self, tempo):
+        # primeira hora depois de tempo em que alguma esteira deixa de estar ocupada
+        fins = [fim for fim in self.fim_por_esteira.values() if fim > tempo]
+        return min(fins) if fins else None
@@ -0,0 +1,136 @@
+import cProfile
+import io
+import pstats
+import time
+from functools import wraps
+
+from Cronometro import Cronometro
+
+
+class Perfilador:
+    # interface para ligar um perfilador à Instrumentacao (cProfile, um amostrador externo...):
+    # iniciar e encerrar envolvem a execução inteira e relatorio entra no relatório final
+    def iniciar(self):
+        pass
+
+    def encerrar(self):
+        pass
+
+    def relatorio(self):
+        return ""
+
+
+class PerfiladorCProfile(Perfilador):
+    # caminho: se informado, as estatísticas também são gravadas (para snakeviz, pstats...)
+    def __init__(self, caminho=None, ordenar='cumulative', linhas=25):
+        self.caminho = caminho
+        self.ordenar = ordenar
+        self.linhas = linhas
+        self.perfil = None
+
+    def iniciar(self):
+        self.perfil = cProfile.Profile()
+        self.perfil.enable()
+
+    def encerrar(self):
+        self.perfil.disable()
+        if self.caminho:
+            self.perfil.dump_stats(self.caminho)
+
+    def relatorio(self):
+        texto = io.StringIO()
+        pstats.Stats(self.perfil, stream=texto).sort_stats(self.ordenar).print_stats(self.linhas)
+        return texto.getvalue()
+
+
+class SemInstrumentacao:
+    # padrão das heurísticas: os mesmos ganchos da Instrumentacao, sem fazer nada
+    def iniciar(self, politica):
+        pass
+
+    def encerrar(self):
+        pass
+
+    def amostra(self, nome, valor):
+        pass
+
+
+SEM_INSTRUMENTACAO = SemInstrumentacao()
+
+
+class Instrumentacao(Cronometro):
+    # tempo acumulado e número de chamadas de cada fase e tamanhos observados a cada ordem
+    # (fila de espera, candidatas à consolidação). As fases são os métodos listados em
+    # FASES_INSTRUMENTADAS da política, envolvidos só enquanto a execução dura; o tempo de
+    # uma fase inclui o das fases chamadas dentro dela
+    def __init__(self, perfiladores=(), imprimir=True):
+        super().__init__()
+        self.chamadas = {}
+        self.amostras = {}
+        self.perfiladores = list(perfiladores)
+        self.imprimir = imprimir
+        self.duracao = 0.0
+        self._politica = None
+        self._inicio = None
+
+    def adicionar(self, nome, segundos):
+        super().adicionar(nome, segundos)
+        self.chamadas[nome] = self.chamadas.get(nome, 0) + 1
+
+    def amostra(self, nome, valor):
+        # guarda (quantidade, soma, máximo) de cada série
+        quantidade, soma, maximo = self.amostras.get(nome, (0, 0, valor))
+        self.amostras[nome] = (quantidade + 1, soma + valor, max(maximo, valor))
+
+    def _envolver(self, nome, metodo):
+        adicionar = self.adicionar
+        relogio = time.perf_counter
+
+        @wraps(metodo)
+        def envolvido(*args, **kwargs):
+            inicio = relogio()
+            try:
+                return metodo(*args, **kwargs)
+            finally:
+                adicionar(nome, relogio() - inicio)
+
+        return envolvido
+
+    def iniciar(self, politica):
+        self._politica = politica
+        for nome in politica.FASES_INSTRUMENTADAS:
+            setattr(politica, nome, self._envolver(nome, getattr(politica, nome)))
+        for perfilador in self.perfiladores:
+            perfilador.iniciar()
+        self._inicio = time.perf_counter()
+
+    def encerrar(self):
+        self.duracao += time.perf_counter() - self._inicio
+        for perfilador in reversed(self.perfiladores):
+            perfilador.encerrar()
+        # volta aos métodos da classe
+        for nome in self._politica.FASES_INSTRUMENTADAS:
+            vars(self._politica).pop(nome, None)
+        self._politica = None
+
+        if self.imprimir:
+            print(f"\n{self.relatorio()}")
+
+    def relatorio(self):
+        linhas = [f"=== INSTRUMENTAÇÃO ({self.duracao:.3f}s) ===",
+                  f"{'fase':<28}{'chamadas':>10}{'total (s)':>12}{'média (µs)':>12}{'% do total':>12}"]
+        for nome, total in sorted(self.tempos.items(), key=lambda item: -item[1]):
+            chamadas = self.chamadas[nome]
+            fracao = total / self.duracao if self.duracao else 0.0
+            linhas.append(f"{nome:<28}{chamadas:>10}{total:>12.3f}{1e6 * total / chamadas:>12.1f}{fracao:>12.1%}")
+
+        if self.amostras:
+            linhas.append(f"\n{'tamanho':<28}{'amostras':>10}{'média':>12}{'máximo':>12}")
+            for nome, (quantidade, soma, maximo) in self.amostras.items():
+                linhas.append(f"{nome:<28}{quantidade:>10}{soma / quantidade:>12.1f}{maximo:>12}")
+
+        for perfilador in self.perfiladores:
+            texto = perfilador.relatorio()
+            if texto:
+                linhas.append(f"\n{texto}")
+        return "\n".join(linhas)
@@ -0,0 +1,60 @@
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+
+class MatrizDistancias:
+    # converte os nomes dos locais em códigos inteiros uma única vez e guarda as
+    # distâncias em um array contíguo, indexado por valores[codigo_origem, codigo_destino]
+    def __init__(self, locais, valores):
+        self.locais = list(locais)
+        self.codigos = {local: i for i, local in enumerate(self.locais)}
+        self.valores = np.ascontiguousarray(valores, dtype=np.float64)
+        # permite usar a distância com carga como limite inferior do custo de uma viagem
+        self.nao_negativa = bool((self.valores >= 0).all())
+
+        if self.valores.shape != (len(self.locais), len(self.locais)):
+            raise ValueError(f"Matriz de distâncias com formato {self.valores.shape} para {len(self.locais)} locais")
+
+    @cached_property
+    def metrica(self):
+        # distâncias não negativas, diagonal zero e desigualdade triangular (com folga numérica):
+        # assim uma rota nunca fica mais barata ao ganhar paradas. Só é calculada quando usada
+        valores = self.valores
+        if not self.nao_negativa or (np.diagonal(valores) != 0).any():
+            return False
+        folga = 1e-9 * max(1.0, float(valores.max(initial=0.0)))
+        return not any((valores[:, k, None] + valores[None, k, :] < valores - folga).any()
+                       for k in range(len(self.locais)))
+
+    @classmethod
+    def de_planilha(cls, matriz_dist):
+        matriz_dist = matriz_dist.set_index(matriz_dist.columns[0])
+        matriz_dist = matriz_dist.map(lambda x: float(str(x).replace(',', '.')))
+        # garante que a coluna j corresponde ao mesmo local da linha j
+        matriz_dist = matriz_dist.reindex(columns=matriz_dist.index)
+        return cls(matriz_dist.index, matriz_dist.to_numpy())
+
+    @classmethod
+    def garantir(cls, matriz_dist):
+        if isinstance(matriz_dist, cls):
+            return matriz_dist
+        return cls.de_planilha(matriz_dist)
+
+    def __len__(self):
+        return len(self.locais)
+
+    def codigo(self, local):
+        return self.codigos[local]
+
+    def codificar(self, locais):
+        locais = pd.Series(locais)
+        codigos = locais.map(self.codigos)
+        if codigos.isna().any():
+            desconhecidos = sorted(set(locais[codigos.isna()].astype(str)))
+            raise KeyError(f"Locais ausentes na matriz de distâncias: {desconhecidos}")
+        return codigos.to_numpy(dtype=np.int64)
+
+    def distancia(self, origem, destino):
+        return self.valores[self.codigos[origem], self.codigos[destino]]
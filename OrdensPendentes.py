@@ -0,0 +1,147 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+
+class OrdensPendentes:
+    # ordens ainda não despachadas, em ordem cronológica; a janela de consolidação vira uma
+    # busca binária pelo limite de tempo e a remoção por id só marca as posições como retiradas.
+    # As posições são globais (a linha da ordem na entrada); o começo já retirado é descartado
+    # conforme novas ordens chegam, então a memória acompanha só a janela ainda pendente
+    def __init__(self, ordens=(), grupos=None, colunas=None):
+        self._ordens = []
+        self._tempos = []
+        self._ids = []
+        self._ativa = []
+        self._deslocamento = 0
+        self._inicio = 0
+        self._restantes = 0
+        self._ultimo_tempo = None
+        self._posicoes = {}
+        self._grupos = {}
+        self._colunas = {}
+        self.acrescentar(ordens, grupos, colunas)
+
+    def acrescentar(self, ordens, grupos=None, colunas=None):
+        # grupos: para cada ordem, as chaves dos grupos de compatibilidade a que ela pertence;
+        # cada grupo guarda suas posições em ordem cronológica, então a busca na janela só
+        # visita ordens que podem ser combinadas. colunas: {nome: array} com um valor por
+        # ordem, lidos depois por posição em coluna()
+        self._descartar_retiradas()
+        ordens = list(ordens)
+        tempos = [ordem['instante'] for ordem in ordens]
+        anteriores = ([self._ultimo_tempo] if self._ultimo_tempo is not None else []) + tempos
+        if any(anterior > seguinte for anterior, seguinte in zip(anteriores, anteriores[1:])):
+            raise ValueError("As ordens pendentes precisam estar ordenadas por instante")
+
+        primeira = self._deslocamento + len(self._ordens)
+        for i, ordem in enumerate(ordens, primeira):
+            self._ids.append(ordem['ordem'])
+            self._posicoes.setdefault(ordem['ordem'], []).append(i)
+        self._ordens.extend(ordens)
+        self._tempos.extend(tempos)
+        self._ativa.extend([True] * len(ordens))
+        self._restantes += len(ordens)
+        if tempos:
+            self._ultimo_tempo = tempos[-1]
+
+        for i, chaves in enumerate(grupos or (), primeira):
+            for chave in chaves:
+                self._grupos.setdefault(chave, []).append(i)
+        for nome, valores in (colunas or {}).items():
+            anterior = self._colunas.get(nome)
+            self._colunas[nome] = np.asarray(valores) if anterior is None else np.concatenate([anterior, valores])
+
+    def _descartar_retiradas(self):
+        corte = self._inicio - self._deslocamento
+        if corte < 1024 or corte < len(self._ordens) // 2:
+            return
+
+        del self._ordens[:corte]
+        del self._tempos[:corte]
+        del self._ids[:corte]
+        del self._ativa[:corte]
+        for nome, valores in self._colunas.items():
+            self._colunas[nome] = valores[corte:]
+        for chave in list(self._grupos):
+            posicoes = self._grupos[chave]
+            del posicoes[:bisect_left(posicoes, self._inicio)]
+            if not posicoes:
+                del self._grupos[chave]
+        self._deslocamento = self._inicio
+
+    def __len__(self):
+        return self._restantes
+
+    def __bool__(self):
+        return self._restantes > 0
+
+    def __iter__(self):
+        return self._entre(self._inicio, self._deslocamento + len(self._ordens))
+
+    def _retirar(self, i):
+        j = i - self._deslocamento
+        self._ativa[j] = False
+        self._ordens[j] = None
+        self._restantes -= 1
+
+        posicoes = self._posicoes.get(self._ids[j])
+        if posicoes is not None:
+            posicoes.remove(i)
+            if not posicoes:
+                del self._posicoes[self._ids[j]]
+
+    def _avancar_inicio(self):
+        fim = self._deslocamento + len(self._ordens)
+        while self._inicio < fim and not self._ativa[self._inicio - self._deslocamento]:
+            self._inicio += 1
+        if self._inicio == fim:
+            raise IndexError("Não há ordens pendentes")
+
+    def proximo_instante(self):
+        self._avancar_inicio()
+        return self._tempos[self._inicio - self._deslocamento]
+
+    def retirar_primeira(self):
+        self._avancar_inicio()
+        ordem = self._ordens[self._inicio - self._deslocamento]
+        self._retirar(self._inicio)
+        self._inicio += 1
+        return ordem
+
+    def _fim_janela(self, limite_tempo):
+        return self._deslocamento + bisect_right(self._tempos, limite_tempo, lo=self._inicio - self._deslocamento)
+
+    def ate(self, limite_tempo):
+        return self._entre(self._inicio, self._fim_janela(limite_tempo))
+
+    def linhas_ate(self, limite_tempo, grupos):
+        # posições das ordens pendentes até limite_tempo que estão em algum dos grupos, em
+        # ordem cronológica e sem repetição
+        fim = self._fim_janela(limite_tempo)
+        linhas = []
+        for chave in grupos:
+            posicoes = self._grupos.get(chave, ())
+            inicio = bisect_left(posicoes, self._inicio)
+            for i in posicoes[inicio:bisect_left(posicoes, fim, lo=inicio)]:
+                if self._ativa[i - self._deslocamento]:
+                    linhas.append(i)
+        if len(grupos) > 1:
+            linhas = sorted(set(linhas))
+        return np.array(linhas, dtype=np.int64)
+
+    def coluna(self, nome, linhas):
+        return self._colunas[nome][linhas - self._deslocamento]
+
+    def ordem(self, linha):
+        return self._ordens[linha - self._deslocamento]
+
+    def _entre(self, inicio, fim):
+        for i in range(inicio, fim):
+            if self._ativa[i - self._deslocamento]:
+                yield self._ordens[i - self._deslocamento]
+
+    def remover(self, id_ordem):
+        for i in self._posicoes.pop(id_ordem, ()):
+            if self._ativa[i - self._deslocamento]:
+                self._retirar(i)
@@ -0,0 +1,159 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+class RotasPacote:
+    # custo com carga de um pacote: todas as coletas e depois todas as entregas. Os custos
+    # ficam memorizados por (local de partida, paradas), então pacotes que repetem locais
+    # reaproveitam as contas de pacotes anteriores
+    def __init__(self, matriz_dist, tamanho_cache=200_000):
+        self.dist = matriz_dist.valores
+        self.caminho = lru_cache(maxsize=tamanho_cache)(self._caminho)
+        self.melhor = lru_cache(maxsize=tamanho_cache)(self._melhor)
+
+    def _caminho(self, inicio, paradas):
+        # paradas visitadas na ordem dada
+        custo, atual = 0.0, inicio
+        for parada in paradas:
+            custo += self.dist[atual, parada]
+            atual = parada
+        return custo
+
+    def _melhor(self, inicio, coletas, entregas):
+        # melhor ordem para visitar as coletas e depois as entregas (frozensets de locais)
+        # partindo de inicio: programação dinâmica sobre os subconjuntos restantes, em vez de
+        # testar todas as permutações. Devolve (custo, coletas em ordem, entregas em ordem)
+        restantes, fase = (coletas, 0) if coletas else (entregas, 1)
+        if not restantes:
+            return 0.0, (), ()
+
+        melhor = None
+        for local in sorted(restantes):
+            if fase == 0:
+                custo, seq_coletas, seq_entregas = self.melhor(local, coletas - {local}, entregas)
+                seq_coletas = (local,) + seq_coletas
+            else:
+                custo, seq_coletas, seq_entregas = self.melhor(local, coletas, entregas - {local})
+                seq_entregas = (local,) + seq_entregas
+            custo += self.dist[inicio, local]
+            if melhor is None or custo < melhor[0]:
+                melhor = (custo, seq_coletas, seq_entregas)
+        return melhor
+
+
+class BuscaPacotes:
+    # pacotes de até max_ordens ordens: a principal mais adicionais tiradas das max_candidatas
+    # mais baratas em par com ela. Com otimizar_sequencia a ordem das coletas e a das entregas
+    # são as melhores possíveis; sem ela, seguem a ordem do pacote. Com a matriz métrica um
+    # pacote custa pelo menos o custo com carga de qualquer parte dele mais a menor espera,
+    # então candidatas e pacotes que já passam do limiar não são estendidos
+    def __init__(self, matriz_dist, max_ordens=3, otimizar_sequencia=True, max_candidatas=8, fator_sem_carga=1.0):
+        if max_ordens < 2:
+            raise ValueError("Um pacote tem pelo menos 2 ordens")
+        self.dist = matriz_dist.valores
+        self.rotas = RotasPacote(matriz_dist)
+        self.podar = matriz_dist.metrica
+        self.max_ordens = max_ordens
+        self.otimizar_sequencia = otimizar_sequencia
+        self.max_candidatas = max_candidatas
+        self.fator_sem_carga = fator_sem_carga
+
+    def custos_par(self, origem, destino, origens, destinos):
+        # custo com carga de cada candidata em par com a principal
+        dist = self.dist
+        fixa = dist[origem, origens] + dist[origens, destino] + dist[destino, destinos]
+        if not self.otimizar_sequencia:
+            return fixa
+        return np.minimum.reduce([
+            fixa,
+            dist[origem, origens] + dist[origens, destinos] + dist[destinos, destino],
+            dist[origens, origem] + dist[origem, destino] + dist[destino, destinos],
+            dist[origens, origem] + dist[origem, destinos] + dist[destinos, destino],
+        ])
+
+    def buscar(self, origem, destino, quantidade, capacidade, origens, destinos, quantidades, frota, tempo_atual,
+               limiar, compativel=None):
+        # o maior pacote que custa menos que limiar e, entre os do mesmo tamanho, o mais
+        # barato: {'adicionais': índices em origens, 'emp_id', 'custo', 'rota': (coletas,
+        # entregas)}, ou None. compativel(i, j) diz se as candidatas i e j podem ir juntas
+        espera = frota.tempos_espera(tempo_atual, tempo_atual) * 0.1
+        if not len(origens) or not len(espera):
+            return None
+        self._frota = frota
+        self._espera = espera
+        self._espera_min = espera.min()
+        self._sem_carga = {}
+        self._limiar = limiar
+        self._compativel = compativel
+
+        pares = self.custos_par(origem, destino, origens, destinos)
+        indices = np.argsort(pares, kind='stable')
+        if self.podar:
+            indices = indices[pares[indices] + self._espera_min < limiar]
+        indices = indices[:self.max_candidatas]
+
+        self._principal = (int(origem), int(destino))
+        self._candidatas = [(int(i), int(origens[i]), int(destinos[i]), quantidades[i]) for i in indices]
+        self._melhor = None
+        self._estender(0, (), quantidade, capacidade)
+        return self._melhor
+
+    def _estender(self, inicio, pacote, quantidade, capacidade):
+        # combinações das candidatas em ordem de custo do par, em profundidade
+        for j in range(inicio, len(self._candidatas)):
+            indice, _, _, quantidade_j = self._candidatas[j]
+            total = quantidade + quantidade_j
+            if total > capacidade:
+                continue
+            if self._compativel is not None and not all(self._compativel(self._candidatas[i][0], indice) for i in pacote):
+                continue
+
+            novo = pacote + (j,)
+            carregado = self._avaliar(novo)
+            if self.podar and carregado + self._espera_min >= self._limiar:
+                continue
+            if len(novo) + 1 < self.max_ordens:
+                self._estender(j + 1, novo, total, capacidade)
+
+    def _avaliar(self, pacote):
+        # guarda o pacote se for o melhor até agora; devolve o menor custo com carga dele
+        origem, destino = self._principal
+        coletas = (origem,) + tuple(self._candidatas[j][1] for j in pacote)
+        entregas = (destino,) + tuple(self._candidatas[j][2] for j in pacote)
+
+        if not self.otimizar_sequencia:
+            carregado = self.rotas.caminho(origem, coletas[1:] + entregas)
+            custos = self._custos_saida(origem) + carregado
+            rotas = None
+        else:
+            conjunto_coletas, conjunto_entregas = frozenset(coletas), frozenset(entregas)
+            custos, carregado, rotas = None, float('inf'), []
+            for primeira in sorted(conjunto_coletas):
+                custo, seq_coletas, seq_entregas = self.rotas.melhor(primeira, conjunto_coletas - {primeira},
+                                                                     conjunto_entregas)
+                carregado = min(carregado, custo)
+                custos_primeira = self._custos_saida(primeira) + custo
+                custos = custos_primeira if custos is None else np.minimum(custos, custos_primeira)
+                rotas.append((custos_primeira, ((primeira,) + seq_coletas, seq_entregas)))
+
+        emp_id, custo = self._frota.menor_custo(custos)
+        if emp_id is None or not custo < self._limiar:
+            return carregado
+        if self._melhor is not None and (len(pacote), -custo) <= (len(self._melhor['adicionais']), -self._melhor['custo']):
+            return carregado
+
+        if rotas is None:
+            rota = (coletas, entregas)
+        else:
+            # a primeira coleta que dá o menor custo para a empilhadeira escolhida
+            rota = next(rota for custos_primeira, rota in rotas if custos_primeira[emp_id] == custo)
+        self._melhor = {'adicionais': [self._candidatas[j][0] for j in pacote], 'emp_id': emp_id, 'custo': custo,
+                        'rota': rota}
+        return carregado
+
+    def _custos_saida(self, local):
+        # deslocamento sem carga de cada empilhadeira até local, ponderado, mais a espera
+        if local not in self._sem_carga:
+            self._sem_carga[local] = self._frota.distancias_sem_carga(self.dist, local) * self.fator_sem_carga + self._espera
+        return self._sem_carga[local]
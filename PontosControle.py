@@ -0,0 +1,186 @@
+import hashlib
+import os
+import pickle
+import time
+import zlib
+from datetime import datetime
+
+# início de todo arquivo de ponto de controle; muda quando o formato mudar
+ASSINATURA = b'PONTOCONTROLE1\n'
+
+
+def impressao_matriz(matriz_dist):
+    # identifica a matriz de distâncias sem guardá-la no ponto de controle
+    impressao = hashlib.sha1(repr(matriz_dist.locais).encode())
+    impressao.update(matriz_dist.valores.tobytes())
+    return impressao.hexdigest()
+
+
+class PontoControle:
+    # estado de uma execução entre duas chegadas: frota, esteiras, filas, acumuladores e
+    # registro da política, eventos pendentes do simulador e posição no fluxo de ordens. O
+    # arquivo tem a assinatura, um cabeçalho pequeno (lido sem descompactar o resto) e o
+    # estado em pickle comprimido com zlib. A matriz de distâncias, as ordens e o gravador
+    # não são guardados: a retomada recebe os mesmos de novo
+    # ordens_omitidas: quantas das ordens já entregues não estão nos blocos passados à
+    # retomada (que então começam depois delas)
+    def __init__(self, cabecalho, dados):
+        self.cabecalho = cabecalho
+        self._dados = dados
+        self.ordens_omitidas = 0
+
+    @property
+    def concluida(self):
+        return self.cabecalho['concluida']
+
+    @property
+    def num_empilhadeiras(self):
+        return self.cabecalho['num_empilhadeiras']
+
+    @property
+    def posicoes(self):
+        # {empilhadeira: local}; num ponto concluído, as posições de fim de turno para
+        # posicoes_iniciais da execução seguinte
+        return self.cabecalho['posicoes']
+
+    @classmethod
+    def capturar(cls, politica, concluida=False):
+        gravador = politica.gravador
+        resultados = None
+        if gravador is not None:
+            if gravador.formato != 'csv':
+                raise ValueError("Pontos de controle com resultados em arquivo requerem CSV")
+            # o arquivo fica exatamente com as atribuições feitas até aqui
+            politica.gravar_atribuidas()
+            gravador.descarregar()
+            resultados = {'gravadas': gravador.gravadas,
+                          'bytes': os.path.getsize(gravador.caminho) if gravador.gravadas else 0}
+
+        excluidos = set(politica.ESTADO_EXCLUIDO) | set(politica.FASES_INSTRUMENTADAS)
+        estado = {
+            'politica': {nome: valor for nome, valor in vars(politica).items() if nome not in excluidos},
+            'simulador': politica.simulador.estado(),
+            'fluxo': politica.fluxo.estado(),
+            'resultados': resultados,
+        }
+        cabecalho = {
+            'classe': (type(politica).__module__, type(politica).__qualname__),
+            'num_empilhadeiras': politica.num_empilhadeiras,
+            'matriz': impressao_matriz(politica.matriz_dist),
+            'ordens_entregues': estado['fluxo']['entregues'],
+            'atribuidas': len(politica.registro),
+            'posicoes': politica.posicoes_finais(),
+            'concluida': concluida,
+            'gravado_em': datetime.now().isoformat(timespec='seconds'),
+        }
+        return cls.de_estado(cabecalho, estado)
+
+    @classmethod
+    def inicial(cls, politica, relogio, linha):
+        # política recém-criada (com matriz_dist) cujo fluxo de ordens começa na linha dada da
+        # entrada, com a origem de relógio da entrada inteira: uma partição da simulação
+        # numerada como na execução completa
+        excluidos = set(politica.ESTADO_EXCLUIDO) | set(politica.FASES_INSTRUMENTADAS)
+        estado = {
+            'politica': {nome: valor for nome, valor in vars(politica).items() if nome not in excluidos},
+            'simulador': politica.simulador.estado(),
+            'fluxo': {'relogio': relogio, 'entregues': linha, 'ultimo_entregue': float('-inf'), 'guardar_saida': True,
+                      'saida': None},
+            'resultados': None,
+        }
+        cabecalho = {
+            'classe': (type(politica).__module__, type(politica).__qualname__),
+            'num_empilhadeiras': politica.num_empilhadeiras,
+            'matriz': impressao_matriz(politica.matriz_dist),
+            'ordens_entregues': linha,
+            'atribuidas': 0,
+            'posicoes': {},
+            'concluida': False,
+            'gravado_em': datetime.now().isoformat(timespec='seconds'),
+        }
+        return cls.de_estado(cabecalho, estado)
+
+    @classmethod
+    def de_estado(cls, cabecalho, estado):
+        return cls(cabecalho, zlib.compress(pickle.dumps(estado, pickle.HIGHEST_PROTOCOL), 1))
+
+    def estado(self):
+        # cópia nova do estado completo a cada chamada
+        return pickle.loads(zlib.decompress(self._dados))
+
+    def restaurar(self, politica):
+        # devolve o estado do fluxo de ordens, para FluxoOrdens(..., estado=...)
+        classe = (type(politica).__module__, type(politica).__qualname__)
+        if classe != self.cabecalho['classe']:
+            raise ValueError(f"Ponto de controle de {'.'.join(self.cabecalho['classe'])}, não de {'.'.join(classe)}")
+        if self.concluida:
+            raise ValueError("A execução deste ponto de controle já terminou; use as posições para uma partida a quente")
+        if politica.num_empilhadeiras != self.num_empilhadeiras:
+            raise ValueError(f"Ponto de controle com {self.num_empilhadeiras} empilhadeiras, não {politica.num_empilhadeiras}")
+        if impressao_matriz(politica.matriz_dist) != self.cabecalho['matriz']:
+            raise ValueError("A matriz de distâncias não é a mesma do ponto de controle")
+
+        estado = self.estado()
+        resultados = estado['resultados']
+        if (resultados is None) != (politica.gravador is None):
+            raise ValueError("O ponto de controle foi gravado com outro destino dos resultados")
+
+        vars(politica).update(estado['politica'])
+        politica.simulador.restaurar(estado['simulador'])
+        if resultados is not None:
+            politica.gravador.continuar(resultados['gravadas'], resultados['bytes'])
+        fluxo = estado['fluxo']
+        fluxo['pular'] = fluxo['entregues'] - self.ordens_omitidas
+        return fluxo
+
+    def gravar(self, caminho):
+        # num temporário renomeado depois, para que uma queda no meio não estrague o anterior
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        cabecalho = pickle.dumps(self.cabecalho, pickle.HIGHEST_PROTOCOL)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(ASSINATURA)
+            arquivo.write(len(cabecalho).to_bytes(8, 'little'))
+            arquivo.write(cabecalho)
+            arquivo.write(self._dados)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def ler(cls, caminho):
+        with open(caminho, 'rb') as arquivo:
+            if arquivo.read(len(ASSINATURA)) != ASSINATURA:
+                raise ValueError(f"{caminho} não é um ponto de controle desta versão")
+            tamanho = int.from_bytes(arquivo.read(8), 'little')
+            cabecalho = pickle.loads(arquivo.read(tamanho))
+            return cls(cabecalho, arquivo.read())
+
+
+class PontosControle:
+    # grava um PontoControle em caminho a cada a_cada_ordens chegadas e/ou a cada intervalo_s
+    # segundos, sempre sobre o anterior; no fim da execução grava o estado final (concluído),
+    # de onde saem as posições para a partida a quente do próximo turno
+    def __init__(self, caminho, a_cada_ordens=50_000, intervalo_s=None):
+        self.caminho = caminho
+        self.a_cada_ordens = a_cada_ordens
+        self.intervalo_s = intervalo_s
+        self.gravados = 0
+        self.tempo_gravando = 0.0
+        self._chegadas = 0
+        self._ultimo = time.perf_counter()
+
+    def apos_chegada(self, politica):
+        self._chegadas += 1
+        if ((self.a_cada_ordens and self._chegadas >= self.a_cada_ordens)
+                or (self.intervalo_s is not None and time.perf_counter() - self._ultimo >= self.intervalo_s)):
+            self.gravar(politica)
+
+    def ao_concluir(self, politica):
+        self.gravar(politica, concluida=True)
+
+    def gravar(self, politica, concluida=False):
+        inicio = time.perf_counter()
+        PontoControle.capturar(politica, concluida).gravar(self.caminho)
+        self._ultimo = time.perf_counter()
+        self._chegadas = 0
+        self.gravados += 1
+        self.tempo_gravando += self._ultimo - inicio
@@ -0,0 +1,94 @@
+import sys
+import time
+from datetime import timedelta
+
+
+class Progresso:
+    # interface do andamento de uma execução: iniciar no começo, atualizar a cada ordem
+    # processada (o total cresce quando as ordens chegam em blocos) e encerrar quando as
+    # chegadas acabam
+    def iniciar(self):
+        pass
+
+    def atualizar(self, processadas, total):
+        pass
+
+    def encerrar(self):
+        pass
+
+
+class ProgressoSilencioso(Progresso):
+    # para uso como biblioteca e nas varreduras em paralelo
+    pass
+
+
+SEM_PROGRESSO = ProgressoSilencioso()
+
+
+class ProgressoLimitado(Progresso):
+    # repassa o andamento a mostrar() no máximo uma vez a cada intervalo_s, com a taxa
+    # (ordens/s desde o início) e a estimativa do tempo restante; a última atualização
+    # segurada pelo intervalo é mostrada em encerrar()
+    def __init__(self, intervalo_s=0.5):
+        self.intervalo_s = intervalo_s
+        self._inicio = None
+        self._ultima = None
+        self._pendente = None
+
+    def iniciar(self):
+        self._inicio = time.perf_counter()
+        self._ultima = float('-inf')
+        self._pendente = None
+
+    def atualizar(self, processadas, total):
+        agora = time.perf_counter()
+        if agora - self._ultima < self.intervalo_s:
+            self._pendente = (processadas, total)
+            return
+        self._ultima = agora
+        self._pendente = None
+        self._repassar(processadas, total, agora)
+
+    def encerrar(self):
+        if self._pendente is not None:
+            self._repassar(*self._pendente, time.perf_counter())
+            self._pendente = None
+
+    def _repassar(self, processadas, total, agora):
+        decorrido = agora - self._inicio
+        taxa = processadas / decorrido if decorrido > 0 else 0.0
+        restante_s = (total - processadas) / taxa if taxa > 0 else None
+        self.mostrar(processadas, total, taxa, restante_s)
+
+    def mostrar(self, processadas, total, taxa, restante_s):
+        raise NotImplementedError
+
+
+class ProgressoTerminal(ProgressoLimitado):
+    # uma linha reescrita com \r, como os prints por ordem faziam
+    def __init__(self, intervalo_s=0.5, saida=None, unidade="ordens"):
+        super().__init__(intervalo_s)
+        self.saida = saida
+        self.unidade = unidade
+
+    def mostrar(self, processadas, total, taxa, restante_s):
+        fracao = processadas / total if total else 0.0
+        restante = "?" if restante_s is None else str(timedelta(seconds=round(restante_s)))
+        print(f"Processando: {processadas}/{total} {self.unidade} ({fracao:.1%}) | {taxa:.0f} {self.unidade}/s "
+              f"| restante ~{restante}",
+              end="\r", file=self.saida or sys.stdout, flush=True)
+
+    def encerrar(self):
+        super().encerrar()
+        print(file=self.saida or sys.stdout)
+
+
+class ProgressoFuncao(ProgressoLimitado):
+    # chama funcao(processadas, total, taxa, restante_s) no ritmo do intervalo, para logs ou
+    # interfaces; restante_s é None enquanto a taxa não é conhecida
+    def __init__(self, funcao, intervalo_s=0.5):
+        super().__init__(intervalo_s)
+        self.funcao = funcao
+
+    def mostrar(self, processadas, total, taxa, restante_s):
+        self.funcao(processadas, total, taxa, restante_s)
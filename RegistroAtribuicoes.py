@@ -0,0 +1,99 @@
+import numpy as np
+
+
+class RegistroAtribuicoes:
+    # log colunar e só de acréscimo das ordens atribuídas; cada linha aponta para a linha
+    # da ordem no DataFrame de entrada em vez de guardar uma cópia dela; os horários ficam
+    # em segundos da simulação (ver RelogioSimulacao); pacote é a linha da primeira ordem do
+    # pacote consolidado, ou -1 para uma ordem levada sozinha
+    COLUNAS = {
+        'linha': np.int64,
+        'empilhadeira': np.int64,
+        'hora_criacao': np.float64,
+        'hora_saida': np.float64,
+        'hora_coleta': np.float64,
+        'hora_entrega': np.float64,
+        'distancia_sem_carga': np.float64,
+        'distancia_com_carga': np.float64,
+        'tempo_sem_carga': np.float64,
+        'tempo_com_carga': np.float64,
+        'pacote': np.int64,
+    }
+    # somas mantidas a cada registro, para ler as métricas no meio da execução sem varrer as colunas
+    TOTAIS = ('distancia_sem_carga', 'distancia_com_carga', 'tempo_sem_carga', 'tempo_com_carga', 'tempo_movimento')
+
+    def __init__(self, capacidade=1024):
+        self.tamanho = 0
+        self._dados = {nome: np.empty(max(capacidade, 1), dtype=tipo) for nome, tipo in self.COLUNAS.items()}
+        self.totais = dict.fromkeys(self.TOTAIS, 0.0)
+        self.primeira_criacao = float('inf')
+        self.ultima_entrega = float('-inf')
+
+    def __len__(self):
+        return self.tamanho
+
+    def __getstate__(self):
+        # no ponto de controle vão só as linhas preenchidas, não a capacidade reservada
+        estado = self.__dict__.copy()
+        estado['_dados'] = {nome: coluna[:max(self.tamanho, 1)].copy() for nome, coluna in self._dados.items()}
+        return estado
+
+    def reservar(self, capacidade):
+        atual = len(self._dados['linha'])
+        if capacidade <= atual:
+            return
+        for nome, coluna in self._dados.items():
+            nova = np.empty(capacidade, dtype=coluna.dtype)
+            nova[:self.tamanho] = coluna[:self.tamanho]
+            self._dados[nome] = nova
+
+    def registrar(self, linha, empilhadeira, hora_criacao, hora_saida, hora_coleta, hora_entrega,
+                  distancia_sem_carga, distancia_com_carga, tempo_sem_carga, tempo_com_carga,
+                  pacote=-1):
+        i = self.tamanho
+        if i == len(self._dados['linha']):
+            self.reservar(2 * i)
+
+        dados = self._dados
+        dados['linha'][i] = linha
+        dados['empilhadeira'][i] = empilhadeira
+        dados['hora_criacao'][i] = hora_criacao
+        dados['hora_saida'][i] = hora_saida
+        dados['hora_coleta'][i] = hora_coleta
+        dados['hora_entrega'][i] = hora_entrega
+        dados['distancia_sem_carga'][i] = distancia_sem_carga
+        dados['distancia_com_carga'][i] = distancia_com_carga
+        dados['tempo_sem_carga'][i] = tempo_sem_carga
+        dados['tempo_com_carga'][i] = tempo_com_carga
+        dados['pacote'][i] = pacote
+        self.tamanho = i + 1
+
+        totais = self.totais
+        totais['distancia_sem_carga'] += distancia_sem_carga
+        totais['distancia_com_carga'] += distancia_com_carga
+        totais['tempo_sem_carga'] += tempo_sem_carga
+        totais['tempo_com_carga'] += tempo_com_carga
+        totais['tempo_movimento'] += hora_entrega - hora_saida
+        if hora_criacao < self.primeira_criacao:
+            self.primeira_criacao = hora_criacao
+        if hora_entrega > self.ultima_entrega:
+            self.ultima_entrega = hora_entrega
+
+    def acrescentar_de(self, outro):
+        # linhas de outro registro depois das deste, registradas uma a uma para que as somas
+        # fiquem iguais às de quem registrou na mesma ordem
+        colunas = [outro.coluna(nome).tolist() for nome in self.COLUNAS]
+        self.reservar(self.tamanho + len(colunas[0]))
+        for valores in zip(*colunas):
+            self.registrar(*valores)
+
+    def coluna(self, nome):
+        return self._dados[nome][:self.tamanho]
+
+    def duracao(self):
+        # da primeira criação à última entrega; NaN sem nenhum registro
+        return self.ultima_entrega - self.primeira_criacao if self.tamanho else float('nan')
+
+    def ordem_por_empilhadeira(self):
+        # ordem das linhas agrupadas por empilhadeira, na sequência em que foram atribuídas
+        return np.argsort(self.coluna('empilhadeira'), kind='stable')
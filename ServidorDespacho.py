@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from CarregadorEntradas import ARQUIVO_MATRIZ, ARQUIVO_ORDENS, PASTA_CACHE, carregar_matriz, carregar_ordens
+from DespachoOnline import DespachanteOnline
+
+HOST, PORTA = '127.0.0.1', 8765
+
+
+def _json(valor):
+    # Timestamps em ISO e escalares do numpy como números
+    if isinstance(valor, pd.Timestamp):
+        return valor.isoformat()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"{type(valor).__name__} não é serializável")
+
+
+def _linha_json(conteudo):
+    return (json.dumps(conteudo, default=_json, ensure_ascii=False) + '\n').encode()
+
+
+class ServidorDespacho:
+    # serviço local de despacho: cada terminal abre uma conexão TCP e manda um pedido JSON
+    # por linha, recebendo uma resposta JSON por linha, na mesma ordem. Pedidos:
+    #   {"tipo": "ordem", "ordem": ..., "origem": ..., "destino": ..., "data_hora": ...}
+    #   {"tipo": "consulta", "linha": ...}   atribuição de uma ordem que ficou em espera
+    #   {"tipo": "estatisticas"}             latências, profundidade da fila e lotes
+    #   {"tipo": "encerrar"}                 fim do turno: despacha o que falta e devolve as métricas
+    # As ordens que chegam dentro de janela_s formam um lote: o lote vai para o despachante
+    # em ordem de data_hora e o relógio avança uma vez, até a última ordem do lote. Dentro do
+    # lote as decisões continuam uma por ordem, na ordem do log, como no modo em lote: o lote
+    # só divide o avanço do relógio e a leitura das atribuições. Uma ordem com data_hora
+    # anterior ao relógio (terminal atrasado) é despachada no horário do relógio
+    def __init__(self, despachante, janela_s=0.002, lote_maximo=256, amostras_latencia=100_000):
+        self.despachante = despachante
+        self.janela_s = janela_s
+        self.lote_maximo = lote_maximo
+        self.fila = asyncio.Queue()
+        self.latencias = deque(maxlen=amostras_latencia)
+        self.atribuicoes = {}
+        self.horario = None
+        self.pedidos = 0
+        self.erros = 0
+        self.atrasadas = 0
+        self.lotes = 0
+        self.ordens_em_lotes = 0
+        self.maior_lote = 0
+        self.maior_fila = 0
+        self.metricas = None
+        self.encerrado = asyncio.Event()
+        self._servidor = None
+        self._despacho = None
+
+    async def iniciar(self, host=HOST, porta=PORTA):
+        self._despacho = asyncio.create_task(self._despachar_lotes())
+        self._servidor = await asyncio.start_server(self._atender, host, porta)
+        return self._servidor.sockets[0].getsockname()[:2]
+
+    async def parar(self):
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        if self._despacho is not None:
+            self._despacho.cancel()
+            await asyncio.gather(self._despacho, return_exceptions=True)
+
+    async def servir(self, host=HOST, porta=PORTA):
+        # até receber um pedido de encerrar
+        endereco = await self.iniciar(host, porta)
+        print(f"Despachando em {endereco[0]}:{endereco[1]}")
+        try:
+            await self.encerrado.wait()
+        finally:
+            await self.parar()
+        return self.metricas
+
+    async def _atender(self, leitor, escritor):
+        try:
+            while linha := await leitor.readline():
+                recebido = time.perf_counter()
+                try:
+                    pedido = json.loads(linha)
+                    resposta = await self._responder(pedido)
+                except (ValueError, KeyError, TypeError, RuntimeError) as erro:
+                    self.erros += 1
+                    resposta = {'erro': str(erro)}
+                escritor.write(_linha_json(resposta))
+                await escritor.drain()
+                self.latencias.append(time.perf_counter() - recebido)
+        except ConnectionError:
+            pass
+        finally:
+            escritor.close()
+
+    async def _responder(self, pedido):
+        self.pedidos += 1
+        tipo = pedido.get('tipo', 'ordem')
+        if tipo == 'ordem':
+            if self.encerrado.is_set():
+                raise RuntimeError("O despacho já foi encerrado")
+            resultado = asyncio.get_running_loop().create_future()
+            self.fila.put_nowait((pedido, resultado))
+            return await resultado
+        if tipo == 'consulta':
+            linha = int(pedido['linha'])
+            return self.atribuicoes.get(linha, {'linha': linha, 'atribuida': False})
+        if tipo == 'estatisticas':
+            return self.estatisticas()
+        if tipo == 'encerrar':
+            return await self.encerrar()
+        raise ValueError(f"Pedido desconhecido: {tipo}")
+
+    async def encerrar(self):
+        if self.metricas is None:
+            # as ordens já aceitas entram nos lotes antes do fim do turno; só depois servir()
+            # é acordado para parar o despacho, que não pode ser cancelado no meio de um lote
+            await self.fila.join()
+            if self.metricas is None:
+                self.metricas = self.despachante.close()
+                self._guardar_atribuicoes()
+                self.encerrado.set()
+        return {'metricas': self.metricas, 'status': self.despachante.status()}
+
+    async def _despachar_lotes(self):
+        laco = asyncio.get_running_loop()
+        while True:
+            lote = [await self.fila.get()]
+            prazo = laco.time() + self.janela_s
+            while len(lote) < self.lote_maximo:
+                restante = prazo - laco.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self.fila.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+            while len(lote) < self.lote_maximo and not self.fila.empty():
+                lote.append(self.fila.get_nowait())
+
+            self.maior_fila = max(self.maior_fila, len(lote) + self.fila.qsize())
+            try:
+                self._despachar(lote)
+            finally:
+                for _ in lote:
+                    self.fila.task_done()
+
+    def _despachar(self, lote):
+        # entrada no despachante em ordem de data_hora (estável: empates na ordem de chegada)
+        pedidos = []
+        for pedido, resultado in lote:
+            try:
+                pedidos.append((pd.Timestamp(pedido['data_hora']), pedido, resultado))
+            except (KeyError, ValueError, TypeError) as erro:
+                self.erros += 1
+                resultado.set_result({'erro': f"data_hora inválida: {erro}"})
+        pedidos.sort(key=lambda item: item[0])
+
+        aceitas = []
+        for data_hora, pedido, resultado in pedidos:
+            atrasada = self.horario is not None and data_hora < self.horario
+            if atrasada:
+                self.atrasadas += 1
+                data_hora = self.horario
+            ordem = {chave: valor for chave, valor in pedido.items() if chave != 'tipo'}
+            ordem['data_hora'] = data_hora
+            try:
+                linha = self.despachante.submit_order(ordem)
+            except (ValueError, KeyError, RuntimeError) as erro:
+                self.erros += 1
+                resultado.set_result({'erro': str(erro)})
+                continue
+            self.horario = data_hora
+            aceitas.append((linha, atrasada, resultado))
+
+        if aceitas:
+            self.despachante.advance_clock(self.horario)
+            self._guardar_atribuicoes()
+            self.lotes += 1
+            self.ordens_em_lotes += len(aceitas)
+            self.maior_lote = max(self.maior_lote, len(aceitas))
+
+        for linha, atrasada, resultado in aceitas:
+            resposta = self.atribuicoes.get(linha, {'linha': linha, 'atribuida': False})
+            resultado.set_result({**resposta, 'atrasada': True} if atrasada else resposta)
+
+    def _guardar_atribuicoes(self):
+        for atribuicao in self.despachante.poll_assignments():
+            self.atribuicoes[atribuicao['linha']] = {**atribuicao, 'atribuida': True}
+
+    def estatisticas(self):
+        latencias = np.array(self.latencias) * 1000
+        percentis = dict(zip(('p50_ms', 'p90_ms', 'p99_ms', 'max_ms'),
+                             np.percentile(latencias, [50, 90, 99, 100]).tolist() if len(latencias) else [None] * 4))
+        return {
+            'pedidos': self.pedidos,
+            'erros': self.erros,
+            'atrasadas': self.atrasadas,
+            'latencia': percentis,
+            'fila': self.fila.qsize(),
+            'maior_fila': self.maior_fila,
+            'lotes': self.lotes,
+            'lote_medio': self.ordens_em_lotes / self.lotes if self.lotes else 0.0,
+            'maior_lote': self.maior_lote,
+            'despacho': self.despachante.status(),
+        }
+
+
+async def gerar_carga(ordens, host=HOST, porta=PORTA, terminais=16, encerrar=True):
+    # cliente de carga: terminais conexões simultâneas, cada uma manda a próxima ordem do log
+    # (em ordem cronológica) assim que recebe a resposta da anterior. Devolve as latências
+    # vistas pelos terminais, as estatísticas do servidor e, com encerrar, as métricas finais
+    colunas = [c for c in ('ordem', 'material', 'origem', 'destino', 'data_hora', 'base', 'quantidade',
+                           'cod_material', 'preenche_andares') if c in ordens]
+    registros = iter(json.loads(ordens[colunas].to_json(orient='records', date_format='iso', date_unit='ns')))
+    latencias, respostas = [], []
+
+    async def terminal():
+        leitor, escritor = await asyncio.open_connection(host, porta)
+        try:
+            for registro in registros:
+                inicio = time.perf_counter()
+                escritor.write(_linha_json({'tipo': 'ordem', **registro}))
+                await escritor.drain()
+                respostas.append(json.loads(await leitor.readline()))
+                latencias.append(time.perf_counter() - inicio)
+        finally:
+            escritor.close()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(terminal() for _ in range(terminais)))
+    duracao = time.perf_counter() - inicio
+
+    leitor, escritor = await asyncio.open_connection(host, porta)
+    try:
+        pedidos = [{'tipo': 'estatisticas'}] + ([{'tipo': 'encerrar'}] if encerrar else [])
+        finais = []
+        for pedido in pedidos:
+            escritor.write(_linha_json(pedido))
+            await escritor.drain()
+            finais.append(json.loads(await leitor.readline()))
+    finally:
+        escritor.close()
+
+    latencias = np.array(latencias) * 1000
+    return {
+        'ordens': len(respostas),
+        'duracao_s': duracao,
+        'ordens_por_s': len(respostas) / duracao if duracao else None,
+        'erros': sum('erro' in resposta for resposta in respostas),
+        'atribuidas_na_hora': sum(bool(resposta.get('atribuida')) for resposta in respostas),
+        'latencia_cliente': dict(zip(('p50_ms', 'p90_ms', 'p99_ms', 'max_ms'),
+                                     np.percentile(latencias, [50, 90, 99, 100]).tolist() if len(latencias) else [None] * 4)),
+        'servidor': finais[0],
+        'encerramento': finais[1] if encerrar else None,
+    }
+
+
+def criar_argumentos():
+    argumentos = argparse.ArgumentParser(description="Serviço local de despacho de empilhadeiras e cliente de carga")
+    comandos = argumentos.add_subparsers(dest='comando', required=True)
+
+    servidor = comandos.add_parser('servidor', help="recebe ordens dos terminais e despacha ao vivo")
+    servidor.add_argument('--heuristica', default='gulosa', help="heurística que decide sem ordens futuras")
+    servidor.add_argument('--empilhadeiras', type=int, default=12)
+    servidor.add_argument('--matriz', default=ARQUIVO_MATRIZ, help="planilha, CSV ou Parquet da matriz de distâncias")
+    servidor.add_argument('--janela-ms', type=float, default=2.0, help="janela de agrupamento dos pedidos em lotes")
+    servidor.add_argument('--lote-maximo', type=int, default=256)
+
+    carga = comandos.add_parser('carga', help="reproduz um log de ordens com vários terminais simultâneos")
+    carga.add_argument('--ordens', default=ARQUIVO_ORDENS, help="planilha, CSV ou Parquet de ordens")
+    carga.add_argument('--terminais', type=int, default=16)
+    carga.add_argument('--limite', type=int, default=None, help="usa só as primeiras ordens do log")
+    carga.add_argument('--sem-encerrar', action='store_true', help="não encerra o turno no servidor ao final")
+
+    for comando in (servidor, carga):
+        comando.add_argument('--host', default=HOST)
+        comando.add_argument('--porta', type=int, default=PORTA)
+        comando.add_argument('--cache', default=PASTA_CACHE, help="pasta do cache das entradas convertidas")
+    return argumentos
+
+
+def main(argv=None):
+    args = criar_argumentos().parse_args(argv)
+    if args.comando == 'servidor':
+        despachante = DespachanteOnline.criar(args.heuristica, args.empilhadeiras, carregar_matriz(args.matriz, args.cache))
+        servidor = ServidorDespacho(despachante, args.janela_ms / 1000, args.lote_maximo)
+        metricas = asyncio.run(servidor.servir(args.host, args.porta))
+        print(json.dumps(servidor.estatisticas(), default=_json, ensure_ascii=False, indent=1))
+        print(json.dumps(metricas, default=_json, ensure_ascii=False, indent=1))
+    else:
+        # o log vai em ordem cronológica, como as ordens chegariam dos terminais
+        ordens = carregar_ordens(args.ordens, args.cache).sort_values('data_hora', kind='stable')
+        if args.limite:
+            ordens = ordens.head(args.limite)
+        relatorio = asyncio.run(gerar_carga(ordens, args.host, args.porta, args.terminais, not args.sem_encerrar))
+        print(json.dumps(relatorio, default=_json, ensure_ascii=False, indent=1))
+
+
+if __name__ == "__main__":
+    main()
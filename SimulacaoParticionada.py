@@ -0,0 +1,246 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import CatalogoHeuristicas
+import VarreduraFrota
+from CarregadorEntradas import carregar_entradas
+from FluxoOrdens import FluxoOrdens
+from MatrizDistancias import MatrizDistancias
+from PontosControle import PontoControle
+from RegistroAtribuicoes import RegistroAtribuicoes
+from SimuladorEventos import RelogioSimulacao, SimulacaoInterrompida
+
+# linhas por bloco entregue às execuções de cada partição
+TAMANHO_BLOCO = 5_000
+
+
+def preparar_ordens(ordens):
+    # a mesma preparação de otimizar/processar_ordens_fifo, para que as linhas sejam as da
+    # execução sequencial
+    ordens = ordens.copy()
+    ordens['data_hora'] = pd.to_datetime(ordens['data_hora'], errors='coerce')
+    return ordens.dropna(subset=['data_hora']).sort_values('data_hora').reset_index(drop=True)
+
+
+def planejar_cortes(data_hora, lacuna_min=60, turnos=(), min_ordens=1_000):
+    # linhas onde começa cada partição depois da primeira: a primeira ordem depois de uma
+    # lacuna de pelo menos lacuna_min minutos sem chegadas e a primeira de cada turno
+    # (horários 'HH:MM'). O corte só fica entre instantes diferentes, e partições com menos de
+    # min_ordens ordens se juntam à anterior
+    tempos = np.asarray(data_hora, dtype='datetime64[ns]')
+    if len(tempos) < 2:
+        return []
+
+    candidatos = set()
+    if lacuna_min is not None:
+        lacunas = np.diff(tempos) >= np.timedelta64(int(lacuna_min * 60), 's')
+        candidatos.update((np.flatnonzero(lacunas) + 1).tolist())
+    if turnos:
+        dias = pd.date_range(pd.Timestamp(tempos[0]).normalize(), pd.Timestamp(tempos[-1]).normalize(), freq='D')
+        for turno in turnos:
+            fronteiras = (dias + pd.to_timedelta(f"{turno}:00")).to_numpy(dtype='datetime64[ns]')
+            candidatos.update(int(i) for i in np.searchsorted(tempos, fronteiras, 'left') if 0 < i < len(tempos))
+
+    cortes = []
+    anterior = 0
+    for i in sorted(candidatos):
+        if tempos[i] > tempos[i - 1] and i - anterior >= min_ordens and len(tempos) - i >= min_ordens:
+            cortes.append(i)
+            anterior = i
+    return cortes
+
+
+def _blocos(ordens, inicio, fim):
+    # FluxoOrdens acrescenta colunas aos blocos, por isso cópias
+    for i in range(inicio, fim, TAMANHO_BLOCO):
+        yield ordens.iloc[i:min(i + TAMANHO_BLOCO, fim)].copy()
+
+
+class FimParticao:
+    # gancho de pontos_controle (ver PontosControle) da execução de uma partição. Depois da
+    # última chegada processa os eventos até corte (instante da primeira ordem da seguinte),
+    # como a execução sequencial faria antes dessa ordem, e confere se a partição drenou:
+    # filas vazias, nenhuma entrega agendada e a frota toda livre até lá, ou seja, nenhum
+    # trabalho pendente ou em andamento atravessa o corte. Se não drenou, guarda o ponto de
+    # controle do corte, de onde a partição seguinte continua, e interrompe. No fim guarda o
+    # estado final e interrompe também: os resultados saem da junção dos trechos
+    def __init__(self, corte):
+        self.corte = corte
+        self.drenada = True
+        self.no_corte = None
+        self.final = None
+
+    def apos_chegada(self, politica):
+        simulador = politica.simulador
+        if self.corte is None or simulador.chegadas_pendentes():
+            return
+        simulador.processar_ate(self.corte)
+        frota = politica.frota
+        livre_em = frota.livre_em_s[frota.em_uso].max(initial=float('-inf'))
+        self.drenada = (not simulador.eventos and livre_em <= self.corte
+                        and not any(getattr(politica, nome) for nome in politica.FILAS))
+        if not self.drenada:
+            self.no_corte = PontoControle.capturar(politica)
+            raise SimulacaoInterrompida()
+
+    def ao_concluir(self, politica):
+        self.final = PontoControle.capturar(politica, concluida=True)
+        raise SimulacaoInterrompida()
+
+
+def _ponto_inicial(nome, num_empilhadeiras, parametros, posicoes_iniciais, relogio, matriz_dist, linha):
+    # frota nova, como no começo de um turno, e fluxo de ordens começando na linha dada
+    politica = CatalogoHeuristicas.criar(nome, num_empilhadeiras, **parametros)
+    politica.matriz_dist = matriz_dist
+    politica.posicoes_iniciais = posicoes_iniciais
+    politica.preparar_estado_inicial()
+    return PontoControle.inicial(politica, relogio, linha)
+
+
+def _simular(nome, num_empilhadeiras, ponto, ordens, matriz_dist, fim, corte):
+    # continua de ponto com as ordens das linhas já entregues até fim
+    inicio = time.perf_counter()
+    ponto.ordens_omitidas = ponto.cabecalho['ordens_entregues']
+    acompanhamento = FimParticao(corte)
+    try:
+        CatalogoHeuristicas.executar(nome, num_empilhadeiras, _blocos(ordens, ponto.ordens_omitidas, fim), matriz_dist,
+                                     silencioso=True, pontos_controle=acompanhamento, retomada=ponto)
+    except SimulacaoInterrompida:
+        pass
+    return {'drenada': acompanhamento.drenada, 'no_corte': acompanhamento.no_corte,
+            'final': acompanhamento.final, 'duracao_s': time.perf_counter() - inicio}
+
+
+def _simular_particao(nome, num_empilhadeiras, parametros, posicoes_iniciais, inicio, fim, corte):
+    # roda num processo do pool: as linhas de inicio a fim com uma frota nova
+    ordens, matriz_dist = VarreduraFrota.entradas_do_processo()
+    relogio = RelogioSimulacao(ordens['data_hora'].iloc[0])
+    ponto = _ponto_inicial(nome, num_empilhadeiras, parametros, posicoes_iniciais, relogio, matriz_dist, inicio)
+    return _simular(nome, num_empilhadeiras, ponto, ordens, matriz_dist, fim, corte)
+
+
+def _juntar(nome, num_empilhadeiras, parametros, trechos, ordens, matriz_dist):
+    # resultados do log inteiro a partir dos estados finais dos trechos: os registros de
+    # atribuições em sequência, os ACUMULADORES_FROTA de cada empilhadeira somados e o resto
+    # (filas restantes, posições) do último trecho
+    politica = CatalogoHeuristicas.criar(nome, num_empilhadeiras, **parametros)
+    estados = [trecho['final'].estado()['politica'] for trecho in trechos]
+    vars(politica).update(estados[-1])
+    politica.registro = RegistroAtribuicoes()
+    for estado in estados:
+        politica.registro.acrescentar_de(estado['registro'])
+    for emp_id, emp in politica.empilhadeiras.items():
+        for acumulador in politica.ACUMULADORES_FROTA:
+            emp[acumulador] = sum(estado['empilhadeiras'][emp_id][acumulador] for estado in estados)
+
+    fluxo = FluxoOrdens([ordens.copy()], matriz_dist)
+    while fluxo.proximo_bloco() is not None:
+        pass
+    politica.matriz_dist = matriz_dist
+    politica.relogio = fluxo.relogio
+    politica.ordens = fluxo.tabela_saida()
+    return politica.gerar_resultados()
+
+
+def simular_particionado(nome, num_empilhadeiras, ordens, matriz_dist, lacuna_min=60, turnos=(), min_ordens=1_000,
+                         max_processos=None, posicoes_iniciais=None, **parametros):
+    # divide o log em partições (ver planejar_cortes) e simula cada uma num processo com uma
+    # frota nova, como um turno à parte (posicoes_iniciais valem para todas). Onde a partição
+    # anterior drenou antes do corte (ver FimParticao), as duas são independentes e os
+    # resultados são os de simular cada uma sozinha. Onde não drenou, a simulação da seguinte
+    # é descartada e refeita em sequência, continuando o estado da anterior (frota, esteiras,
+    # filas e entregas pendentes) como na execução sequencial; as partições assim encadeadas
+    # formam um trecho. Entre trechos a frota recomeça nova e a consolidação não junta ordens
+    # dos dois lados do corte. relatorio: uma linha por partição, com attrs do tempo total, do
+    # trabalho somado das simulações e do caminho crítico (a partição mais longa, as
+    # continuações e a junção), que é o tempo com um processo por partição
+    if parametros.get('busca_local_s'):
+        raise ValueError("A busca local refaz as rotas do log inteiro e não se aplica às partições")
+    inicio = time.perf_counter()
+    ordens = preparar_ordens(ordens)
+    matriz_dist = MatrizDistancias.garantir(matriz_dist)
+    cortes = planejar_cortes(ordens['data_hora'], lacuna_min, turnos, min_ordens)
+    limites = [0, *cortes, len(ordens)]
+    relogio = RelogioSimulacao(ordens['data_hora'].iloc[0]) if len(ordens) else None
+    instantes = relogio.segundos(ordens['data_hora'].iloc[cortes]).tolist() if cortes else []
+    instantes.append(None)
+
+    with VarreduraFrota.MatrizCompartilhada(matriz_dist) as compartilhada, \
+            ProcessPoolExecutor(max_workers=max_processos or os.cpu_count(), initializer=VarreduraFrota.iniciar_processo,
+                                initargs=(*compartilhada.argumentos(), ordens)) as pool:
+        futuros = [pool.submit(_simular_particao, nome, num_empilhadeiras, parametros, posicoes_iniciais,
+                               limites[k], limites[k + 1], instantes[k])
+                   for k in range(len(limites) - 1)]
+        particoes = [futuro.result() for futuro in futuros]
+
+    relatorio = []
+    trechos = []
+    continuacoes_s = 0.0
+    for k, particao in enumerate(particoes):
+        linha = {'particao': k, 'primeira_linha': limites[k], 'ordens': limites[k + 1] - limites[k],
+                 'duracao_s': particao['duracao_s'], 'continua_anterior': bool(trechos) and not trechos[-1]['drenada']}
+        if linha['continua_anterior']:
+            anterior = trechos.pop()
+            particao = _simular(nome, num_empilhadeiras, anterior['no_corte'], ordens, matriz_dist,
+                                limites[k + 1], instantes[k])
+            continuacoes_s += particao['duracao_s']
+        linha['drenada'] = particao['drenada']
+        trechos.append(particao)
+        relatorio.append(linha)
+
+    juncao = time.perf_counter()
+    resultados, metricas = _juntar(nome, num_empilhadeiras, parametros, trechos, ordens, matriz_dist)
+
+    relatorio = pd.DataFrame(relatorio)
+    relatorio.attrs['trechos'] = len(trechos)
+    relatorio.attrs['trabalho_s'] = float(relatorio['duracao_s'].sum()) + continuacoes_s
+    relatorio.attrs['caminho_critico_s'] = (float(relatorio['duracao_s'].max()) + continuacoes_s
+                                            + time.perf_counter() - juncao)
+    relatorio.attrs['duracao_s'] = time.perf_counter() - inicio
+    return resultados, metricas, relatorio
+
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Simula o log dividido em turnos/dias, com as partições em paralelo")
+    argumentos.add_argument('--heuristica', default='gulosa', choices=list(CatalogoHeuristicas.HEURISTICAS))
+    argumentos.add_argument('--empilhadeiras', type=int, default=10)
+    argumentos.add_argument('--lacuna-min', type=float, default=60, help="minutos sem chegadas que separam partições")
+    argumentos.add_argument('--turnos', nargs='*', default=[], help="horários de troca de turno, como 06:00 14:00 22:00")
+    argumentos.add_argument('--min-ordens', type=int, default=1_000, help="tamanho mínimo de uma partição")
+    argumentos.add_argument('--processos', type=int, default=None)
+    argumentos.add_argument('--sequencial', action='store_true',
+                            help="simula também o log inteiro em sequência e compara tempo e métricas")
+    argumentos.add_argument('--saida', default='resultados_particionados.csv')
+    args = argumentos.parse_args()
+
+    start_time = time.time()
+    ordens, matriz_dist = carregar_entradas()
+    print(f"Entradas carregadas em {time.time() - start_time:.2f}s")
+
+    resultados, metricas, relatorio = simular_particionado(
+        args.heuristica, args.empilhadeiras, ordens, matriz_dist, args.lacuna_min, args.turnos, args.min_ordens,
+        max_processos=args.processos)
+    print(relatorio.to_string(index=False))
+    print(f"\n{len(relatorio)} partições em {relatorio.attrs['trechos']} trechos independentes: "
+          f"{relatorio.attrs['duracao_s']:.2f}s no total, {relatorio.attrs['trabalho_s']:.2f}s de simulação somados, "
+          f"caminho crítico de {relatorio.attrs['caminho_critico_s']:.2f}s")
+
+    metricas_sequenciais = {}
+    if args.sequencial:
+        inicio = time.perf_counter()
+        _, metricas_sequenciais = CatalogoHeuristicas.executar(args.heuristica, args.empilhadeiras, ordens.copy(),
+                                                               matriz_dist, silencioso=True)
+        duracao = time.perf_counter() - inicio
+        print(f"Sequencial: {duracao:.2f}s; aceleração de {duracao / relatorio.attrs['duracao_s']:.2f}x medida e de "
+              f"{duracao / relatorio.attrs['caminho_critico_s']:.2f}x com um processo por partição")
+    for nome_metrica, valor in metricas.items():
+        sequencial = f" (sequencial: {metricas_sequenciais[nome_metrica]})" if nome_metrica in metricas_sequenciais else ""
+        print(f"{nome_metrica}: {valor}{sequencial}")
+    resultados.to_csv(args.saida, index=False)
+    print(f"\nTempo total de execução: {timedelta(seconds=time.time() - start_time)}")
@@ -0,0 +1,246 @@
+import heapq
+from itertools import count
+
+import numpy as np
+
+from Instrumentacao import SEM_INSTRUMENTACAO
+from Progresso import ProgressoTerminal
+
+
+class RelogioSimulacao:
+    # o tempo interno da simulação é um float em segundos desde a primeira ordem do log;
+    # só os resultados voltam a ser datas
+    def __init__(self, origem):
+        # origem NaT (log vazio) não é aceita por np.datetime64
+        self.origem = np.datetime64(origem, 'ns') if origem == origem else np.datetime64('NaT', 'ns')
+
+    def segundos(self, datas):
+        return (np.asarray(datas, dtype='datetime64[ns]') - self.origem) / np.timedelta64(1, 's')
+
+    def datas(self, segundos):
+        return self.origem + np.round(np.asarray(segundos, dtype=np.float64) * 1e9).astype('timedelta64[ns]')
+
+# diferença de custo abaixo da qual consolidar não compensa: os custos somam distâncias com
+# segundos de espera em float, e empates quase exatos não devem depender de arredondamento
+TOLERANCIA_CUSTO = 1e-6
+
+
+class FrotaEmpilhadeiras:
+    # fila de prioridade (heap) das empilhadeiras por livre_em; as que ainda não trabalharam
+    # (livre_em None) vêm primeiro e empates ficam com o menor id. Atualizar só empilha a
+    # chave nova: a antiga fica no heap e é descartada quando chega ao topo (invalidação
+    # preguiçosa), e o heap é refeito quando as chaves vencidas passam do tamanho da frota
+    def __init__(self, num_empilhadeiras):
+        self.livre_em = [None] * num_empilhadeiras
+        self._fila = [(0, emp_id) for emp_id in range(num_empilhadeiras)]
+
+        # cópia em arrays para avaliar a frota inteira em uma operação vetorial
+        self.posicoes = np.full(num_empilhadeiras, -1, dtype=np.int64)
+        self.livre_em_s = np.zeros(num_empilhadeiras, dtype=np.float64)
+        self.em_uso = np.zeros(num_empilhadeiras, dtype=bool)
+
+    def __len__(self):
+        return len(self.livre_em)
+
+    @staticmethod
+    def _chave(emp_id, livre_em):
+        return (0, emp_id) if livre_em is None else (1, livre_em, emp_id)
+
+    def _vigente(self, chave):
+        emp_id = chave[-1]
+        return chave == self._chave(emp_id, self.livre_em[emp_id])
+
+    def atualizar(self, emp_id, livre_em, posicao):
+        self.livre_em[emp_id] = livre_em
+        heapq.heappush(self._fila, self._chave(emp_id, livre_em))
+        if len(self._fila) > 2 * len(self.livre_em):
+            self._fila = [self._chave(i, livre) for i, livre in enumerate(self.livre_em)]
+            heapq.heapify(self._fila)
+
+        self.posicoes[emp_id] = posicao
+        self.livre_em_s[emp_id] = livre_em
+        self.em_uso[emp_id] = True
+
+    def posicionar(self, emp_id, posicao):
+        # partida a quente: posição de uma empilhadeira que ainda não trabalhou neste turno
+        self.posicoes[emp_id] = posicao
+
+    def proxima_livre(self):
+        while self._fila and not self._vigente(self._fila[0]):
+            heapq.heappop(self._fila)
+        if not self._fila:
+            return -1
+        return self._fila[0][-1]
+
+    def distancias_sem_carga(self, dist, cod_origem):
+        # quem ainda não trabalhou parte da própria origem
+        posicoes = np.where(self.posicoes < 0, cod_origem, self.posicoes)
+        return dist[posicoes, cod_origem]
+
+    def tempos_espera(self, referencia, disponivel_sem_uso=None):
+        # segundos que cada empilhadeira faria a ordem esperar; quem ainda não trabalhou
+        # fica disponível em disponivel_sem_uso (por padrão, na própria referência)
+        padrao = referencia if disponivel_sem_uso is None else disponivel_sem_uso
+        disponivel = np.where(self.em_uso, self.livre_em_s, padrao)
+        return np.maximum(0, disponivel - referencia)
+
+    def custos_ordem(self, dist, cod_origem, cod_destino, referencia, disponivel_sem_uso=None, fator_sem_carga=1.0):
+        # custo de cada empilhadeira atender a ordem sozinha: distância sem carga (ponderada),
+        # distância com carga e 0,1 por segundo de espera
+        dist_sem_carga = self.distancias_sem_carga(dist, cod_origem)
+        tempo_espera = self.tempos_espera(referencia, disponivel_sem_uso)
+        return (dist_sem_carga * fator_sem_carga) + dist[cod_origem, cod_destino] + (tempo_espera * 0.1)
+
+    @staticmethod
+    def menor_custo(custos):
+        # argmin devolve o primeiro mínimo na ordem das linhas, ou seja, o menor id (e, numa
+        # matriz, a primeira linha) em caso de empate; custos indefinidos ou infinitos nunca
+        # são escolhidos
+        custos = np.where(np.isnan(custos), np.inf, custos)
+        if custos.size == 0:
+            return None, float('inf')
+
+        indice = np.unravel_index(np.argmin(custos), custos.shape)
+        if custos[indice] == np.inf:
+            return None, float('inf')
+        if custos.ndim == 1:
+            return int(indice[0]), custos[indice]
+        return tuple(int(i) for i in indice), custos[indice]
+
+
+class SimulacaoInterrompida(Exception):
+    pass
+
+
+class PoliticaDespacho:
+    # ganchos chamados pelo simulador; cada heurística implementa sua regra de despacho
+    # criterio_parada: função opcional que recebe a política após cada chegada e, se
+    # devolver verdadeiro, interrompe a simulação com SimulacaoInterrompida.
+    # instrumentacao: uma Instrumentacao mede os métodos de FASES_INSTRUMENTADAS; o padrão
+    # não mede nada.
+    # progresso: um Progresso recebe a contagem de ordens processadas; o padrão (None) é uma
+    # linha no terminal atualizada a cada meio segundo, e SEM_PROGRESSO não mostra nada.
+    # CONSULTA_ORDENS_FUTURAS: a política retira ordens que ainda não chegaram (janela de
+    # consolidação), então não pode decidir só com as ordens já recebidas (DespachanteOnline)
+    # pontos_controle: um PontosControle grava o estado periodicamente; retomada: um
+    # PontoControle de onde a execução continua; posicoes_iniciais: {empilhadeira: local} de
+    # onde a frota parte (partida a quente). ESTADO_EXCLUIDO: atributos que não entram no
+    # ponto de controle, porque são refeitos ou passados de novo na retomada. FILAS: listas
+    # de ordens em espera, que precisam estar vazias para a partição drenar
+    # (SimulacaoParticionada). ACUMULADORES_FROTA: totais de cada empilhadeira que só somam,
+    # sem influir nas decisões; as partições somam os seus
+    CONSULTA_ORDENS_FUTURAS = False
+    criterio_parada = None
+    instrumentacao = SEM_INSTRUMENTACAO
+    progresso = None
+    pontos_controle = None
+    retomada = None
+    posicoes_iniciais = None
+    FASES_INSTRUMENTADAS = ('ao_chegar', 'ao_entregar', 'ao_encerrar')
+    ESTADO_EXCLUIDO = ('simulador', 'fluxo', 'matriz_dist', 'gravador', 'criterio_parada', 'instrumentacao', 'progresso',
+                       'pontos_controle', 'retomada', 'posicoes_iniciais')
+    FILAS = ()
+    ACUMULADORES_FROTA = ('distancia_total', 'distancia_sem_carga', 'tempo_ocioso_parado', 'tempo_ocioso_movimento')
+
+    def ao_chegar(self, ordem):
+        raise NotImplementedError
+
+    def ao_entregar(self, emp_id, hora_entrega):
+        pass
+
+    def ao_encerrar(self):
+        pass
+
+    def iniciar_progresso(self):
+        if self.progresso is None:
+            self.progresso = ProgressoTerminal()
+        self.progresso.iniciar()
+
+    def informar_progresso(self, processadas):
+        self.progresso.atualizar(processadas, self.total_de_ordens)
+
+    def preparar_estado_inicial(self):
+        # chamado com matriz_dist já definida e antes de abrir o fluxo de ordens; na retomada
+        # devolve o estado do fluxo (FluxoOrdens(..., estado=...)), senão None
+        if self.retomada is not None:
+            return self.retomada.restaurar(self)
+        if self.posicoes_iniciais is not None:
+            for emp_id, local in dict(self.posicoes_iniciais).items():
+                if emp_id not in self.empilhadeiras:
+                    raise KeyError(f"Empilhadeira {emp_id} não existe numa frota de {len(self.empilhadeiras)}")
+                posicao = self.matriz_dist.codigo(local)
+                self.empilhadeiras[emp_id]['posicao'] = posicao
+                self.frota.posicionar(emp_id, posicao)
+        return None
+
+    def posicoes_finais(self):
+        # {empilhadeira: local} onde cada uma terminou, para a partida a quente do próximo turno
+        return {emp_id: self.matriz_dist.locais[emp['posicao']] for emp_id, emp in self.empilhadeiras.items()
+                if emp['posicao'] is not None}
+
+
+class SimuladorEventos:
+    # entregas no mesmo instante de uma chegada são processadas antes dela
+    ENTREGA, CHEGADA = 0, 1
+
+    def __init__(self, politica):
+        self.politica = politica
+        self.eventos = []
+        self._sequencia = count()
+        self._chegadas = iter(())
+
+    def agendar_entrega(self, hora_entrega, emp_id):
+        heapq.heappush(self.eventos, (hora_entrega, self.ENTREGA, next(self._sequencia), emp_id))
+
+    def executar(self, chegadas, retomando=False):
+        # chegadas: iterável de (data_hora, ordem) em ordem cronológica, consumido sob demanda
+        # para que a política possa retirar ordens futuras (consolidação) antes de chegarem.
+        # retomando: os eventos vieram de um ponto de controle, que já tem a próxima chegada
+        self._chegadas = iter(chegadas)
+        if not retomando or not self.chegadas_pendentes():
+            self._agendar_proxima_chegada()
+        self._processar_eventos()
+        self.politica.ao_encerrar()
+        self._processar_eventos()
+        if self.politica.pontos_controle is not None:
+            self.politica.pontos_controle.ao_concluir(self.politica)
+
+    def estado(self):
+        # eventos pendentes e o próximo número de sequência, para o ponto de controle
+        proxima = next(self._sequencia)
+        self._sequencia = count(proxima)
+        return {'eventos': list(self.eventos), 'sequencia': proxima}
+
+    def restaurar(self, estado):
+        self.eventos = list(estado['eventos'])
+        self._sequencia = count(estado['sequencia'])
+
+    def agendar_chegada(self, instante, ordem):
+        # modo ao vivo (DespachanteOnline): as chegadas entram uma a uma, em ordem cronológica
+        heapq.heappush(self.eventos, (instante, self.CHEGADA, next(self._sequencia), ordem))
+
+    def processar_ate(self, tempo):
+        # processa os eventos até tempo, inclusive, na mesma ordem de executar()
+        self._processar_eventos(tempo)
+
+    def chegadas_pendentes(self):
+        return sum(1 for evento in self.eventos if evento[1] == self.CHEGADA)
+
+    def _agendar_proxima_chegada(self):
+        proxima = next(self._chegadas, None)
+        if proxima is not None:
+            data_hora, ordem = proxima
+            heapq.heappush(self.eventos, (data_hora, self.CHEGADA, next(self._sequencia), ordem))
+
+    def _processar_eventos(self, limite=float('inf')):
+        while self.eventos and self.eventos[0][0] <= limite:
+            tempo, tipo, _, dado = heapq.heappop(self.eventos)
+            if tipo == self.ENTREGA:
+                self.politica.ao_entregar(dado, tempo)
+            else:
+                self.politica.ao_chegar(dado)
+                if self.politica.criterio_parada is not None and self.politica.criterio_parada(self.politica):
+                    raise SimulacaoInterrompida()
+                self._agendar_proxima_chegada()
+                if self.politica.pontos_controle is not None:
+                    self.politica.pontos_controle.apos_chegada(self.politica)
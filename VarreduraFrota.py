@@ -0,0 +1,99 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import CatalogoHeuristicas
+from CarregadorEntradas import carregar_entradas
+from MatrizDistancias import MatrizDistancias
+from Progresso import SEM_PROGRESSO, ProgressoTerminal
+
+# estado de cada processo do pool, preenchido uma vez por iniciar_processo
+_memoria = None
+_ordens = None
+_matriz_dist = None
+
+
+class MatrizCompartilhada:
+    # copia os valores da matriz para um bloco de memória compartilhada; os processos do
+    # pool montam a MatrizDistancias sobre esse bloco em vez de receber uma cópia
+    def __init__(self, matriz_dist):
+        valores = matriz_dist.valores
+        self.locais = matriz_dist.locais
+        self.forma = valores.shape
+        self.memoria = shared_memory.SharedMemory(create=True, size=max(valores.nbytes, 1))
+        np.ndarray(self.forma, dtype=np.float64, buffer=self.memoria.buf)[:] = valores
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.memoria.close()
+        self.memoria.unlink()
+
+    def argumentos(self):
+        return self.memoria.name, self.forma, self.locais
+
+
+def iniciar_processo(nome_memoria, forma, locais, ordens):
+    global _memoria, _ordens, _matriz_dist
+    _memoria = shared_memory.SharedMemory(name=nome_memoria)
+    valores = np.ndarray(forma, dtype=np.float64, buffer=_memoria.buf)
+    _matriz_dist = MatrizDistancias(locais, valores)
+    _ordens = ordens
+
+
+def entradas_do_processo():
+    return _ordens, _matriz_dist
+
+
+def _executar_configuracao(heuristica, num_empilhadeiras, parametros):
+    inicio = time.perf_counter()
+    _, metricas = CatalogoHeuristicas.executar(heuristica, num_empilhadeiras, _ordens, _matriz_dist,
+                                               silencioso=True, **parametros)
+    return {'heuristica': heuristica, 'num_empilhadeiras': num_empilhadeiras,
+            'duracao_s': time.perf_counter() - inicio, **metricas}
+
+
+def varrer_frota(ordens, matriz_dist, tamanhos_frota, heuristicas=tuple(CatalogoHeuristicas.HEURISTICAS),
+                 parametros=None, max_processos=None, progresso=SEM_PROGRESSO):
+    # parametros: {heuristica: {nome: valor}} repassados ao construtor de cada heurística;
+    # progresso (Progresso.py) recebe o número de configurações concluídas
+    parametros = parametros or {}
+    configuracoes = [(h, n) for h in heuristicas for n in tamanhos_frota]
+    # as execuções mais longas (frotas maiores) entram primeiro para equilibrar os processos
+    configuracoes.sort(key=lambda c: c[1], reverse=True)
+
+    linhas = []
+    progresso.iniciar()
+    with MatrizCompartilhada(matriz_dist) as compartilhada, \
+            ProcessPoolExecutor(max_workers=max_processos or os.cpu_count(), initializer=iniciar_processo,
+                                initargs=(*compartilhada.argumentos(), ordens)) as pool:
+        futuros = [pool.submit(_executar_configuracao, h, n, parametros.get(h, {})) for h, n in configuracoes]
+        for futuro in as_completed(futuros):
+            linha = futuro.result()
+            linhas.append(linha)
+            progresso.atualizar(len(linhas), len(configuracoes))
+    progresso.encerrar()
+
+    return pd.DataFrame(linhas).sort_values(['heuristica', 'num_empilhadeiras']).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    TAMANHOS_FROTA = range(1, 31)
+    HEURISTICAS = ['gulosa', 'ingenua', 'consolidacao', 'backhauling']
+
+    start_time = time.time()
+    ordens, matriz_dist = carregar_entradas()
+    print(f"Entradas carregadas em {time.time() - start_time:.2f}s")
+
+    print("\nIniciando varredura do tamanho da frota...")
+    tabela = varrer_frota(ordens, matriz_dist, TAMANHOS_FROTA, HEURISTICAS,
+                          progresso=ProgressoTerminal(unidade="configurações"))
+
+    print(f"\nTempo total de execução: {timedelta(seconds=time.time() - start_time)}")
+    tabela.to_excel("resultados_varredura_frota.xlsx", index=False)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+import CatalogoHeuristicas
+from GeradorCenarios import gerar_armazem, gerar_ordens
+
+# apoio dos testes de equivalência dos modos de despacho: comparam o registro de
+# atribuições e as métricas com os de uma execução em lote do mesmo log
+
+
+def cenario(num_ordens=1500, ordens_por_hora=600.0, dias=1, semente=7):
+    # log sintético de GeradorCenarios; com dias > 1, um turno por dia a partir das 6h, com
+    # códigos de ordem únicos no log todo
+    matriz_dist = gerar_armazem(60, 6, semente=semente)
+    ordens = pd.concat([gerar_ordens(num_ordens, matriz_dist, ordens_por_hora, inicio=f"2025-01-{6 + dia:02d} 06:00",
+                                     semente=semente + dia) for dia in range(dias)], ignore_index=True)
+    ordens['ordem'] = np.arange(1, len(ordens) + 1)
+    return ordens, matriz_dist
+
+
+def heuristicas_ao_vivo():
+    # as que decidem sem consultar ordens futuras
+    return [nome for nome, (classe, _, _) in CatalogoHeuristicas.HEURISTICAS.items() if not classe.CONSULTA_ORDENS_FUTURAS]
+
+
+def executar_em_lote(nome, num_empilhadeiras, ordens, matriz_dist, **parametros):
+    # devolve a política depois da execução (com o registro), os resultados e as métricas.
+    # Usa o método em blocos, que segue a ordem do log: o método com DataFrame reordena com
+    # sort_values (instável) as ordens do mesmo segundo, e os modos conferidos recebem o log
+    # na ordem em que está
+    politica = CatalogoHeuristicas.criar(nome, num_empilhadeiras, **parametros)
+    politica.progresso = CatalogoHeuristicas.SEM_PROGRESSO
+    resultados, metricas = getattr(politica, CatalogoHeuristicas.HEURISTICAS[nome][2])([ordens.copy()], matriz_dist)
+    return politica, resultados, metricas
+
+
+def diferencas_registro(esperado, obtido):
+    # colunas do registro que não batem (ou o tamanho, se já for diferente)
+    if len(esperado) != len(obtido):
+        return [f"{len(obtido)} atribuições em vez de {len(esperado)}"]
+    return [nome for nome in esperado.COLUNAS if not np.array_equal(esperado.coluna(nome), obtido.coluna(nome))]
+
+
+def diferencas_metricas(esperadas, obtidas):
+    return [f"{nome}: {obtidas.get(nome)!r} em vez de {valor!r}" for nome, valor in esperadas.items()
+            if obtidas.get(nome) != valor]
@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# os módulos ficam na raiz do repositório
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from apoio import cenario
+
+
+@pytest.fixture(scope='session')
+def log_gerado():
+    # um turno de 1500 ordens a 600/h num armazém gerado; cada teste recebe cópias
+    return cenario()
@@ -0,0 +1,44 @@
+import pytest
+
+from apoio import diferencas_metricas, diferencas_registro, executar_em_lote, heuristicas_ao_vivo
+from DespachoOnline import DespachanteOnline
+
+
+@pytest.mark.parametrize('nome', heuristicas_ao_vivo())
+def test_reproduzir_log_ao_vivo_igual_ao_lote(log_gerado, nome):
+    # submete as ordens de cada minuto e avança o relógio até a última delas
+    ordens, matriz_dist = log_gerado
+    lote, _, metricas = executar_em_lote(nome, 8, ordens, matriz_dist)
+    despachante = DespachanteOnline.criar(nome, 8, matriz_dist)
+    devolvidas = []
+    for _, grupo in ordens.groupby(ordens['data_hora'].dt.floor('min'), sort=True):
+        for ordem in grupo.to_dict('records'):
+            despachante.submit_order(ordem)
+        despachante.advance_clock(grupo['data_hora'].iloc[-1])
+        devolvidas += despachante.poll_assignments()
+    metricas_online = despachante.close()
+    devolvidas += despachante.poll_assignments()
+
+    assert diferencas_registro(lote.registro, despachante.politica.registro) == []
+    assert diferencas_metricas(metricas, metricas_online) == []
+    # cada atribuição sai uma vez, na ordem do registro
+    assert [a['linha'] for a in devolvidas] == lote.registro.coluna('linha').tolist()
+
+
+def test_latencia_de_decisao_por_ordem(log_gerado):
+    ordens, matriz_dist = log_gerado
+    despachante = DespachanteOnline.criar('gulosa', 12, matriz_dist)
+    for ordem in ordens.head(200).to_dict('records'):
+        despachante.submit_order(ordem)
+        despachante.advance_clock(ordem['data_hora'])
+
+    latencia = despachante.status()['latencia_decisao']
+    assert len(despachante.latencias) == 200
+    assert 0 < latencia['p50_ms'] <= latencia['p99_ms'] <= latencia['max_ms']
+
+
+@pytest.mark.parametrize('nome', ['consolidacao', 'backhauling'])
+def test_politicas_com_ordens_futuras_recusadas(log_gerado, nome):
+    _, matriz_dist = log_gerado
+    with pytest.raises(ValueError):
+        DespachanteOnline.criar(nome, 8, matriz_dist)
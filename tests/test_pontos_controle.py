@@ -0,0 +1,33 @@
+import pytest
+
+import CatalogoHeuristicas
+from apoio import diferencas_metricas, executar_em_lote
+from PontosControle import PontoControle, PontosControle
+from SimuladorEventos import SimulacaoInterrompida
+
+
+@pytest.mark.parametrize('parada', [37, 250, 590])
+@pytest.mark.parametrize('nome', list(CatalogoHeuristicas.HEURISTICAS))
+def test_retomada_igual_a_execucao_sem_interrupcao(log_gerado, tmp_path, nome, parada):
+    # interrompe logo depois de gravar o ponto de controle da chegada de número parada e
+    # retoma desse ponto
+    ordens, matriz_dist = log_gerado
+    _, resultados, metricas = executar_em_lote(nome, 8, ordens, matriz_dist)
+    caminho = tmp_path / 'retomada.ponto'
+    chegadas = 0
+
+    def depois_do_ponto(_):
+        nonlocal chegadas
+        chegadas += 1
+        return chegadas > parada
+
+    with pytest.raises(SimulacaoInterrompida):
+        CatalogoHeuristicas.executar(nome, 8, [ordens.copy()], matriz_dist, silencioso=True,
+                                     criterio_parada=depois_do_ponto,
+                                     pontos_controle=PontosControle(str(caminho), a_cada_ordens=parada))
+    assert not PontoControle.ler(str(caminho)).concluida
+
+    resultados_retomada, metricas_retomada = CatalogoHeuristicas.retomar(str(caminho), [ordens.copy()], matriz_dist,
+                                                                         silencioso=True)
+    assert diferencas_metricas(metricas, metricas_retomada) == []
+    assert resultados.equals(resultados_retomada)
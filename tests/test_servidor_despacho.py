@@ -0,0 +1,72 @@
+import asyncio
+import json
+import socket
+
+import pytest
+
+from apoio import diferencas_metricas, executar_em_lote, heuristicas_ao_vivo
+from DespachoOnline import DespachanteOnline
+from ServidorDespacho import HOST, ServidorDespacho, _linha_json, gerar_carga
+
+
+async def _servir_carga(despachante, ordens, terminais):
+    # servidor e terminais no mesmo laço, numa porta livre
+    servidor = ServidorDespacho(despachante)
+    host, porta = await servidor.iniciar(HOST, 0)
+    try:
+        return await gerar_carga(ordens, host, porta, terminais), servidor
+    finally:
+        await servidor.parar()
+
+
+async def _pedir(porta, pedido):
+    leitor, escritor = await asyncio.open_connection(HOST, porta)
+    try:
+        escritor.write(_linha_json(pedido))
+        await escritor.drain()
+        return json.loads(await leitor.readline())
+    finally:
+        escritor.close()
+
+
+@pytest.mark.parametrize('nome', heuristicas_ao_vivo())
+def test_metricas_do_servidor_iguais_ao_lote(log_gerado, nome):
+    # vários terminais simultâneos; sem ordens atrasadas (despachadas no horário do relógio)
+    # as métricas do encerramento são as do modo em lote
+    ordens, matriz_dist = log_gerado
+    _, _, metricas = executar_em_lote(nome, 8, ordens, matriz_dist)
+    despachante = DespachanteOnline.criar(nome, 8, matriz_dist)
+    relatorio, servidor = asyncio.run(_servir_carga(despachante, ordens, 16))
+
+    assert relatorio['erros'] == 0
+    assert servidor.atrasadas == 0
+    assert relatorio['ordens'] == len(ordens)
+    assert diferencas_metricas(metricas, relatorio['encerramento']['metricas']) == []
+    assert relatorio['servidor']['latencia']['p50_ms'] is not None
+
+
+def test_encerrar_com_ordem_ainda_no_lote(log_gerado):
+    # a ordem ainda espera a janela do lote quando o encerramento chega: ela é despachada e
+    # respondida antes do fim, e servir() devolve as métricas
+    ordens, matriz_dist = log_gerado
+    registro = json.loads(ordens.head(1).to_json(orient='records', date_format='iso', date_unit='ns'))[0]
+
+    with socket.socket() as livre:
+        livre.bind((HOST, 0))
+        porta = livre.getsockname()[1]
+
+    async def cenario():
+        servidor = ServidorDespacho(DespachanteOnline.criar('gulosa', 4, matriz_dist), janela_s=0.05)
+        servico = asyncio.create_task(servidor.servir(HOST, porta))
+        await asyncio.sleep(0.05)
+        ordem = asyncio.create_task(_pedir(porta, {'tipo': 'ordem', **registro}))
+        await asyncio.sleep(0.005)
+        encerramento = await _pedir(porta, {'tipo': 'encerrar'})
+        return await ordem, encerramento, await servico, servidor
+
+    resposta, encerramento, metricas, servidor = asyncio.run(asyncio.wait_for(cenario(), 10))
+
+    assert resposta['atribuida'] and resposta['ordem'] == registro['ordem']
+    assert encerramento['status']['atribuidas'] == 1
+    assert metricas is not None and metricas == servidor.metricas
+    assert servidor.lotes == 1
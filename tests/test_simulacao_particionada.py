@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from apoio import cenario, diferencas_metricas, executar_em_lote, heuristicas_ao_vivo
+from SimulacaoParticionada import planejar_cortes, preparar_ordens, simular_particionado
+
+# colunas de resultados que saem de instantes em segundos: com a origem do relógio no começo
+# do log em vez do começo do trecho, o arredondamento em float muda na última casa
+COLUNAS_DE_TEMPO = ('hora_saida_empilhadeira', 'hora_entrega', 'tempo_espera', 'tempo_movimento')
+
+
+def test_planejar_cortes():
+    data_hora = pd.to_datetime(['2025-01-06 06:00', '2025-01-06 06:10', '2025-01-06 08:00', '2025-01-06 08:00',
+                                '2025-01-06 08:05', '2025-01-06 13:59', '2025-01-06 14:00', '2025-01-06 14:01'])
+    assert planejar_cortes(data_hora, lacuna_min=60, min_ordens=1) == [2, 5]
+    assert planejar_cortes(data_hora, lacuna_min=None, turnos=['14:00'], min_ordens=1) == [6]
+    assert planejar_cortes(data_hora, lacuna_min=60, turnos=['14:00'], min_ordens=3) == [5]
+    assert planejar_cortes(data_hora[:1]) == []
+
+
+@pytest.mark.parametrize('nome', heuristicas_ao_vivo())
+def test_trechos_drenados_iguais_a_execucoes_separadas(nome):
+    # um turno por dia: onde a partição drena, o trecho seguinte é o mesmo que simular suas
+    # ordens sozinhas com uma frota nova
+    ordens, matriz_dist = cenario(1500, 120.0, dias=4)
+    resultados, _, relatorio = simular_particionado(nome, 8, ordens, matriz_dist, max_processos=2)
+    assert relatorio['drenada'].iloc[:-1].any()
+
+    preparadas = preparar_ordens(ordens)
+    inicios = relatorio.loc[~relatorio['continua_anterior'], 'primeira_linha'].tolist()
+    limites = list(zip(inicios, inicios[1:] + [len(preparadas)]))
+    assert len(limites) == relatorio.attrs['trechos']
+    esperado = pd.concat([executar_em_lote(nome, 8, preparadas.iloc[inicio:fim].reset_index(drop=True), matriz_dist)[1]
+                          for inicio, fim in limites])
+
+    esperado = esperado.sort_values('ordem').reset_index(drop=True)
+    obtido = resultados.sort_values('ordem').reset_index(drop=True)
+    pd.testing.assert_frame_equal(obtido.drop(columns=list(COLUNAS_DE_TEMPO)),
+                                  esperado.drop(columns=list(COLUNAS_DE_TEMPO)))
+    for coluna in COLUNAS_DE_TEMPO:
+        diferenca = obtido[coluna] - esperado[coluna]
+        limite = pd.Timedelta(1, 'us') if diferenca.dtype.kind == 'm' else 1e-6
+        assert (diferenca.abs() <= limite).all(), coluna
+
+
+@pytest.mark.parametrize('nome', heuristicas_ao_vivo())
+def test_particoes_sem_drenar_iguais_a_execucao_sequencial(log_gerado, nome):
+    # carga alta e cortes em lacunas de 30 s: nenhuma partição drena, todas continuam a
+    # anterior e o resultado é o da execução sequencial do log
+    ordens, matriz_dist = log_gerado
+    resultados, metricas, relatorio = simular_particionado(nome, 6, ordens, matriz_dist, lacuna_min=0.5,
+                                                           min_ordens=200, max_processos=2)
+    assert len(relatorio) > 2 and relatorio['ordens'].sum() == len(ordens)
+    assert relatorio['continua_anterior'].iloc[1:].all()
+    assert relatorio.attrs['trechos'] == 1
+
+    _, resultados_sequenciais, metricas_sequenciais = executar_em_lote(nome, 6, preparar_ordens(ordens), matriz_dist)
+    assert diferencas_metricas(metricas_sequenciais, metricas) == []
+    assert resultados_sequenciais.equals(resultados)
+
+
+def test_busca_local_recusada(log_gerado):
+    ordens, matriz_dist = log_gerado
+    with pytest.raises(ValueError):
+        simular_particionado('gulosa', 6, ordens, matriz_dist, busca_local_s=1.0)